@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+Set ``VOTING_ASYNC_VIEWS = True`` in settings to serve login, voting and the
+public results from the async views, e.g. ``uvicorn Voting.asgi:application``.
 """
 
 import os
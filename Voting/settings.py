@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'VotingApp.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -129,3 +130,168 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Voting dashboard
+# Number of most recent rollup buckets sent to the results charts
+VOTING_ROLLUP_BUCKETS = {
+    'minute': 180,
+    'hour': 72,
+}
+
+# Route login, voting and public results through the async views in
+# VotingApp.async_views. Only useful when served by an ASGI server.
+VOTING_ASYNC_VIEWS = False
+
+# Memory-mapped tally store shared by all worker processes on this host.
+# Set the path to None to count votes in the database on every request.
+VOTING_TALLY_STORE_PATH = BASE_DIR / 'var' / 'tally.mmap'
+VOTING_TALLY_STORE_SLOTS = 1024
+
+# Incremental vote export (api/export/votes/). Mirrors that cannot log in as
+# an admin send "Authorization: Bearer <token>"; None disables token access.
+VOTING_EXPORT_TOKEN = None
+VOTING_EXPORT_PAGE_SIZE = 50000
+
+# Voter-roll sync (sync-roll/). Uploaded rolls are kept here, named by the
+# fingerprint of their preview, until the admin applies them. Rolls not
+# applied within VOTING_ROLL_SYNC_MAX_AGE seconds are deleted.
+VOTING_ROLL_SYNC_DIR = BASE_DIR / 'var' / 'roll_sync'
+VOTING_ROLL_SYNC_MAX_AGE = 86400
+
+# One-time login codes (VotingApp.otp). Codes are kept only in the cache
+# named here; with several worker processes use a shared cache (Redis,
+# Memcached), since the default local-memory cache is per process. Only turn
+# codes on with an SMS backend that reaches phones (the http one below):
+# outside DEBUG the server refuses to start with the console backend.
+VOTING_OTP_ENABLED = False
+VOTING_OTP_CACHE = 'default'
+VOTING_OTP_TTL = 300
+VOTING_OTP_LENGTH = 6
+VOTING_OTP_MAX_ATTEMPTS = 5
+VOTING_OTP_RESEND_INTERVAL = 30
+
+# Outbound SMS (VotingApp.sms). The console backend prints messages instead
+# of sending them; 'VotingApp.sms.backends.filebased.SmsBackend' appends them
+# to VOTING_SMS_FILE_PATH and 'VotingApp.sms.backends.http.SmsBackend' posts
+# batches to VOTING_SMS_GATEWAY_URL.
+VOTING_SMS_BACKEND = 'VotingApp.sms.backends.console.SmsBackend'
+VOTING_SMS_FILE_PATH = BASE_DIR / 'var' / 'sms.log'
+VOTING_SMS_GATEWAY_URL = None
+VOTING_SMS_GATEWAY_TOKEN = None
+# Messages are sent in batches of up to this many, waiting at most
+# VOTING_SMS_FLUSH_INTERVAL seconds for a batch to fill. Failed sends are
+# retried after VOTING_SMS_RETRY_DELAY seconds, doubling each time.
+VOTING_SMS_BATCH_SIZE = 100
+VOTING_SMS_FLUSH_INTERVAL = 0.05
+VOTING_SMS_MAX_ATTEMPTS = 5
+VOTING_SMS_RETRY_DELAY = 1.0
+
+# Warm each worker's caches (URLconf, templates, OTP cache, tally store) in a
+# background thread at startup; see VotingApp.warmup. Meant for web workers,
+# so enable it in their settings rather than for management commands.
+# VOTING_WARM_UP_EXPORTS also preloads the CSV/PDF report modules.
+VOTING_WARM_UP = False
+VOTING_WARM_UP_EXPORTS = False
+
+# Read-only replica for public results pages (VotingApp.replica). Refresh it
+# with "manage.py snapshot_replica --every 10"; while the snapshot is older
+# than VOTING_REPLICA_MAX_AGE seconds those pages read the primary instead.
+VOTING_REPLICA_PATH = BASE_DIR / 'var' / 'replica.sqlite3'
+VOTING_REPLICA_MAX_AGE = 30
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': f'file:{VOTING_REPLICA_PATH}?mode=ro',
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['VotingApp.replica.ReplicaRouter']
+
+# Static copies of the public results pages (VotingApp.publisher), written by
+# "manage.py publish_results --every 2" for a plain file server to serve.
+# Pages are re-rendered when the tallies change, at most once per interval,
+# and at least every VOTING_PUBLISH_REFRESH seconds.
+VOTING_PUBLISH_DIR = BASE_DIR / 'var' / 'public'
+VOTING_PUBLISH_REFRESH = 60
+
+# Admission control (VotingApp.admission): the most requests each worker
+# process handles at once per lane. Voters past the voting limit wait in a
+# queue page; form posts and voters leaving the queue may use
+# VOTING_ADMISSION_BURST (a fraction of the limit) extra slots. Full results,
+# machine (kiosk sync, event feed, vote export) and admin lanes answer 503.
+# A limit of 0 or None disables that lane's cap. Queue depth per worker is
+# reported at /api/admission/.
+VOTING_ADMISSION_LIMITS = {'voting': 16, 'results': 32, 'machine': 8, 'admin': 4}
+VOTING_ADMISSION_BURST = 0.25
+VOTING_ADMISSION_POLL_INTERVAL = 2
+VOTING_ADMISSION_TICKET_TTL = 900
+VOTING_ADMISSION_PASS_TTL = 60
+
+# Background jobs (VotingApp.jobs), run by "manage.py run_jobs". Voter imports
+# of more than VOTING_JOBS_IMPORT_THRESHOLD numbers are queued instead of run
+# in the request (None always imports inline). Failed jobs are retried after
+# VOTING_JOBS_RETRY_DELAY seconds, doubling each time; running jobs that have
+# not reported progress for VOTING_JOBS_STALE_AFTER seconds are requeued.
+VOTING_JOBS_DIR = BASE_DIR / 'var' / 'jobs'
+VOTING_JOBS_IMPORT_THRESHOLD = 500
+VOTING_JOBS_RETRY_DELAY = 10
+VOTING_JOBS_STALE_AFTER = 300
+
+# Django admin changelists of the vote and voter tables (VotingApp.admin)
+# count their rows exactly only up to this many; bigger unfiltered lists use
+# an estimate and filtered lists stop paging at the limit.
+VOTING_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Streaming anomaly detection over votes and login attempts
+# (VotingApp.anomaly). A key (candidate, dialling prefix, client IP) is
+# flagged when its last-minute count is at least VOTING_ANOMALY_MIN_EVENTS
+# and VOTING_ANOMALY_SPIKE_FACTOR times its half-hour rate. Alerts for the
+# same key repeat at most every VOTING_ANOMALY_COOLDOWN seconds. Behind a
+# reverse proxy set VOTING_ANOMALY_IP_HEADER = 'X-Forwarded-For'.
+VOTING_ANOMALY_DETECTION = True
+VOTING_ANOMALY_SPIKE_FACTOR = 5
+VOTING_ANOMALY_MIN_EVENTS = 20
+VOTING_ANOMALY_STREAK_MIN = 20
+VOTING_ANOMALY_SEQUENTIAL_RUN = 10
+VOTING_ANOMALY_SEQUENTIAL_GAP = 3
+VOTING_ANOMALY_PREFIX_DIGITS = 3
+VOTING_ANOMALY_MAX_KEYS = 10000
+VOTING_ANOMALY_COOLDOWN = 300
+VOTING_ANOMALY_IP_HEADER = None
+
+# Offline polling-station kiosks (VotingApp.kiosk). On the central server,
+# VOTING_KIOSK_STATIONS maps each station name to its signing key; signed
+# batches of at most VOTING_KIOSK_MAX_BATCH votes are accepted at
+# /api/kiosk/sync/. On a kiosk, set VOTING_KIOSK_MODE = True along with its
+# VOTING_KIOSK_STATION, VOTING_KIOSK_KEY and the central VOTING_KIOSK_SYNC_URL,
+# and run "manage.py sync_kiosk --every 30".
+VOTING_KIOSK_STATIONS = {}
+VOTING_KIOSK_MAX_BATCH = 1000
+VOTING_KIOSK_MODE = False
+VOTING_KIOSK_STATION = None
+VOTING_KIOSK_KEY = None
+VOTING_KIOSK_SYNC_URL = None
+VOTING_KIOSK_BATCH_SIZE = 500
+VOTING_KIOSK_CURSOR_PATH = BASE_DIR / 'var' / 'kiosk_cursor'
+
+# Repeated ballot submissions (VotingApp.idempotency). The response to each
+# ballot form's idempotency key is kept for VOTING_IDEMPOTENCY_TTL seconds,
+# for at most VOTING_IDEMPOTENCY_MAX_KEYS keys per worker process, and
+# returned to retries of the same key; a retry arriving while the first
+# request runs waits up to VOTING_IDEMPOTENCY_WAIT seconds for it.
+VOTING_IDEMPOTENCY_TTL = 300
+VOTING_IDEMPOTENCY_MAX_KEYS = 10000
+VOTING_IDEMPOTENCY_WAIT = 10
+
+# Change-data-capture log of votes, voters and candidates (VotingApp.events),
+# written as JSON lines under VOTING_EVENTS_DIR (None disables it) as each
+# transaction commits. Delivery is at most once: an event is lost if its
+# worker dies between the commit and the write. A new segment is started
+# once one reaches VOTING_EVENTS_SEGMENT_BYTES. Consumers read
+# /api/events/?after=N, VOTING_EVENTS_PAGE_SIZE events at a time, with an
+# admin session or a bearer token from VOTING_EVENTS_TOKENS.
+# "manage.py compact_events" keeps the latest event per key in the closed
+# segments.
+VOTING_EVENTS_DIR = BASE_DIR / 'var' / 'events'
+VOTING_EVENTS_SEGMENT_BYTES = 16 * 1024 * 1024
+VOTING_EVENTS_PAGE_SIZE = 1000
+VOTING_EVENTS_TOKENS = []
@@ -20,23 +20,47 @@ from django.conf import settings
 from django.conf.urls.static import static
 from VotingApp import views
 
+if getattr(settings, 'VOTING_ASYNC_VIEWS', False):
+    # Serve the voter-facing and public results views from their async
+    # counterparts when running under ASGI
+    from VotingApp import async_views as voter_views
+else:
+    voter_views = views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.landing_page, name='landing'),
-    path('login/', views.login_page, name='login'),
+    path('login/', voter_views.login_page, name='login'),
+    path('login/verify/', voter_views.login_verify, name='login_verify'),
     path('results/', views.results_page, name='results'),
     path('admin-login/', views.admin_login, name='admin_login'),
     path('admin-logout/', views.admin_logout, name='admin_logout'),
     path('add-voters/', views.add_voters, name='add_voters'),
     path('delete-voter/<int:voter_id>/', views.delete_voter, name='delete_voter'),
+    path('api/voters/bulk/', views.bulk_voters, name='bulk_voters'),
+    path('sync-roll/', views.sync_roll, name='sync_roll'),
     path('add-candidates/', views.add_candidates, name='add_candidates'),
     path('edit-candidate/<int:candidate_id>/', views.edit_candidate, name='edit_candidate'),
-    path('vote/', views.vote, name='vote'),
-    path('public-results/', views.public_results, name='public_results'),
+    path('vote/', voter_views.vote, name='vote'),
+    path('vote/ballot/', voter_views.submit_ballot, name='submit_ballot'),
+    path('public-results/', voter_views.public_results, name='public_results'),
+    path('api/results/', voter_views.results_api, name='results_api'),
+    path('api/audit/<int:election_id>/root/', views.audit_root, name='audit_root'),
+    path('api/audit/<int:election_id>/consistency/', views.audit_consistency, name='audit_consistency'),
+    path('api/audit/proof/<int:vote_id>/', views.audit_proof, name='audit_proof'),
+    path('queue/status/', views.queue_status, name='queue_status'),
+    path('api/admission/', views.admission_stats, name='admission_stats'),
+    path('anomalies/', views.anomalies, name='anomalies'),
     path('admin-change-password/', views.admin_change_password, name='admin_change_password'),
     path('election-settings/', views.election_settings, name='election_settings'),
     path('download-results/', views.download_results, name='download_results'),
     path('download-results-pdf/', views.download_results_pdf, name='download_results_pdf'),
+    path('api/export/votes/', views.export_votes, name='export_votes'),
+    path('api/jobs/', views.start_job, name='start_job'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
+    path('api/kiosk/sync/', views.kiosk_sync, name='kiosk_sync'),
+    path('api/events/', views.events_feed, name='events_feed'),
 ]
 
 if settings.DEBUG:
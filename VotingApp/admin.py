@@ -1,33 +1,217 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib import admin
-from .models import Voter, Candidate, Vote, AdminUser
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+from . import tally_store
+from .models import Voter, Candidate, Vote, AdminUser, Election, RankedPosition, Job, KioskBatch
 
 # Register your models here.
 
+
+def estimated_count(queryset):
+    """A cheap estimate of the number of rows in ``queryset``'s table.
+
+    PostgreSQL keeps one in its statistics; elsewhere the highest primary key
+    is used, which overestimates once rows have been deleted.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return model._default_manager.using(queryset.db).aggregate(Max('pk'))['pk__max'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for tables too big to count on every changelist page.
+
+    Unfiltered lists of more than ``VOTING_ADMIN_EXACT_COUNT_LIMIT`` rows use
+    :func:`estimated_count`. Filtered and searched lists count at most that
+    many rows, so pages past the limit are not offered; narrow the filter
+    instead.
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'VOTING_ADMIN_EXACT_COUNT_LIMIT', 10000)
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate > limit:
+                return estimate
+        return self.object_list.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows.
+
+    Counts are estimated or capped (see ``EstimatedCountPaginator``), the
+    filtered list is never counted a second time against the whole table,
+    and ``list_only`` restricts the list query to the columns it shows.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_only = None
+
+    def get_changelist(self, request, **kwargs):
+        ChangeList = super().get_changelist(request, **kwargs)
+        only = self.list_only
+
+        class LargeTableChangeList(ChangeList):
+            def get_queryset(self, request, exclude_parameters=None):
+                queryset = super().get_queryset(request, exclude_parameters)
+                return queryset.only(*only) if only else queryset
+
+        return LargeTableChangeList
+
+
+def remove_by_election(queryset, remove):
+    """Delete ``queryset``'s rows through ``remove(election, ids)``, one election at a time.
+
+    Deletes from the admin go through the same path as the app's own, so
+    the turnout counter, ``has_voted`` flags and rollups stay in step.
+    """
+    batches = defaultdict(list)
+    for pk, election_id in queryset.values_list('pk', 'election_id'):
+        batches[election_id].append(pk)
+    for election in Election.objects.filter(id__in=batches):
+        remove(election, batches[election.id])
+    if batches:
+        tally_store.invalidate()
+
+
+def phone_prefix(term):
+    """The normalized start of a phone number searched for, or None if ``term`` is not one"""
+    digits = term.strip().lstrip('+').replace(' ', '').replace('-', '')
+    if not digits.isdigit():
+        return None
+    return '+' + digits
+
+
+def phone_prefix_filter(field, prefix):
+    """A range filter on ``field`` matching numbers starting with ``prefix``; unlike LIKE it uses the index"""
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'}
+
+
 @admin.register(Voter)
-class VoterAdmin(admin.ModelAdmin):
-    list_display = ['phone_number', 'is_verified', 'has_voted', 'registered_at']
-    list_filter = ['is_verified', 'has_voted', 'registered_at']
+class VoterAdmin(LargeTableAdmin):
+    list_display = ['phone_number', 'election', 'is_verified', 'has_voted', 'registered_at']
+    list_filter = ['election', 'is_verified', 'has_voted', 'registered_at']
+    list_select_related = ['election']
+    list_only = ['phone_number', 'election__election_title', 'is_verified', 'has_voted', 'registered_at']
     search_fields = ['phone_number']
+    search_help_text = 'Start of the phone number, in international format'
     readonly_fields = ['registered_at', 'voted_at']
-    ordering = ['-registered_at']
+    # Registration order, read off the primary key instead of sorting the table
+    ordering = ['-id']
+
+    def get_search_results(self, request, queryset, search_term):
+        prefix = phone_prefix(search_term)
+        if prefix is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(**phone_prefix_filter('phone_number', prefix)), False
+
+    def delete_model(self, request, obj):
+        remove_by_election(Voter.objects.filter(pk=obj.pk), Voter.remove)
+
+    def delete_queryset(self, request, queryset):
+        remove_by_election(queryset, Voter.remove)
 
 @admin.register(Candidate)
 class CandidateAdmin(admin.ModelAdmin):
-    list_display = ['name', 'nickname', 'position', 'votes', 'created_at']
+    list_display = ['name', 'nickname', 'position', 'election', 'votes', 'created_at']
+    list_filter = ['election']
+    list_select_related = ['election']
     search_fields = ['name', 'nickname', 'position']
     readonly_fields = ['created_at']
     ordering = ['name']
 
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Candidate.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        # Take the candidates' votes out first, as the cascade would not
+        remove_by_election(Vote.objects.filter(candidate__in=queryset), Vote.remove)
+        queryset.delete()
+
 @admin.register(Vote)
-class VoteAdmin(admin.ModelAdmin):
-    list_display = ['voter', 'candidate', 'voted_at']
-    list_filter = ['candidate', 'voted_at']
+class VoteAdmin(LargeTableAdmin):
+    list_display = ['voter', 'candidate', 'position', 'election', 'voted_at']
+    list_filter = ['election', 'candidate', 'voted_at']
+    list_select_related = ['voter', 'candidate', 'election']
+    list_only = [
+        'position', 'voted_at', 'voter__phone_number',
+        'candidate__name', 'candidate__position', 'election__election_title',
+    ]
     search_fields = ['voter__phone_number', 'candidate__name']
+    search_help_text = "Start of the voter's phone number, or part of the candidate's name"
+    autocomplete_fields = ['voter', 'candidate']
     readonly_fields = ['voted_at']
-    ordering = ['-voted_at']
+    # Voting order, read off the primary key instead of sorting the table
+    ordering = ['-id']
+
+    def get_queryset(self, request):
+        # The change page names the vote after its voter and candidate. The
+        # changelist adds list_select_related only to querysets without any
+        # select_related, so this has to cover the list's joins as well
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Look the few matching voters or candidates up first instead of
+        # joining every vote to its voter and candidate to LIKE them
+        prefix = phone_prefix(search_term)
+        if prefix is not None:
+            voters = Voter.objects.filter(**phone_prefix_filter('phone_number', prefix)).values('id')
+            return queryset.filter(voter__in=voters), False
+        candidates = Candidate.objects.filter(name__icontains=search_term.strip()).values('id')
+        return queryset.filter(candidate__in=candidates), False
+
+    def delete_model(self, request, obj):
+        remove_by_election(Vote.objects.filter(pk=obj.pk), Vote.remove)
+
+    def delete_queryset(self, request, queryset):
+        remove_by_election(queryset, Vote.remove)
 
 @admin.register(AdminUser)
 class AdminUserAdmin(admin.ModelAdmin):
     list_display = ['user', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['created_at']
+
+@admin.register(Election)
+class ElectionAdmin(admin.ModelAdmin):
+    list_display = ['election_title', 'is_active', 'start_time', 'end_time', 'timezone']
+    list_filter = ['is_active']
+    search_fields = ['election_title']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(RankedPosition)
+class RankedPositionAdmin(admin.ModelAdmin):
+    list_display = ['position', 'election', 'method', 'seats']
+    list_filter = ['election', 'method']
+    list_select_related = ['election']
+    search_fields = ['position']
+    readonly_fields = ['candidates']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'election', 'status', 'progress', 'total', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    list_select_related = ['election']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'heartbeat']
+
+@admin.register(KioskBatch)
+class KioskBatchAdmin(admin.ModelAdmin):
+    list_display = ['station', 'batch_id', 'election', 'accepted', 'duplicates', 'received_at']
+    list_filter = ['station', 'election']
+    list_select_related = ['election']
+    readonly_fields = ['received_at', 'rejected']
@@ -0,0 +1,282 @@
+"""
+Admission control for voting peaks.
+
+:class:`AdmissionControlMiddleware` caps the requests each worker process
+handles at once, per lane: ``voting`` (login and ballot pages), ``results``
+(public results pages and feeds), ``machine`` (endpoints other systems call:
+kiosk sync, the event feed and the vote export) and ``admin`` (everything
+else with a named URL), with limits from ``VOTING_ADMISSION_LIMITS``. Lanes
+are separate, so a rush of voters never locks administrators out, results
+traffic never crowds out ballots and a backlog of kiosks or consumers
+catching up never takes the administrators' slots.
+
+When the voting lane is full, a voter opening a page gets the waiting room
+instead: a small page holding a signed ticket that polls ``queue_status``
+until there is room, oldest ticket first, and then returns to the page it
+came from with a short-lived signed pass. Form posts and pass holders may
+use ``VOTING_ADMISSION_BURST`` extra slots, so voters already part-way
+through logging in or voting are finished first. Past that, and on full
+results, machine and admin lanes, the answer is a plain 503 with
+``Retry-After``.
+
+Nothing here touches the database or the session: tickets and passes are
+signed with ``SECRET_KEY`` and queue state lives in this process's memory.
+With several workers each keeps its own queue, which is as fair as the
+load balancer spreading the polls. :func:`stats` reports the in-flight
+count and queue depth of every lane.
+"""
+import secrets
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve, reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+
+VOTING = 'voting'
+RESULTS = 'results'
+MACHINE = 'machine'
+ADMIN = 'admin'
+
+VOTING_URLS = {'login', 'login_verify', 'vote', 'submit_ballot'}
+RESULTS_URLS = {'landing', 'public_results', 'results_api', 'audit_root', 'audit_consistency', 'audit_proof'}
+MACHINE_URLS = {'kiosk_sync', 'events_feed', 'export_votes'}
+# The waiting room's own endpoints are never queued
+EXEMPT_URLS = {'queue_status'}
+
+PASS_COOKIE = 'voting_pass'
+TICKET_SALT = 'VotingApp.admission.ticket'
+PASS_SALT = 'VotingApp.admission.pass'
+
+
+def _setting(name, default):
+    return getattr(settings, f'VOTING_ADMISSION_{name}', default)
+
+
+def lane_for(request):
+    """The lane a request belongs to, or None for unnamed and exempt URLs"""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if not match.url_name or match.url_name in EXEMPT_URLS:
+        return None
+    if match.url_name in VOTING_URLS:
+        return VOTING
+    if match.url_name in RESULTS_URLS:
+        return RESULTS
+    if match.url_name in MACHINE_URLS:
+        return MACHINE
+    return ADMIN
+
+
+class Lane:
+    """In-flight requests and waiting tickets of one lane in this process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = 0
+        self.waiting = {}  # ticket id -> (issued, last poll)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @property
+    def limit(self):
+        return _setting('LIMITS', {}).get(self.name) or 0
+
+    @property
+    def burst(self):
+        return int(self.limit * _setting('BURST', 0.25))
+
+    def _prune(self, now):
+        stale = now - 3 * _setting('POLL_INTERVAL', 2)
+        for ticket, (_, seen) in list(self.waiting.items()):
+            if seen < stale:
+                del self.waiting[ticket]
+
+    def acquire(self, priority=False):
+        """Take a slot; ``priority`` requests may also use the burst slots"""
+        with _lock:
+            limit = self.limit
+            if limit:
+                if priority:
+                    limit += self.burst
+                elif self.waiting:
+                    # Newcomers do not overtake voters already waiting
+                    self._prune(time.monotonic())
+                    if self.waiting:
+                        limit = 0
+                if self.in_flight >= limit:
+                    return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with _lock:
+            self.in_flight -= 1
+
+    def refuse(self, queued):
+        with _lock:
+            if queued:
+                self.queued += 1
+            else:
+                self.rejected += 1
+
+    def poll(self, ticket, issued):
+        """Register a waiting ticket's poll; return ``(admitted, position)``"""
+        now = time.monotonic()
+        with _lock:
+            self._prune(now)
+            self.waiting[ticket] = (issued, now)
+            ahead = sum(1 for other, _ in self.waiting.values() if other < issued)
+            spare = self.limit - self.in_flight if self.limit else len(self.waiting)
+            if ahead < spare:
+                del self.waiting[ticket]
+                self.admitted += 1
+                return True, 0
+            return False, ahead + 1
+
+
+_lock = threading.Lock()
+_lanes = {name: Lane(name) for name in (VOTING, RESULTS, MACHINE, ADMIN)}
+
+
+def stats():
+    """In-flight requests, limits and queue depth of every lane in this process"""
+    now = time.monotonic()
+    with _lock:
+        report = {}
+        for name, lane in _lanes.items():
+            lane._prune(now)
+            report[name] = {
+                'in_flight': lane.in_flight,
+                'limit': lane.limit,
+                'burst': lane.burst,
+                'waiting': len(lane.waiting),
+                'queued': lane.queued,
+                'admitted': lane.admitted,
+                'rejected': lane.rejected,
+            }
+    return report
+
+
+def issue_ticket(lane, next_url):
+    return signing.dumps(
+        {'lane': lane, 'next': next_url, 'id': secrets.token_hex(8), 'issued': time.time()}, salt=TICKET_SALT,
+    )
+
+
+def read_ticket(token):
+    """The ticket's contents, or None if it is forged or too old"""
+    try:
+        return signing.loads(token, salt=TICKET_SALT, max_age=_setting('TICKET_TTL', 900))
+    except signing.BadSignature:
+        return None
+
+
+def issue_pass(lane):
+    return signing.dumps({'lane': lane}, salt=PASS_SALT)
+
+
+def has_pass(request, lane):
+    token = request.COOKIES.get(PASS_COOKIE)
+    if not token:
+        return False
+    try:
+        return signing.loads(token, salt=PASS_SALT, max_age=_setting('PASS_TTL', 60))['lane'] == lane
+    except signing.BadSignature:
+        return False
+
+
+def check_ticket(token):
+    """Answer a waiting room poll; returns the JSON payload and the pass to set, if admitted"""
+    ticket = read_ticket(token)
+    if ticket is None or ticket['lane'] not in _lanes:
+        return {'ready': False, 'expired': True}, None
+    # Tickets are ordered by their signed issue time, so a ticket keeps its
+    # place whichever worker its polls land on
+    admitted, position = _lanes[ticket['lane']].poll(ticket['id'], ticket['issued'])
+    if admitted:
+        return {'ready': True, 'next': ticket['next']}, issue_pass(ticket['lane'])
+    return {'ready': False, 'position': position, 'retry_after': _setting('POLL_INTERVAL', 2)}, None
+
+
+def _busy(retry_after):
+    response = HttpResponse(
+        'The service is busy. Please try again in a few seconds.', status=503, content_type='text/plain',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _waiting_room(request, lane):
+    next_url = request.get_full_path()
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = '/'
+    poll_interval = _setting('POLL_INTERVAL', 2)
+    response = HttpResponse(
+        render_to_string('waiting_room.html', {
+            'ticket': issue_ticket(lane, next_url),
+            'status_url': reverse('queue_status'),
+            'poll_interval': poll_interval,
+        }),
+        status=503,
+    )
+    response['Retry-After'] = str(poll_interval)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Cap concurrent requests per lane; queue voters in the waiting room"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def admit(self, request):
+        """Return ``(lane, None)`` with a slot taken, ``(None, None)`` when not limited, or a refusal"""
+        name = lane_for(request)
+        if name is None:
+            return None, None
+        lane = _lanes[name]
+        priority = request.method == 'POST' or (name == VOTING and has_pass(request, name))
+        if lane.acquire(priority=priority):
+            return lane, None
+        queued = name == VOTING and request.method in ('GET', 'HEAD')
+        lane.refuse(queued)
+        if queued:
+            return None, _waiting_room(request, name)
+        return None, _busy(_setting('POLL_INTERVAL', 2))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        lane, refusal = self.admit(request)
+        if refusal is not None:
+            return refusal
+        try:
+            return self.get_response(request)
+        finally:
+            if lane is not None:
+                lane.release()
+
+    async def __acall__(self, request):
+        lane, refusal = self.admit(request)
+        if refusal is not None:
+            return refusal
+        try:
+            return await self.get_response(request)
+        finally:
+            if lane is not None:
+                lane.release()
@@ -0,0 +1,287 @@
+"""
+Streaming detection of ballot stuffing and bot bursts.
+
+Every recorded vote and every login attempt is fed to the process-wide
+:data:`detector` as it happens. It keeps sliding-window counts per
+candidate, per position, per dialling prefix and per client IP, and raises
+an alert when
+
+* a key's rate over the last minute is ``VOTING_ANOMALY_SPIKE_FACTOR``
+  times its rate over the last half hour (and at least
+  ``VOTING_ANOMALY_MIN_EVENTS`` events), such as one IP casting dozens of
+  ballots or logins for numbers that are not on the roll piling up.
+  Candidates and prefixes are only judged after the process has seen half
+  an hour of traffic to compare with;
+* one candidate receives a run of consecutive votes in a position that
+  their share of the position's other recent votes makes less likely than
+  one in a million;
+* ``VOTING_ANOMALY_SEQUENTIAL_RUN`` consecutive votes come from phone
+  numbers next to each other, as when a script walks the roll.
+
+Each counter is a fixed ring of buckets, so feeding an event costs the same
+however many votes came before it, and the keys tracked per kind are capped
+at ``VOTING_ANOMALY_MAX_KEYS``, least recently seen dropped first. Alerts
+are logged to the ``VotingApp.anomaly`` logger and the latest are kept for
+the admin anomalies page. State lives in this process only: with several
+workers each sees its share of the traffic and the log holds the union.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Short window: the last minute in 10 s buckets; long window: the last half
+# hour in one-minute buckets
+SHORT_BUCKETS, SHORT_WIDTH = 6, 10
+LONG_BUCKETS, LONG_WIDTH = 30, 60
+# A streak is reported once a run this unlikely would be expected
+STREAK_PROBABILITY = 1e-6
+
+
+def _setting(name, default):
+    return getattr(settings, f'VOTING_ANOMALY_{name}', default)
+
+
+def enabled():
+    return _setting('DETECTION', True)
+
+
+class Window:
+    """Event count over the last ``buckets * width`` seconds in a ring of buckets"""
+    __slots__ = ('counts', 'width', 'slot', 'index', 'total')
+
+    def __init__(self, buckets, width):
+        self.counts = [0] * buckets
+        self.width = width
+        self.slot = 0
+        self.index = 0
+        self.total = 0
+
+    def _advance(self, now):
+        slot = int(now // self.width)
+        # At most one lap of the ring, whatever the gap since the last event
+        for _ in range(min(slot - self.slot, len(self.counts))):
+            self.index = (self.index + 1) % len(self.counts)
+            self.total -= self.counts[self.index]
+            self.counts[self.index] = 0
+        self.slot = max(slot, self.slot)
+
+    def add(self, now, amount=1):
+        self._advance(now)
+        self.counts[self.index] += amount
+        self.total += amount
+
+    def count(self, now):
+        self._advance(now)
+        return self.total
+
+
+class Rate:
+    """Short and long window counts of one key"""
+    __slots__ = ('short', 'long')
+
+    def __init__(self):
+        self.short = Window(SHORT_BUCKETS, SHORT_WIDTH)
+        self.long = Window(LONG_BUCKETS, LONG_WIDTH)
+
+    def add(self, now):
+        self.short.add(now)
+        self.long.add(now)
+
+    def spiking(self, now):
+        """The short window's count if it is a spike over the long window's rate, else None"""
+        recent = self.short.count(now)
+        if recent < _setting('MIN_EVENTS', 20):
+            return None
+        # Events expected in a short window at the long window's rate,
+        # leaving out the short window itself
+        baseline = (self.long.count(now) - recent) * (SHORT_BUCKETS * SHORT_WIDTH) / (LONG_BUCKETS * LONG_WIDTH)
+        return recent if recent > _setting('SPIKE_FACTOR', 5) * max(baseline, 1) else None
+
+
+class Keyed:
+    """Per-key state, keeping at most ``VOTING_ANOMALY_MAX_KEYS`` least recently used keys"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.items = OrderedDict()
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            item = self.items[key] = self.factory()
+            if len(self.items) > _setting('MAX_KEYS', 10000):
+                self.items.popitem(last=False)
+        else:
+            self.items.move_to_end(key)
+        return item
+
+
+class Alert(NamedTuple):
+    at: float
+    kind: str
+    key: str
+    detail: str
+
+
+class Run:
+    """The current run of equal (or adjacent) values in a sequence"""
+    __slots__ = ('last', 'length')
+
+    def __init__(self):
+        self.last = None
+        self.length = 0
+
+
+def dialling_prefix(phone):
+    return phone[:1 + _setting('PREFIX_DIGITS', 3)]
+
+
+def client_ip(request):
+    """The client's address; behind a proxy set ``VOTING_ANOMALY_IP_HEADER`` (e.g. ``X-Forwarded-For``)"""
+    header = _setting('IP_HEADER', None)
+    if header and request.headers.get(header):
+        return request.headers[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class Detector:
+    """Sliding-window state over the traffic of this process; ``clock`` returns monotonic seconds"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Per kind, so a flood of one kind of key (rotating IPs, say) cannot
+        # push the candidates and positions out
+        self.rates = {}
+        self.streaks = Keyed(Run)
+        self.sequences = Keyed(Run)
+        self.cooldowns = {}
+        self.alerts = deque(maxlen=200)
+        self.started = clock()
+
+    @staticmethod
+    def _get(table, kind, key, factory):
+        keyed = table.get(kind)
+        if keyed is None:
+            keyed = table[kind] = Keyed(factory)
+        return keyed.get(key)
+
+    def _alert(self, now, kind, key, detail):
+        until = self._get(self.cooldowns, kind, key, lambda: [0.0])
+        if until[0] > now:
+            return
+        until[0] = now + _setting('COOLDOWN', 300)
+        self.alerts.append(Alert(time.time(), kind, key, detail))
+        logger.warning('Voting anomaly [%s] %s: %s', kind, key, detail)
+
+    def _count(self, now, kind, key, what, shared=False):
+        """Count one event for ``key`` and report it if the key is spiking.
+
+        ``shared`` keys (a candidate or prefix many voters go through) have a
+        normal rate far from zero, so they are judged only once the process
+        has seen a full long window of traffic.
+        """
+        rate = self._get(self.rates, kind, key, Rate)
+        rate.add(now)
+        if shared and now - self.started < LONG_BUCKETS * LONG_WIDTH:
+            return rate
+        recent = rate.spiking(now)
+        if recent is not None:
+            self._alert(now, f'{kind} spike', key, f'{recent} {what} in the last minute')
+        return rate
+
+    def _streak(self, now, election_id, position, candidate_id, name, votes, in_position):
+        """Extend the position's run of votes and report it if the candidate's share before it makes it unlikely.
+
+        ``votes`` and ``in_position`` are the candidate's and the position's
+        rates, already counting this vote.
+        """
+        run = self.streaks.get((election_id, position))
+        if run.last == candidate_id:
+            run.length += 1
+        else:
+            run.last, run.length = candidate_id, 1
+        # Judge the run against the votes before it, or it would raise the share it is judged by
+        in_run = min(run.length, votes.long.count(now))
+        before = in_position.long.count(now) - in_run
+        minimum = _setting('STREAK_MIN', 20)
+        if run.length < minimum or before < minimum:
+            return
+        # Plus one, so no earlier vote does not make any run impossible
+        share = (votes.long.count(now) - in_run + 1) / (before + 1)
+        # Runs of k votes for a candidate with share p happen with probability p ** k
+        needed = math.log(STREAK_PROBABILITY) / math.log(share) if share < 1 else math.inf
+        if run.length >= needed:
+            self._alert(
+                now, 'vote streak', f'{election_id}: {name} ({position})',
+                f'{run.length} consecutive votes with an earlier share of {share:.0%}',
+            )
+
+    def _sequence(self, now, election_id, phone):
+        digits = phone.lstrip('+')
+        if not digits.isdigit():
+            return
+        number = int(digits)
+        run = self.sequences.get(election_id)
+        if run.last is not None and 0 < abs(number - run.last) <= _setting('SEQUENTIAL_GAP', 3):
+            run.length += 1
+        else:
+            run.length = 1
+        run.last = number
+        if run.length >= _setting('SEQUENTIAL_RUN', 10):
+            self._alert(
+                now, 'sequential voters', f'election {election_id}',
+                f'{run.length} consecutive votes from neighbouring numbers, latest {phone}',
+            )
+
+    def record_ballot(self, election_id, phone, ip, candidates):
+        """Feed one recorded ballot; ``candidates`` holds ``(candidate_id, name, position)`` per vote"""
+        if not enabled():
+            return
+        now = self.clock()
+        with self.lock:
+            self._count(now, 'ip', ip, 'ballots')
+            self._count(now, 'prefix', f'{election_id}:{dialling_prefix(phone)}', 'ballots', shared=True)
+            self._sequence(now, election_id, phone)
+            for candidate_id, name, position in candidates:
+                votes = self._count(now, 'candidate', f'{election_id}: {name} ({position})', 'votes', shared=True)
+                in_position = self._get(self.rates, 'position', (election_id, position), Rate)
+                in_position.add(now)
+                self._streak(now, election_id, position, candidate_id, name, votes, in_position)
+
+    def record_login(self, election_id, phone, ip, on_roll):
+        """Feed one login attempt; ``on_roll`` says whether the number is a registered voter"""
+        if not enabled():
+            return
+        now = self.clock()
+        with self.lock:
+            self._count(now, 'login ip', ip, 'login attempts')
+            self._count(now, 'login prefix', f'{election_id}:{dialling_prefix(phone)}', 'login attempts', shared=True)
+            if not on_roll:
+                self._count(now, 'unknown number', ip, 'logins for numbers not on the roll')
+
+    def recent_alerts(self):
+        with self.lock:
+            return list(reversed(self.alerts))
+
+    def busiest(self, limit=20):
+        """The keys with the most events in the last minute, busiest first"""
+        now = self.clock()
+        with self.lock:
+            rows = [
+                {'kind': kind, 'key': key, 'last_minute': rate.short.count(now), 'last_30_minutes': rate.long.count(now)}
+                for kind, keyed in self.rates.items() if kind != 'position'
+                for key, rate in keyed.items.items()
+            ]
+        rows.sort(key=lambda row: -row['last_minute'])
+        return [row for row in rows[:limit] if row['last_30_minutes']]
+
+
+detector = Detector()
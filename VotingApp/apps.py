@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class VotingappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'VotingApp'
+
+    def ready(self):
+        from . import checks  # noqa: F401 - registers the system checks
+
+        if getattr(settings, 'VOTING_WARM_UP', False):
+            from . import warmup
+            warmup.start()
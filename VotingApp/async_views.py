@@ -0,0 +1,211 @@
+"""
+Async counterparts of the voter-facing and public results views.
+
+Reads go through Django's async ORM methods so a request waiting on a slow
+client or the database does not pin a worker thread. Writes still run inside
+a regular ``transaction.atomic`` block via ``sync_to_async`` because Django
+does not support transactions from async code.
+
+Enable them by setting ``VOTING_ASYNC_VIEWS = True`` and serving
+``Voting.asgi:application`` with an ASGI server (uvicorn, daphne, ...).
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.shortcuts import render, redirect
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .models import Voter, Candidate, Vote, Election, RankedPosition
+from . import anomaly, idempotency, otp, replica
+from .views import (
+    _voting_closed_message, _group_ballot, _record_vote, _masked_phone, _complete_login, _ranked_choice,
+    _ballot_choices, _record_ballot, _render_receipt, _public_results_context, _results_feed,
+)
+
+
+async def _session_get(request, key):
+    # Session backends are synchronous in this Django version. Loading the
+    # session once here also caches it, so later reads/writes stay in memory.
+    return await sync_to_async(request.session.get)(key)
+
+
+async def _current_election(request):
+    """Async variant of ``views._current_election``"""
+    requested = request.GET.get('election')
+    election_id = requested or await _session_get(request, 'election_id')
+    election = None
+    if election_id and str(election_id).isdigit():
+        election = await Election.objects.filter(id=election_id).afirst()
+    if election is None:
+        election = await Election.aget_default()
+    if requested and await _session_get(request, 'election_id') != election.id:
+        request.session['election_id'] = election.id
+    return election
+
+
+async def login_page(request):
+    """Login page for phone number entry"""
+    election = await _current_election(request)
+    closed = _voting_closed_message(election, timezone.now())
+    if closed:
+        messages.error(request, closed)
+        return redirect('landing')
+
+    if request.method == 'POST':
+        phone = request.POST.get('phone_number', '').strip()
+        normalized = Voter.normalize_phone_number(phone)
+        voter = await Voter.objects.filter(election=election, phone_number=normalized).afirst()
+        anomaly.detector.record_login(election.id, normalized, anomaly.client_ip(request), on_roll=voter is not None)
+        if voter:
+            request.session['election_id'] = election.id
+            if not otp.enabled():
+                request.session['voter_phone'] = voter.phone_number
+                return redirect('vote')
+            request.session['otp_phone'] = voter.phone_number
+            if not await sync_to_async(otp.issue)(election, voter.phone_number):
+                messages.info(request, 'A code was sent a moment ago. Please use that one or try again shortly.')
+            return redirect('login_verify')
+        messages.error(request, 'Phone number not found. Please contact admin.')
+    return render(request, 'login.html')
+
+
+@require_http_methods(["GET", "POST"])
+async def login_verify(request):
+    """Second login step: the code sent to the voter by SMS"""
+    phone = await _session_get(request, 'otp_phone')
+    if not phone:
+        return redirect('login')
+    election = await _current_election(request)
+    closed = _voting_closed_message(election, timezone.now())
+    if closed:
+        messages.error(request, closed)
+        return redirect('landing')
+
+    if request.method == 'POST':
+        if request.POST.get('action') == 'resend':
+            if await sync_to_async(otp.issue)(election, phone):
+                messages.success(request, 'A new code is on its way.')
+            else:
+                messages.info(request, 'Please wait a little before asking for another code.')
+        elif await sync_to_async(otp.verify)(election, phone, request.POST.get('code', '')):
+            await Voter.objects.filter(election=election, phone_number=phone, is_verified=False).aupdate(is_verified=True)
+            await sync_to_async(_complete_login)(request, phone)
+            return redirect('vote')
+        else:
+            messages.error(request, 'That code is wrong or has expired.')
+    return render(request, 'login.html', {'otp_phone': _masked_phone(phone)})
+
+
+async def _ballot_voter(request, now):
+    """Async variant of ``views._ballot_voter``"""
+    voter_phone = await _session_get(request, 'voter_phone')
+    if not voter_phone:
+        messages.error(request, 'Please login to vote')
+        return None, redirect('login')
+
+    voter = await (
+        Voter.objects.select_related('election')
+        .filter(election_id=request.session.get('election_id'), phone_number=voter_phone)
+        .afirst()
+    )
+    if not voter:
+        messages.error(request, 'Voter not found')
+        return None, redirect('login')
+
+    closed = _voting_closed_message(voter.election, now, on_ballot=True)
+    if closed:
+        messages.error(request, closed)
+        return None, redirect('landing')
+    return voter, None
+
+
+async def _render_ballot(request, voter):
+    election = voter.election
+    candidates = [c async for c in Candidate.objects.filter(election=election).order_by('position', 'name')]
+    contests = [contest async for contest in RankedPosition.objects.filter(election=election)]
+    voted = [position async for position in Vote.objects.filter(election=election, voter=voter).values_list('position', flat=True)]
+    grouped = _group_ballot(candidates, contests, voted)
+    return render(request, 'vote.html', {
+        'grouped': grouped,
+        'voter_phone': voter.phone_number,
+        'complete': all(section['voted'] for section in grouped),
+        'idempotency_key': idempotency.new_key(),
+    })
+
+
+@require_http_methods(["GET", "POST"])
+@idempotency.idempotent
+async def vote(request):
+    """Voter selects a candidate to vote for"""
+    now = timezone.now()
+    voter, response = await _ballot_voter(request, now)
+    if response:
+        return response
+    election = voter.election
+
+    if request.method == 'POST' and request.POST.getlist('rank'):
+        position = request.POST.get('position', '')
+        try:
+            contest, ranking = await sync_to_async(_ranked_choice)(election, position, request.POST.getlist('rank'))
+        except ValidationError as e:
+            messages.error(request, e.message)
+        else:
+            ranked_as = (contest, [c.id for c in ranking])
+            if await sync_to_async(_record_vote)(
+                election, voter, ranking[0], now, ranking=ranked_as, client_ip=anomaly.client_ip(request),
+            ):
+                messages.success(request, f'Thank you! Your ranking in "{position}" has been recorded.')
+            else:
+                messages.warning(request, f'You have already voted in the "{position}" section.')
+    elif request.method == 'POST':
+        candidate_id = request.POST.get('candidate_id')
+        try:
+            candidate = await Candidate.objects.aget(id=candidate_id, election=election)
+            if await RankedPosition.objects.filter(election=election, position=candidate.position).aexists():
+                messages.error(request, f'"{candidate.position}" needs candidates ranked in order of preference.')
+            elif await sync_to_async(_record_vote)(election, voter, candidate, now, client_ip=anomaly.client_ip(request)):
+                messages.success(request, f'Thank you! Your vote for {candidate.name} in "{candidate.position}" has been recorded.')
+            else:
+                messages.warning(request, f'You have already voted in the "{candidate.position}" section.')
+        except Candidate.DoesNotExist:
+            messages.error(request, 'Candidate not found')
+
+    return await _render_ballot(request, voter)
+
+
+@require_http_methods(["POST"])
+@idempotency.idempotent
+async def submit_ballot(request):
+    """Record the voter's choices in every position at once"""
+    now = timezone.now()
+    voter, response = await _ballot_voter(request, now)
+    if response:
+        return response
+    try:
+        choices = await sync_to_async(_ballot_choices)(voter.election, request.POST)
+    except ValidationError as e:
+        for message in e.messages:
+            messages.error(request, message)
+        return await _render_ballot(request, voter)
+    recorded, skipped = await sync_to_async(_record_ballot)(
+        voter.election, voter, choices, now, anomaly.client_ip(request),
+    )
+    return await sync_to_async(_render_receipt)(request, voter, recorded, skipped)
+
+
+@replica.public_read
+async def public_results(request):
+    """Public read-only results page (no admin session required)"""
+    context = await sync_to_async(_public_results_context)(await _current_election(request))
+    context['data_age'] = replica.data_age()
+    return render(request, 'public_results.html', context)
+
+
+@replica.public_read
+async def results_api(request):
+    """Public JSON results feed"""
+    feed = await sync_to_async(_results_feed)(await _current_election(request))
+    feed['data_age'] = replica.data_age()
+    return JsonResponse(feed)
@@ -0,0 +1,26 @@
+"""
+System checks for settings that would lock voters out.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends that never reach a voter's phone
+UNDELIVERED_SMS_BACKENDS = {
+    'VotingApp.sms.backends.console.SmsBackend',
+    'VotingApp.sms.backends.locmem.SmsBackend',
+}
+
+
+@register()
+def check_otp_delivery(app_configs, **kwargs):
+    """Login codes must be deliverable whenever voters need one to log in"""
+    from . import otp, sms
+
+    backend = getattr(settings, 'VOTING_SMS_BACKEND', sms.DEFAULT_BACKEND)
+    if otp.enabled() and backend in UNDELIVERED_SMS_BACKENDS and not settings.DEBUG:
+        return [Error(
+            'VOTING_OTP_ENABLED is on but VOTING_SMS_BACKEND does not send SMS, so no voter could log in.',
+            hint="Set VOTING_SMS_BACKEND to 'VotingApp.sms.backends.http.SmsBackend' or turn VOTING_OTP_ENABLED off.",
+            id='VotingApp.E001',
+        )]
+    return []
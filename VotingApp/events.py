@@ -0,0 +1,355 @@
+"""
+Change-data-capture log of votes, voters and candidates.
+
+Every committed vote, voter added, reset or removed and candidate added or
+edited is appended to a JSON-lines log under ``VOTING_EVENTS_DIR``, so other
+systems (SMS confirmations, the results graphic, the archive) can follow the
+election without polling the database. Each line is one event::
+
+    {"offset":1042,"type":"vote.cast","at":"...","election":3,"key":"vote:981","data":{...}}
+
+``offset`` numbers the events of the whole log in order. A consumer keeps
+the offset of the last event it handled and asks for the ones after it,
+with ``GET /api/events/?after=<offset>`` or :meth:`EventLog.read`;
+``manage.py tail_events --follow`` prints them as they arrive.
+
+The events of a transaction are collected as it runs and appended together
+by one ``on_commit`` callback, before the response goes out, in a single
+write under an ``flock`` so the worker processes on a host number their
+events in one sequence. Nothing is logged for a transaction, or savepoint,
+that rolls back. Delivery is at most once: a worker that dies between the
+database commit and the append, or an append that fails (it is logged and
+the request carries on), loses those events. The write is not fsynced, so
+it survives a crash of the process but not of the host.
+
+The log is split into segments named after their first offset; a new one is
+started once the current one reaches ``VOTING_EVENTS_SEGMENT_BYTES``.
+``manage.py compact_events`` rewrites the closed segments keeping only the
+latest event per key: a removed voter's ``voter.removed`` replaces their
+``voter.added``, a retracted vote's ``vote.retracted`` its ``vote.cast``,
+a candidate's last edit the earlier ones. Offsets are kept, so consumers
+resume where they were.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+# Every line starts with its offset, so it can be read without decoding the event
+PREFIX = b'{"offset":'
+SUFFIX = '.jsonl'
+# Below this many bytes a segment is scanned instead of bisected
+SCAN_BYTES = 4096
+
+
+def _setting(name, default):
+    return getattr(settings, f'VOTING_EVENTS_{name}', default)
+
+
+def offset_of(line):
+    return int(line[len(PREFIX):line.index(b',', len(PREFIX))])
+
+
+@contextmanager
+def _flock(fd, operation):
+    fcntl.flock(fd, operation)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class EventLog:
+    """The segment files of one log directory"""
+
+    def __init__(self, path, segment_bytes=16 * 1024 * 1024):
+        self.path = Path(path)
+        self.segment_bytes = segment_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Appends and rotation hold write.lock; readers share swap.lock, which
+        # compaction takes while it swaps segments
+        self._write_fd = os.open(self.path / 'write.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        # flock is per open file description, so threads in one process
+        # also need a lock of their own
+        self._thread_lock = threading.Lock()
+        # (segment name, size, next offset) after this process's last append
+        self._head = None
+
+    def segments(self):
+        """``(first offset, path)`` of every segment, oldest first"""
+        return sorted(
+            (int(path.name[:-len(SUFFIX)]), path)
+            for path in self.path.glob(f'*{SUFFIX}') if path.name[:-len(SUFFIX)].isdigit()
+        )
+
+    def _segment_path(self, first):
+        return self.path / f'{first:020d}{SUFFIX}'
+
+    @contextmanager
+    def _swap_lock(self, operation):
+        fd = os.open(self.path / 'swap.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with _flock(fd, operation):
+                yield
+        finally:
+            os.close(fd)
+
+    def _next_offset(self, path, size):
+        """The offset after the last complete event in ``path``; cuts off a torn last line"""
+        if self._head and self._head[:2] == (path.name, size):
+            return self._head[2]
+        with open(path, 'rb+') as f:
+            chunk = 65536
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                tail = f.read(size - start)
+                end = tail.rfind(b'\n')
+                begin = tail.rfind(b'\n', 0, max(end, 0)) + 1
+                # Read back until the last complete line is in view
+                if start == 0 or (end != -1 and begin > 0):
+                    break
+                chunk *= 2
+            if end + 1 != len(tail):
+                # A write cut short by a crash
+                f.truncate(start + end + 1)
+        if end == -1:
+            return int(path.name[:-len(SUFFIX)])
+        return offset_of(tail[begin:end]) + 1
+
+    def append(self, events):
+        """Write ``events`` (dicts without an offset) in one go; return the last offset"""
+        with self._thread_lock, _flock(self._write_fd, fcntl.LOCK_EX):
+            segments = self.segments()
+            if segments:
+                path = segments[-1][1]
+                size = path.stat().st_size
+                offset = self._next_offset(path, size)
+                size = path.stat().st_size
+            if not segments or size >= self.segment_bytes:
+                offset = offset if segments else 1
+                path, size = self._segment_path(offset), 0
+            lines = []
+            for event in events:
+                body = json.dumps(event, separators=(',', ':'), cls=DjangoJSONEncoder)
+                lines.append(b'%s%d,%s\n' % (PREFIX, offset, body[1:].encode()))
+                offset += 1
+            data = b''.join(lines)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            self._head = (path.name, size + len(data), offset)
+        return offset - 1
+
+    def read(self, after=0, limit=1000):
+        """Up to ``limit`` events after offset ``after``, oldest first, as raw JSON lines"""
+        lines = []
+        with self._swap_lock(fcntl.LOCK_SH):
+            segments = self.segments()
+            # The segment holding the next event, and the later ones
+            first = 0
+            for index, (start, _) in enumerate(segments):
+                if start <= after + 1:
+                    first = index
+            for _, path in segments[first:]:
+                with open(path, 'rb') as f:
+                    f.seek(self._position(f, os.fstat(f.fileno()).st_size, after))
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # Still being written
+                            return lines
+                        if offset_of(line) > after:
+                            lines.append(line[:-1])
+                            if len(lines) >= limit:
+                                return lines
+        return lines
+
+    @staticmethod
+    def _position(f, size, after):
+        """A line start in ``f`` at or before its first event after ``after``"""
+        low, high = 0, size
+        while high - low > SCAN_BYTES:
+            middle = (low + high) // 2
+            f.seek(middle - 1)
+            f.readline()
+            position = f.tell()
+            line = f.readline()
+            if position >= high or not line.endswith(b'\n') or offset_of(line) > after:
+                high = middle
+            else:
+                low = position + len(line)
+        return low
+
+    def first_offset(self):
+        segments = self.segments()
+        return segments[0][0] if segments else 1
+
+    def compact(self):
+        """Rewrite the closed segments keeping the latest event per key; return ``(events before, after)``"""
+        with self._thread_lock, _flock(self._write_fd, fcntl.LOCK_EX):
+            closed = self.segments()[:-1]
+        if not closed:
+            return 0, 0
+        latest = {}
+        before = 0
+        for _, path in closed:
+            with open(path, 'rb') as f:
+                for line in f:
+                    before += 1
+                    key = json.loads(line)['key']
+                    # Re-inserting keeps the events in offset order
+                    latest.pop(key, None)
+                    latest[key] = line
+
+        outputs = []
+        out = None
+        try:
+            for line in latest.values():
+                if out is None or out.tell() >= self.segment_bytes:
+                    out = tempfile.NamedTemporaryFile(dir=self.path, suffix='.tmp', delete=False)
+                    outputs.append((out, self._segment_path(offset_of(line))))
+                out.write(line)
+            for out, _ in outputs:
+                out.close()
+            with self._swap_lock(fcntl.LOCK_EX):
+                if not all(path.exists() for _, path in closed):
+                    raise FileNotFoundError('Another compaction replaced these segments')
+                for out, path in outputs:
+                    os.replace(out.name, path)
+                kept = {path for _, path in outputs}
+                for _, path in closed:
+                    if path not in kept:
+                        path.unlink()
+        finally:
+            for out, _ in outputs:
+                out.close()
+                if os.path.exists(out.name):
+                    os.unlink(out.name)
+        return before, len(latest)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def enabled():
+    return bool(_setting('DIR', None)) and fcntl is not None
+
+
+def get_log():
+    """This process's handle on the log, or None if it is disabled"""
+    if not enabled():
+        return None
+    path = _setting('DIR', None)
+    log = _logs.get(str(path))
+    if log is None:
+        with _logs_lock:
+            log = _logs.get(str(path))
+            if log is None:
+                log = _logs[str(path)] = EventLog(path, _setting('SEGMENT_BYTES', 16 * 1024 * 1024))
+    return log
+
+
+class _Batch(list):
+    """Events of one savepoint waiting for the transaction to commit"""
+
+    def __init__(self, savepoints):
+        super().__init__()
+        self.savepoints = savepoints
+        self.written = False
+
+    def __call__(self):
+        self.written = True
+        get_log().append(self)
+
+
+def _pending(connection):
+    """The batch to add events to, registering a new one unless the latest is still open here"""
+    batch = getattr(connection, 'voting_events', None)
+    hooks = connection.run_on_commit
+    # A batch belongs to one savepoint, so it is dropped along with a rolled
+    # back one, and only the last callback is extended so the log keeps the
+    # order the events were emitted in
+    if (
+        batch is None or batch.written or not hooks or hooks[-1][1] is not batch
+        or batch.savepoints != connection.savepoint_ids
+    ):
+        batch = connection.voting_events = _Batch(list(connection.savepoint_ids))
+        transaction.on_commit(batch, robust=True)
+    return batch
+
+
+def emit_many(events):
+    """Log ``events`` once the current transaction commits (at once outside one)"""
+    events = list(events)
+    if not events or not enabled():
+        return
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        _pending(connection).extend(events)
+    else:
+        # robust: a failed append is logged rather than failing a request whose data is committed
+        transaction.on_commit(lambda: get_log().append(events), robust=True)
+
+
+def _event(kind, election_id, key, data):
+    return {'type': kind, 'at': timezone.now(), 'election': election_id, 'key': key, 'data': data}
+
+
+def emit(kind, election_id, key, data):
+    emit_many([_event(kind, election_id, key, data)])
+
+
+def vote_cast(vote, phone):
+    emit('vote.cast', vote.election_id, f'vote:{vote.id}', {
+        'id': vote.id, 'voter': vote.voter_id, 'phone': phone, 'candidate': vote.candidate_id,
+        'position': vote.position, 'voted_at': vote.voted_at,
+    })
+
+
+def voters_added(election_id, voters):
+    """``voters`` holds ``(voter id, phone number)`` pairs"""
+    if enabled():
+        emit_many(
+            _event('voter.added', election_id, f'voter:{voter_id}', {'id': voter_id, 'phone': phone})
+            for voter_id, phone in voters
+        )
+
+
+def _retracted(election_id, vote_ids):
+    return [_event('vote.retracted', election_id, f'vote:{vote_id}', {'id': vote_id}) for vote_id in vote_ids]
+
+
+def votes_retracted(election_id, vote_ids):
+    if enabled():
+        emit_many(_retracted(election_id, vote_ids))
+
+
+def voters_changed(election_id, kind, voters, vote_ids):
+    """Voters removed or reset (``kind`` is ``voter.removed`` or ``voter.reset``) and the votes that went with them"""
+    if enabled():
+        emit_many(_retracted(election_id, vote_ids) + [
+            _event(kind, election_id, f'voter:{voter_id}', {'id': voter_id, 'phone': phone}) for voter_id, phone in voters
+        ])
+
+
+def candidate_saved(candidate, created=False):
+    emit('candidate.added' if created else 'candidate.updated', candidate.election_id, f'candidate:{candidate.id}', {
+        'id': candidate.id, 'name': candidate.name, 'nickname': candidate.nickname, 'position': candidate.position,
+    })
@@ -0,0 +1 @@
+"""Machine-readable exports of an election's votes and results"""
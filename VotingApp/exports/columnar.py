@@ -0,0 +1,185 @@
+"""
+Compact columnar snapshot of an election's vote log.
+
+Layout (little-endian)::
+
+    header    64 bytes, see HEADER
+    voter     int64[rows]   voter ids
+    candidate uint32[rows]  candidate ids, padded to 8 bytes
+    voted_at  int64[rows]   microseconds since the Unix epoch (UTC)
+    dictionary              UTF-8 JSON: election, candidates and positions
+
+Rows are in vote id order. The writer streams votes from the database in
+chunks and spills the later columns to temporary files, so memory stays flat
+however large the log is. The reader memory-maps the file and exposes each
+column as a ``memoryview``, so scans run over the raw arrays without the ORM
+or any parsing.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+MAGIC = b'VCOLS001'
+HEADER = struct.Struct('<8sQQQQQQ')
+HEADER_SIZE = 64
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotFormatError(Exception):
+    """Raised when a file is not a columnar vote snapshot"""
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _pad(out):
+    remainder = out.tell() % 8
+    if remainder:
+        out.write(bytes(8 - remainder))
+
+
+def write_snapshot(election, path, chunk_size=10000):
+    """Write ``election``'s votes to ``path``; return the number of rows"""
+    from VotingApp.models import Candidate, Vote
+
+    path = Path(path)
+    rows = 0
+    with open(path, 'wb') as out, tempfile.TemporaryFile() as candidates_tmp, tempfile.TemporaryFile() as times_tmp:
+        out.write(bytes(HEADER_SIZE))
+        voter_offset = out.tell()
+        votes = (
+            Vote.objects.filter(election=election).order_by('id')
+            .values_list('voter_id', 'candidate_id', 'voted_at')
+            .iterator(chunk_size=chunk_size)
+        )
+        voters, candidates, times = [], [], []
+        for voter_id, candidate_id, voted_at in votes:
+            voters.append(voter_id)
+            candidates.append(candidate_id)
+            times.append((voted_at - EPOCH) // ONE_MICROSECOND)
+            if len(voters) == chunk_size:
+                out.write(_pack('q', voters))
+                candidates_tmp.write(_pack('I', candidates))
+                times_tmp.write(_pack('q', times))
+                rows += len(voters)
+                voters, candidates, times = [], [], []
+        out.write(_pack('q', voters))
+        candidates_tmp.write(_pack('I', candidates))
+        times_tmp.write(_pack('q', times))
+        rows += len(voters)
+
+        offsets = []
+        for spilled in (candidates_tmp, times_tmp):
+            _pad(out)
+            offsets.append(out.tell())
+            spilled.seek(0)
+            while block := spilled.read(1 << 20):
+                out.write(block)
+
+        dictionary_offset = out.tell()
+        catalog = list(Candidate.objects.filter(election=election).order_by('id').values_list('id', 'name', 'position'))
+        positions = sorted({position for _, _, position in catalog})
+        dictionary = json.dumps({
+            'election': {'id': election.id, 'title': election.election_title, 'timezone': election.timezone},
+            'positions': positions,
+            'candidates': {
+                str(candidate_id): {'name': name, 'position': positions.index(position)}
+                for candidate_id, name, position in catalog
+            },
+        }).encode()
+        out.write(dictionary)
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, rows, voter_offset, offsets[0], offsets[1], dictionary_offset, len(dictionary)))
+    return rows
+
+
+class ColumnarSnapshot:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    ``voter_ids``, ``candidate_ids`` and ``timestamps`` are memoryviews over
+    the mapped columns; ``candidates`` maps candidate id to
+    ``(name, position)``.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                raise SnapshotFormatError(f'{self.path} is empty')
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, rows, voter_offset, candidate_offset, time_offset, dict_offset, dict_size = (
+                HEADER.unpack_from(self._map, 0)
+            )
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self._map.close()
+            raise SnapshotFormatError(f'{self.path} is not a columnar vote snapshot')
+        if sys.byteorder == 'big':
+            self._map.close()
+            raise SnapshotFormatError('Memory-mapped reads need a little-endian host')
+
+        self.rows = rows
+        view = memoryview(self._map)
+        self._view = view
+        self.voter_ids = view[voter_offset:voter_offset + 8 * rows].cast('q')
+        self.candidate_ids = view[candidate_offset:candidate_offset + 4 * rows].cast('I')
+        self.timestamps = view[time_offset:time_offset + 8 * rows].cast('q')
+        dictionary = json.loads(bytes(view[dict_offset:dict_offset + dict_size]))
+        self.election = dictionary['election']
+        self.positions = dictionary['positions']
+        self.candidates = {
+            int(candidate_id): (entry['name'], self.positions[entry['position']])
+            for candidate_id, entry in dictionary['candidates'].items()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views must be released before the map can be closed
+        for name in ('voter_ids', 'candidate_ids', 'timestamps', '_view'):
+            getattr(self, name).release()
+        self._map.close()
+
+    def tally(self):
+        """Votes per candidate id"""
+        return Counter(self.candidate_ids)
+
+    def tally_by_position(self):
+        """``{position: {candidate name: votes}}``"""
+        results = {}
+        for candidate_id, votes in self.tally().items():
+            name, position = self.candidates.get(candidate_id, (f'#{candidate_id}', '—'))
+            results.setdefault(position, {})[name] = votes
+        return results
+
+    def turnout(self):
+        """Number of distinct voters in the log"""
+        return len(set(self.voter_ids))
+
+    def time_range(self):
+        """First and last vote as aware UTC datetimes, or ``(None, None)``"""
+        if not self.rows:
+            return None, None
+        return (
+            EPOCH + ONE_MICROSECOND * min(self.timestamps),
+            EPOCH + ONE_MICROSECOND * max(self.timestamps),
+        )
@@ -0,0 +1,127 @@
+"""
+Cursor-based incremental export of the vote log.
+
+Vote ids only ever grow, so the id of the last vote a client has seen is a
+cursor: the next sync reads ``id > cursor`` straight off the primary key and
+its cost depends on the number of new votes, not the size of the table. Each
+export also carries the current tallies of the candidates those new votes
+touched, and the cursor to send next time.
+
+Votes removed later (a voter being deleted) are not replayed; the touched
+candidates' tallies are the only place such changes show up.
+"""
+import csv
+import json
+from django.conf import settings
+from django.db.models import Count
+
+from VotingApp import tally_store
+from VotingApp.models import Candidate, Vote
+
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_HEADER = ['record', 'vote_id', 'voted_at', 'voter_phone', 'candidate_id', 'candidate', 'position', 'votes']
+
+
+def cursor_for_time(election, since):
+    """Cursor just before the first vote cast after ``since``"""
+    first = (
+        Vote.objects.filter(election=election, voted_at__gt=since)
+        .order_by('voted_at', 'id').values_list('id', flat=True).first()
+    )
+    if first is None:
+        return Vote.objects.filter(election=election).order_by('-id').values_list('id', flat=True).first() or 0
+    return first - 1
+
+
+class VoteDelta:
+    """The votes of one election in ``(cursor, upper]``, read in id order.
+
+    ``upper`` is fixed up front so a sync is a consistent page even while
+    votes keep arriving; at most ``limit`` votes are included and
+    ``has_more`` says whether the client should call again straight away.
+    """
+
+    def __init__(self, election, cursor=0, limit=None, chunk_size=2000):
+        if limit is None:
+            limit = getattr(settings, 'VOTING_EXPORT_PAGE_SIZE', 50000)
+        self.election = election
+        self.cursor = cursor
+        self.chunk_size = chunk_size
+        newer = Vote.objects.filter(election=election, id__gt=cursor).order_by('id').values_list('id', flat=True)
+        last = newer[limit - 1:limit + 1]
+        if len(last):
+            self.upper = last[0]
+            self.has_more = len(last) > 1
+        else:
+            # Fewer than ``limit`` new votes: take them all
+            self.upper = newer.reverse().first() or cursor
+            self.has_more = False
+        self.touched = set()
+
+    def votes(self):
+        """Yield ``(id, voted_at, phone, candidate_id, candidate, position)`` rows"""
+        rows = (
+            Vote.objects.filter(election=self.election, id__gt=self.cursor, id__lte=self.upper)
+            .order_by('id')
+            .values_list('id', 'voted_at', 'voter__phone_number', 'candidate_id', 'candidate__name', 'position')
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for row in rows:
+            self.touched.add(row[3])
+            yield row
+
+    def tallies(self):
+        """Current ``(candidate_id, name, position, votes)`` for the candidates seen in ``votes()``"""
+        if not self.touched:
+            return []
+        candidates = Candidate.objects.filter(id__in=self.touched).order_by('position', 'name')
+        snapshot = tally_store.get_snapshot()
+        if snapshot is None:
+            counts = dict(
+                Vote.objects.filter(election=self.election, candidate_id__in=self.touched)
+                .values_list('candidate_id').annotate(total=Count('id'))
+            )
+        else:
+            counts = {candidate_id: snapshot.votes_for(candidate_id) for candidate_id in self.touched}
+        return [(c.id, c.name, c.position, counts.get(c.id, 0)) for c in candidates]
+
+
+def render_jsonl(delta):
+    """Stream a delta as JSON Lines: votes, then tallies, then the next cursor"""
+    for vote_id, voted_at, phone, candidate_id, candidate, position in delta.votes():
+        yield json.dumps({
+            'type': 'vote', 'id': vote_id, 'voted_at': voted_at.isoformat(), 'voter_phone': phone,
+            'candidate_id': candidate_id, 'candidate': candidate, 'position': position,
+        }) + '\n'
+    for candidate_id, name, position, votes in delta.tallies():
+        yield json.dumps({
+            'type': 'tally', 'candidate_id': candidate_id, 'candidate': name, 'position': position, 'votes': votes,
+        }) + '\n'
+    yield json.dumps({'type': 'cursor', 'next': delta.upper, 'has_more': delta.has_more}) + '\n'
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(delta):
+    """Stream a delta as CSV, tagging each row with its record type.
+
+    The final ``cursor`` row holds the next cursor under ``vote_id`` and 1
+    under ``votes`` when more votes are waiting.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for vote_id, voted_at, phone, candidate_id, candidate, position in delta.votes():
+        yield writer.writerow(['vote', vote_id, voted_at.isoformat(), phone, candidate_id, candidate, position, ''])
+    for candidate_id, name, position, votes in delta.tallies():
+        yield writer.writerow(['tally', '', '', '', candidate_id, name, position, votes])
+    yield writer.writerow(['cursor', delta.upper, '', '', '', '', '', int(delta.has_more)])
+
+
+def render(delta, fmt):
+    return render_csv(delta) if fmt == 'csv' else render_jsonl(delta)
@@ -0,0 +1,101 @@
+"""CSV results report behind the "download results" button"""
+import csv
+
+from django.utils import timezone
+
+from VotingApp.models import Vote
+
+
+def write(out, election, candidates_qs, total_votes, total_voters, unique_voters_voted, ranked_results=()):
+    """Write the report for ``election`` to the file-like ``out``.
+
+    ``ranked_results`` are the round-by-round counts from ``views._ranked_results``.
+    """
+    turnout_pct = round((unique_voters_voted / total_voters) * 100, 2) if total_voters else 0
+
+    writer = csv.writer(out)
+    
+    # Write header information
+    writer.writerow(['ELECTION RESULTS REPORT'])
+    writer.writerow([])
+    writer.writerow(['Election Title:', election.election_title])
+    writer.writerow(['Generated On:', timezone.now().strftime('%B %d, %Y at %I:%M %p')])
+    writer.writerow(['Timezone:', election.timezone])
+    writer.writerow([])
+    
+    # Write summary statistics
+    writer.writerow(['SUMMARY STATISTICS'])
+    writer.writerow(['Total Votes Cast:', total_votes])
+    writer.writerow(['Total Registered Voters:', total_voters])
+    writer.writerow(['Voters Who Voted:', unique_voters_voted])
+    writer.writerow(['Turnout Percentage:', f'{turnout_pct}%'])
+    writer.writerow([])
+    
+    # Write overall results
+    writer.writerow(['OVERALL RESULTS'])
+    writer.writerow(['Rank', 'Candidate Name', 'Position', 'Votes', 'Percentage'])
+    
+    rank = 1
+    for c in candidates_qs:
+        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
+        writer.writerow([rank, c.name, c.position, c.votes_count, f'{percentage}%'])
+        rank += 1
+    
+    writer.writerow([])
+    
+    # Write results by position
+    writer.writerow(['RESULTS BY POSITION'])
+    writer.writerow([])
+    
+    # Group by position
+    by_position = {}
+    for c in candidates_qs:
+        if c.position not in by_position:
+            by_position[c.position] = []
+        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
+        by_position[c.position].append({
+            'name': c.name,
+            'votes': c.votes_count,
+            'percentage': percentage
+        })
+    
+    for position, candidates in by_position.items():
+        writer.writerow([f'Position: {position}'])
+        writer.writerow(['Rank', 'Candidate Name', 'Votes', 'Percentage', 'Status'])
+        
+        for idx, c in enumerate(candidates, 1):
+            status = 'WINNER' if idx == 1 and c['votes'] > 0 else ''
+            # Check for tie
+            if idx == 1 and len(candidates) >= 2 and candidates[0]['votes'] == candidates[1]['votes']:
+                status = 'TIE'
+            writer.writerow([idx, c['name'], c['votes'], f"{c['percentage']}%", status])
+        
+        writer.writerow([])
+    
+    # Write ranked-choice rounds
+    if ranked_results:
+        writer.writerow(['RANKED-CHOICE COUNTS'])
+        writer.writerow([])
+    for contest in ranked_results:
+        writer.writerow([f"Position: {contest['position']}"])
+        writer.writerow(['Method:', contest['method'], 'Seats:', contest['seats'], 'Ballots:', contest['ballots']])
+        if contest['quota'] is not None:
+            writer.writerow(['Quota:', contest['quota']])
+        writer.writerow(['Candidate'] + [f'Round {number}' for number in contest['rounds']] + ['Outcome'])
+        for row in contest['rows']:
+            writer.writerow([row['name']] + ['' if votes is None else votes for votes in row['votes']] + [row['status']])
+        writer.writerow(['Exhausted'] + contest['exhausted'] + [''])
+        writer.writerow([])
+
+    # Write vote details
+    writer.writerow(['DETAILED VOTE LOG'])
+    writer.writerow(['Voter Phone', 'Candidate', 'Position', 'Voted At'])
+    
+    votes = Vote.objects.filter(election=election).select_related('voter', 'candidate').order_by('-voted_at')
+    for vote in votes:
+        writer.writerow([
+            vote.voter.phone_number,
+            vote.candidate.name,
+            vote.candidate.position,
+            vote.voted_at.strftime('%B %d, %Y at %I:%M %p')
+        ])
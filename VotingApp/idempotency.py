@@ -0,0 +1,152 @@
+"""
+Deduplication of repeated ballot submissions.
+
+Voters on flaky mobile networks double-tap the vote button or have their
+browser resend the form. Every ballot form carries a random
+``idempotency_key``; the first POST with a key runs as usual and its
+response is kept for ``VOTING_IDEMPOTENCY_TTL`` seconds. A repeat of the
+key within that time gets a copy of the same response straight from memory,
+before the session or the database is read. A repeat that arrives while the
+first request is still running waits up to ``VOTING_IDEMPOTENCY_WAIT``
+seconds for its outcome instead of running alongside it.
+
+Keys are scoped to the session cookie, so a key seen by someone else cannot
+fetch another voter's receipt. The cache holds at most
+``VOTING_IDEMPOTENCY_MAX_KEYS`` responses per process, oldest dropped first,
+and like the anomaly detector it is not shared between worker processes: a
+retry that lands on another worker runs again and is caught by the
+one-vote-per-position check.
+"""
+import functools
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+
+FIELD = 'idempotency_key'
+REPLAY_HEADER = 'Idempotent-Replay'
+
+
+def _setting(name, default):
+    return getattr(settings, f'VOTING_IDEMPOTENCY_{name}', default)
+
+
+def new_key():
+    return secrets.token_urlsafe(16)
+
+
+class Entry:
+    """One submission: in flight until ``done`` is set, then its response snapshot (None if not kept)"""
+    __slots__ = ('expires', 'done', 'snapshot')
+
+    def __init__(self, expires):
+        self.expires = expires
+        self.done = threading.Event()
+        self.snapshot = None
+
+    def replay(self):
+        if self.snapshot is None:
+            return None
+        status, content, headers = self.snapshot
+        response = HttpResponse(content, status=status)
+        for name, value in headers:
+            response[name] = value
+        response[REPLAY_HEADER] = 'true'
+        return response
+
+
+class ResponseCache:
+    """Responses by key, for ``VOTING_IDEMPOTENCY_TTL`` seconds and at most ``VOTING_IDEMPOTENCY_MAX_KEYS`` keys"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def claim(self, key):
+        """Return ``(entry, owner)``; the owner runs the request and must call :meth:`finish`"""
+        now = time.monotonic()
+        with self.lock:
+            # Every entry lives as long, so the oldest expire first
+            while self.entries and next(iter(self.entries.values())).expires <= now:
+                self.entries.popitem(last=False)
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry, False
+            entry = self.entries[key] = Entry(now + _setting('TTL', 300))
+            while len(self.entries) > _setting('MAX_KEYS', 10000):
+                self.entries.popitem(last=False)
+            return entry, True
+
+    def finish(self, key, entry, response):
+        """Keep ``response`` for repeats of ``key`` and wake the ones waiting for it"""
+        entry.snapshot = _snapshot(response)
+        if entry.snapshot is None:
+            # Let a retry run again rather than replay nothing
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+        entry.done.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+responses = ResponseCache()
+
+
+def _snapshot(response):
+    if response is None or response.streaming or response.status_code >= 500:
+        return None
+    return response.status_code, response.content, list(response.items())
+
+
+def _request_key(request):
+    """The submission's key, scoped to the session and URL; None when the request has none"""
+    key = request.POST.get(FIELD, '')
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not key or len(key) > 64 or not session:
+        return None
+    return session, request.path, key
+
+
+def idempotent(view):
+    """Answer repeated POSTs of the same ``idempotency_key`` with the first one's response"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            key = _request_key(request) if request.method == 'POST' else None
+            if key is None:
+                return await view(request, *args, **kwargs)
+            entry, owner = responses.claim(key)
+            if not owner:
+                if not entry.done.is_set():
+                    await sync_to_async(entry.done.wait, thread_sensitive=False)(_setting('WAIT', 10))
+                return entry.replay() or await view(request, *args, **kwargs)
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+                return response
+            finally:
+                responses.finish(key, entry, response)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = _request_key(request) if request.method == 'POST' else None
+            if key is None:
+                return view(request, *args, **kwargs)
+            entry, owner = responses.claim(key)
+            if not owner:
+                entry.done.wait(_setting('WAIT', 10))
+                return entry.replay() or view(request, *args, **kwargs)
+            response = None
+            try:
+                response = view(request, *args, **kwargs)
+                return response
+            finally:
+                responses.finish(key, entry, response)
+    return wrapper
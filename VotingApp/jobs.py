@@ -0,0 +1,157 @@
+"""
+Background jobs for the slow admin actions.
+
+Large voter imports, the CSV/PDF result reports and ``clear_data`` can take
+minutes on a big election, far longer than a web worker should be tied up.
+Views enqueue them as :class:`~VotingApp.models.Job` rows instead and return
+at once; ``manage.py run_jobs`` claims due jobs and runs them on a thread or
+process pool, and admin pages poll ``/api/jobs/<id>/`` for their progress.
+
+A task is a function registered with :func:`task`, called with the job and
+the job's ``params`` as keyword arguments. It reports progress with
+``job.report(done, total)`` and returns a JSON result, optionally with the
+name of a file it wrote under ``VOTING_JOBS_DIR`` (see :func:`output_path`).
+A task that raises is retried with exponential backoff
+(``VOTING_JOBS_RETRY_DELAY``) until the job's ``max_attempts`` are used up,
+so tasks must be safe to run again. Jobs whose worker died mid-run are
+requeued once they have not reported for ``VOTING_JOBS_STALE_AFTER`` seconds.
+"""
+import logging
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Register the decorated function as the task for jobs of kind ``name``"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def jobs_dir():
+    return Path(getattr(settings, 'VOTING_JOBS_DIR', settings.BASE_DIR / 'var' / 'jobs'))
+
+
+def output_path(job, filename):
+    """Where ``job`` writes its output file ``filename``"""
+    path = jobs_dir() / f'{job.id}-{filename}'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def run(job):
+    """Run a claimed job to completion or to a recorded failure"""
+    func = TASKS.get(job.kind)
+    try:
+        if func is None:
+            raise LookupError(f'No task is registered for jobs of kind {job.kind!r}')
+        outcome = func(job, **job.params)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)', job.id, job.attempts, job.max_attempts)
+        job.fail(traceback.format_exc(limit=5), getattr(settings, 'VOTING_JOBS_RETRY_DELAY', 10))
+        return job
+    result, result_file = outcome if isinstance(outcome, tuple) else (outcome, '')
+    job.succeed(result, result_file)
+    return job
+
+
+def run_by_id(job_id):
+    """Run the claimed job ``job_id``; the entry point of pool workers"""
+    close_old_connections()
+    try:
+        run(Job.objects.get(id=job_id))
+    finally:
+        connections.close_all()
+
+
+def work(workers=2, processes=False, poll=1.0, once=False, on_finish=None):
+    """Claim and run due jobs on a pool of ``workers`` threads (or processes).
+
+    With ``once`` it returns as soon as no job is due and none is running.
+    """
+    stale_after = getattr(settings, 'VOTING_JOBS_STALE_AFTER', 300)
+    if processes:
+        pool = ProcessPoolExecutor(workers)
+    else:
+        pool = ThreadPoolExecutor(workers, thread_name_prefix='voting-job')
+    running = {}
+    last_stale_check = 0.0
+    try:
+        while True:
+            if time.monotonic() - last_stale_check >= stale_after / 4:
+                requeued = Job.requeue_stale(stale_after)
+                if requeued:
+                    logger.warning('Requeued %s jobs whose worker stopped responding', requeued)
+                last_stale_check = time.monotonic()
+            while len(running) < workers:
+                job = Job.claim()
+                if job is None:
+                    break
+                if processes:
+                    # Pool processes may be forked on submit and must not
+                    # inherit an open database connection
+                    connections.close_all()
+                running[pool.submit(run_by_id, job.id)] = job.id
+            if not running:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                future.result()
+                if on_finish:
+                    on_finish(Job.objects.get(id=job_id))
+    finally:
+        pool.shutdown(wait=True)
+
+
+@task('import_voters')
+def import_voters(job, phone_numbers):
+    from .views import _import_voters
+
+    added, errors = _import_voters(job.election, phone_numbers, report=job.report)
+    job.report(len(phone_numbers), len(phone_numbers), f'Added {added} voters, {len(errors)} errors')
+    # Keep the first errors for the admin page; the rest are only counted
+    return {'added': added, 'errors': len(errors), 'first_errors': errors[:20]}
+
+
+def _report(job, fmt):
+    from .views import _report_filename, _write_report
+
+    job.report(0, 1, f'Rendering the {fmt.upper()} report')
+    filename = _report_filename(fmt)
+    path = output_path(job, filename)
+    with open(path, 'w', newline='', encoding='utf-8') if fmt == 'csv' else open(path, 'wb') as out:
+        _write_report(job.election, fmt, out)
+    return {'filename': filename, 'size': path.stat().st_size}, path.name
+
+
+@task('results_csv')
+def results_csv(job):
+    return _report(job, 'csv')
+
+
+@task('results_pdf')
+def results_pdf(job):
+    return _report(job, 'pdf')
+
+
+@task('clear_data')
+def clear_data(job, scope='votes_and_voters'):
+    from .management.commands.clear_data import clear
+
+    return clear([job.election] if job.election else None, scope, report=job.report)
@@ -0,0 +1,297 @@
+"""
+Offline polling-station kiosks and the central sync of their votes.
+
+A kiosk is a local instance of this app whose database is a copy of the
+central one taken before polling opens (``manage.py snapshot_replica`` makes
+one), so elections, candidates and voters carry the same ids. Set
+``VOTING_KIOSK_MODE = True`` there (and leave ``VOTING_OTP_ENABLED`` off,
+as the station checks voters in person): votes are recorded in the
+local database by the usual views whether or not the network is up, and the
+receipt page ends the voter's session for the next voter at the terminal.
+
+``manage.py sync_kiosk --every 30`` on the kiosk sends the votes recorded
+since its last successful sync to ``VOTING_KIOSK_SYNC_URL`` in batches of
+``VOTING_KIOSK_BATCH_SIZE``, each signed with HMAC-SHA256 under the
+station's key. A batch is named after the range of local vote ids it holds,
+so one resent after a lost reply is recognized by the server and answered
+from :class:`~VotingApp.models.KioskBatch` instead of being applied again.
+The sync cursor only moves past a batch once the server has answered it.
+
+The central server lists each station's key in ``VOTING_KIOSK_STATIONS``.
+:func:`apply_batch` checks every vote against the same rules as the ballot
+page (voter on the roll, candidate standing in the position, cast within
+the election's voting hours, rankings only for ranked positions) and keeps
+the first vote per voter and position, whether it came from this batch, an
+earlier one, another station or the online ballot. The accepted votes are
+written in bulk in one transaction, one batch at a time.
+"""
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+
+from . import events, ranked, tally_store
+from .models import (
+    AuditHead, Candidate, KioskBatch, RankedBallot, RankedPosition, TurnoutCounter, Vote, VoteRollup, Voter,
+)
+
+SIGNATURE_HEADER = 'X-Kiosk-Signature'
+STATION_HEADER = 'X-Kiosk-Station'
+
+# Batches are applied one at a time within a process; across processes the
+# batch row written first takes the database's write lock
+_apply_lock = threading.Lock()
+
+
+def sign(body, key):
+    return hmac.new(key.encode(), body, hashlib.sha256).hexdigest()
+
+
+def station_key(station):
+    """The signing key the central server holds for ``station``, or None"""
+    return getattr(settings, 'VOTING_KIOSK_STATIONS', {}).get(station)
+
+
+def verify(station, body, signature):
+    key = station_key(station)
+    # As bytes: compare_digest refuses str with non-ASCII characters, which a header can carry
+    return bool(key and signature) and hmac.compare_digest(sign(body, key).encode(), signature.encode())
+
+
+# Central server
+
+def _check(vote, election, voters, candidates, contests):
+    """The voter, candidate, cast time and ranked contest of one synced vote; raises ValueError"""
+    voter = voters.get(vote.get('phone'))
+    if voter is None:
+        raise ValueError('Voter not on the roll')
+    candidate = candidates.get(vote.get('candidate'))
+    if candidate is None or candidate.position != vote.get('position'):
+        raise ValueError('Candidate not found in this position')
+    try:
+        voted_at = datetime.fromisoformat(vote['voted_at'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('voted_at must be an ISO 8601 timestamp')
+    if voted_at.tzinfo is None:
+        raise ValueError('voted_at must include a UTC offset')
+    # Only the voting hours: the kiosk checked its own switch when the vote
+    # was cast, and the central one is often turned off before stations sync
+    if (election.start_time and voted_at < election.start_time) or (election.end_time and voted_at > election.end_time):
+        raise ValueError('Voting was closed when this vote was cast')
+
+    contest = contests.get(candidate.position)
+    ranking = vote.get('ranking')
+    if contest is None and ranking:
+        raise ValueError('This position is not ranked')
+    if contest is not None:
+        ranking = ranking or [candidate.id]
+        if (
+            ranking[0] != candidate.id or len(set(ranking)) != len(ranking)
+            or any(candidates.get(c) is None or candidates[c].position != candidate.position for c in ranking)
+        ):
+            raise ValueError('Ranking must list distinct candidates of the position, starting with this one')
+    return voter, candidate, voted_at, contest, ranking
+
+
+def apply_batch(station, batch_id, election, votes):
+    """Record a station's batch of votes; return the outcome sent back to the station.
+
+    Each vote is a dict with ``phone``, ``candidate``, ``position``,
+    ``voted_at`` and, for ranked positions, ``ranking`` (candidate ids, most
+    preferred first).
+    """
+    with _apply_lock, transaction.atomic():
+        try:
+            with transaction.atomic():
+                batch = KioskBatch.objects.create(station=station, batch_id=batch_id, election=election)
+        except IntegrityError:
+            batch = KioskBatch.objects.get(station=station, batch_id=batch_id)
+            return _outcome(batch, replayed=True)
+
+        voters = {
+            voter.phone_number: voter
+            for voter in Voter.objects.filter(election=election, phone_number__in={v.get('phone') for v in votes})
+        }
+        candidates = {candidate.id: candidate for candidate in Candidate.objects.filter(election=election)}
+        contests = {contest.position: contest for contest in RankedPosition.objects.filter(election=election)}
+        voted = set(
+            Vote.objects.filter(election=election, voter__in=[voter.id for voter in voters.values()])
+            .values_list('voter_id', 'position')
+        )
+
+        accepted = []
+        for index, vote in enumerate(votes):
+            try:
+                voter, candidate, voted_at, contest, ranking = _check(vote, election, voters, candidates, contests)
+            except ValueError as e:
+                batch.rejected.append({'index': index, 'error': str(e)})
+                continue
+            if (voter.id, candidate.position) in voted:
+                batch.duplicates += 1
+                continue
+            voted.add((voter.id, candidate.position))
+            accepted.append((voter, candidate, voted_at, contest, ranking))
+
+        if accepted:
+            _record(election, accepted)
+        batch.accepted = len(accepted)
+        batch.save(update_fields=['accepted', 'duplicates', 'rejected'])
+    return _outcome(batch)
+
+
+def _record(election, accepted):
+    """Bulk insert checked votes with their audit entries, ballots and bookkeeping"""
+    accepted.sort(key=lambda item: item[2])
+    votes = Vote.objects.bulk_create([
+        Vote(election=election, voter=voter, candidate=candidate, position=candidate.position)
+        for voter, candidate, _, _, _ in accepted
+    ])
+    # voted_at is set on insert; keep the time the vote was cast at the station instead
+    Vote.objects.filter(id__in=[vote.id for vote in votes]).update(voted_at=Case(
+        *[When(id=vote.id, then=Value(voted_at)) for vote, (_, _, voted_at, _, _) in zip(votes, accepted)],
+        output_field=DateTimeField(),
+    ))
+    for vote, (_, _, voted_at, _, _) in zip(votes, accepted):
+        vote.voted_at = voted_at
+    AuditHead.append_many(votes)
+    generation = tally_store.generation()
+    RankedBallot.record([
+        (vote, contest, ranking) for vote, (_, _, _, contest, ranking) in zip(votes, accepted) if contest is not None
+    ])
+
+    # A voter's first vote, already sorted by cast time, marks them as having voted
+    voter_ids = {vote.voter_id for vote in votes}
+    first_timers = set(Voter.objects.filter(id__in=voter_ids, has_voted=False).values_list('id', flat=True))
+    first_votes = {}
+    for vote in votes:
+        if vote.voter_id in first_timers:
+            first_votes.setdefault(vote.voter_id, vote)
+    if first_votes:
+        Voter.objects.filter(id__in=first_votes, has_voted=False).update(has_voted=True, voted_at=Case(
+            *[When(id=voter_id, then=Value(vote.voted_at)) for voter_id, vote in first_votes.items()],
+            output_field=DateTimeField(),
+        ))
+        TurnoutCounter.increment(election, len(first_votes))
+    firsts = {vote.id for vote in first_votes.values()}
+    VoteRollup.record_batch(election, [(vote.voted_at, vote.position, vote.id in firsts) for vote in votes])
+    for vote in votes:
+        events.vote_cast(vote, vote.voter.phone_number)
+
+    def publish():
+        for vote in votes:
+            tally_store.record_vote(vote.candidate_id, election.id, new_voter=vote.id in firsts, generation=generation)
+    transaction.on_commit(publish)
+
+
+def _outcome(batch, replayed=False):
+    return {
+        'batch': batch.batch_id,
+        'accepted': batch.accepted,
+        'duplicates': batch.duplicates,
+        'rejected': batch.rejected,
+        'replayed': replayed,
+    }
+
+
+# Kiosk
+
+def cursor_path():
+    return Path(getattr(settings, 'VOTING_KIOSK_CURSOR_PATH', settings.BASE_DIR / 'var' / 'kiosk_cursor'))
+
+
+def read_cursor():
+    """Id of the last local vote the central server has answered for"""
+    try:
+        return int(cursor_path().read_text().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_cursor(vote_id):
+    path = cursor_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(vote_id))
+    os.replace(tmp, path)
+
+
+def pending_batches(cursor, batch_size):
+    """Yield ``(last_vote_id, payload)`` for the local votes after ``cursor``, one election per batch"""
+    while True:
+        rows = list(
+            Vote.objects.filter(id__gt=cursor).order_by('id')
+            .values_list('id', 'election_id', 'voter__phone_number', 'candidate_id', 'position', 'voted_at')[:batch_size]
+        )
+        if not rows:
+            return
+        # Stop at the first vote of another election; it starts the next batch
+        election_id = rows[0][1]
+        for end, row in enumerate(rows):
+            if row[1] != election_id:
+                rows = rows[:end]
+                break
+        rankings = _rankings([row[0] for row in rows])
+        votes = []
+        for vote_id, _, phone, candidate_id, position, voted_at in rows:
+            vote = {
+                'id': vote_id, 'phone': phone, 'candidate': candidate_id, 'position': position,
+                'voted_at': voted_at.isoformat(),
+            }
+            if vote_id in rankings:
+                vote['ranking'] = rankings[vote_id]
+            votes.append(vote)
+        yield rows[-1][0], {'batch': f'{rows[0][0]}-{rows[-1][0]}', 'election': election_id, 'votes': votes}
+        cursor = rows[-1][0]
+
+
+def _rankings(vote_ids):
+    """Candidate ids of the ranked ballots behind ``vote_ids``, most preferred first"""
+    ballots = list(RankedBallot.objects.filter(vote_id__in=vote_ids).values_list('vote_id', 'election_id', 'position', 'ranking'))
+    if not ballots:
+        return {}
+    contests = {
+        (contest.election_id, contest.position): contest.candidates
+        for contest in RankedPosition.objects.filter(election_id__in={b[1] for b in ballots})
+    }
+    return {
+        vote_id: [contests[(election_id, position)][index] for index in ranked.decode(bytes(ranking))]
+        for vote_id, election_id, position, ranking in ballots
+    }
+
+
+def post_batch(payload, url=None, station=None, key=None, timeout=30):
+    """Send one signed batch to the central server; return its JSON answer"""
+    url = url or settings.VOTING_KIOSK_SYNC_URL
+    station = station or settings.VOTING_KIOSK_STATION
+    key = key or settings.VOTING_KIOSK_KEY
+    body = json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=body, method='POST')
+    request.add_header('Content-Type', 'application/json')
+    request.add_header(STATION_HEADER, station)
+    request.add_header(SIGNATURE_HEADER, sign(body, key))
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def push(send=post_batch, batch_size=None):
+    """Send every unsynced local vote; return the server's answers.
+
+    Stops at the first batch that cannot be delivered, leaving it for the
+    next run. ``send`` posts one payload and returns the answer.
+    """
+    batch_size = batch_size or getattr(settings, 'VOTING_KIOSK_BATCH_SIZE', 500)
+    answers = []
+    for last_id, payload in pending_batches(read_cursor(), batch_size):
+        answers.append(send(payload))
+        write_cursor(last_id)
+    return answers
@@ -0,0 +1,169 @@
+import asyncio
+import importlib
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent-connection capacity per process of the WSGI path '
+        '(sync views on a fixed thread pool) and the ASGI path (async views)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/results/', help='URL to request (GET)')
+        parser.add_argument('--connections', type=int, default=200, help='Number of simultaneous clients')
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.2,
+            help='Seconds each simulated slow client takes to receive its response',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Worker threads available to the WSGI process (e.g. gunicorn --threads)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['connections']} clients, {options['client_delay']}s client delay, GET {options['path']}"
+        )
+        wsgi = self.run_wsgi(options)
+        with self.async_urlconf():
+            asgi = asyncio.run(self.run_asgi(options))
+        self.report(f"WSGI ({options['threads']} threads)", wsgi)
+        self.report('ASGI (async views)', asgi)
+
+    def async_urlconf(self):
+        """Temporarily route the voter views to VotingApp.async_views"""
+        import Voting.urls
+        command = self
+
+        class _Swap:
+            def __enter__(self):
+                self.override = override_settings(VOTING_ASYNC_VIEWS=True)
+                self.override.enable()
+                command.reload_urls(Voting.urls)
+
+            def __exit__(self, *exc):
+                self.override.disable()
+                command.reload_urls(Voting.urls)
+
+        return _Swap()
+
+    @staticmethod
+    def reload_urls(module):
+        importlib.reload(module)
+        clear_url_caches()
+
+    def run_wsgi(self, options):
+        handler = WSGIHandler()
+        stats = {'in_flight': 0, 'peak': 0, 'latencies': [], 'errors': 0}
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def connection(index):
+            with lock:
+                stats['in_flight'] += 1
+                stats['peak'] = max(stats['peak'], stats['in_flight'])
+            status = []
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': options['path'],
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'localhost',
+                'REMOTE_ADDR': f'10.0.{index // 256}.{index % 256}',
+                'wsgi.input': BytesIO(),
+                'wsgi.url_scheme': 'http',
+                'wsgi.errors': BytesIO(),
+            }
+            body = b''.join(handler(environ, lambda s, headers, exc_info=None: status.append(s)))
+            # The worker thread stays busy while a slow client drains the response
+            time.sleep(options['client_delay'])
+            with lock:
+                stats['in_flight'] -= 1
+                # All clients connect at once, so latency includes time queued for a thread
+                stats['latencies'].append(time.perf_counter() - started)
+                if not status or not status[0].startswith('200') or not body:
+                    stats['errors'] += 1
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(connection, range(options['connections'])))
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    async def run_asgi(self, options):
+        app = ASGIHandler()
+        stats = {'in_flight': 0, 'peak': 0, 'latencies': [], 'errors': 0}
+        started = time.perf_counter()
+
+        async def connection(index):
+            stats['in_flight'] += 1
+            stats['peak'] = max(stats['peak'], stats['in_flight'])
+            done = asyncio.Event()
+            requested = False
+            status = []
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': options['path'],
+                'raw_path': options['path'].encode(),
+                'root_path': '',
+                'query_string': b'',
+                'headers': [(b'host', b'localhost')],
+                'client': (f'10.0.{index // 256}.{index % 256}', 50000),
+                'server': ('localhost', 80),
+            }
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                    # A slow client only holds an idle coroutine, not a thread
+                    await asyncio.sleep(options['client_delay'])
+                    done.set()
+
+            await app(scope, receive, send)
+            stats['in_flight'] -= 1
+            stats['latencies'].append(time.perf_counter() - started)
+            if status != [200]:
+                stats['errors'] += 1
+
+        await asyncio.gather(*(connection(i) for i in range(options['connections'])))
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    def report(self, label, stats):
+        latencies = sorted(stats['latencies'])
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(self.style.SUCCESS(label))
+        self.stdout.write(f"  wall time:            {stats['elapsed']:.2f}s")
+        self.stdout.write(f"  throughput:           {len(latencies) / stats['elapsed']:.1f} req/s")
+        self.stdout.write(f"  peak concurrent conns: {stats['peak']}")
+        self.stdout.write(f"  latency p50 / p95:    {statistics.median(latencies):.3f}s / {p95:.3f}s")
+        if stats['errors']:
+            self.stdout.write(self.style.ERROR(f"  non-200 responses:    {stats['errors']}"))
@@ -0,0 +1,94 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from VotingApp.sms import SmsMessage
+from VotingApp.sms.backends.base import BaseSmsBackend
+from VotingApp.sms.outbound import OutboundQueue
+
+
+class SimulatedGateway(BaseSmsBackend):
+    """Sleeps like a gateway round trip; fails every ``fail_every``-th message once"""
+
+    def __init__(self, latency, per_message, fail_every=0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.per_message = per_message
+        self.fail_every = fail_every
+        self.calls = 0
+        self.seen = 0
+        self._lock = threading.Lock()
+
+    def send_messages(self, messages):
+        time.sleep(self.latency + self.per_message * len(messages))
+        failed = []
+        with self._lock:
+            self.calls += 1
+            for message in messages:
+                self.seen += 1
+                if self.fail_every and message.attempts == 0 and self.seen % self.fail_every == 0:
+                    failed.append(message)
+        return failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure outbound SMS queue throughput and the time a login spends handing '
+        'off its message, against a simulated gateway'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages to send per run')
+        parser.add_argument('--batch-sizes', default='1,10,50,100', help='Comma-separated batch sizes to compare')
+        parser.add_argument('--latency', type=float, default=0.02, help='Seconds per gateway call')
+        parser.add_argument('--per-message', type=float, default=0.0002, help='Extra seconds per message in a call')
+        parser.add_argument('--fail-every', type=int, default=0, help='Fail every Nth message once to exercise retries')
+        parser.add_argument('--producers', type=int, default=8, help='Threads enqueueing concurrently, like request workers')
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        self.stdout.write(
+            f"{count} messages, {options['producers']} producers, gateway {options['latency'] * 1000:.1f}ms "
+            f"per call + {options['per_message'] * 1000:.2f}ms per message"
+        )
+        direct = options['latency'] + options['per_message']
+        self.stdout.write(f'Sending inline from the login view would add {direct * 1000:.1f}ms to every login')
+
+        for batch_size in [int(size) for size in options['batch_sizes'].split(',')]:
+            gateway = SimulatedGateway(options['latency'], options['per_message'], options['fail_every'])
+            outbound = OutboundQueue(lambda: gateway, batch_size=batch_size, flush_interval=0.005, retry_delay=0.01)
+            started = time.perf_counter()
+            handoff = self.produce(outbound, count, options['producers'])
+            outbound.flush()
+            elapsed = time.perf_counter() - started
+            handoff.sort()
+            self.stdout.write(
+                f'  batch {batch_size:>4}: {count / elapsed:>9.0f} msg/s, {gateway.calls:>5} gateway calls, '
+                f"{outbound.stats['retried']} retried, enqueue p50 {statistics.median(handoff) * 1e6:.1f}us "
+                f'p99 {handoff[int(len(handoff) * 0.99)] * 1e6:.1f}us'
+            )
+
+    def produce(self, outbound, count, producers):
+        """Enqueue ``count`` messages from ``producers`` threads; return each put's duration"""
+        durations = []
+        lock = threading.Lock()
+
+        def worker(share):
+            local = []
+            for i in range(share):
+                message = SmsMessage(f'+2327{i:07d}', '123456 is your login code.')
+                started = time.perf_counter()
+                outbound.put(message)
+                local.append(time.perf_counter() - started)
+            with lock:
+                durations.extend(local)
+
+        shares = [count // producers + (1 if i < count % producers else 0) for i in range(producers)]
+        threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return durations
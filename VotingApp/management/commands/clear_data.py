@@ -1,5 +1,55 @@
-from django.core.management.base import BaseCommand
-from VotingApp.models import Voter, Candidate, Vote, ElectionSettings
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp.models import (
+    Voter, Candidate, Vote, Election, TurnoutCounter, VoteRollup, AuditHead, AuditEntry, MerkleNode, AuditCheckpoint,
+    Job,
+)
+from VotingApp import tally_store
+
+SCOPES = ('votes', 'voters', 'all', 'votes_and_voters')
+
+
+def _reset_counters(elections):
+    for election in elections:
+        TurnoutCounter.reset(election)
+    VoteRollup.objects.filter(election__in=elections).delete()
+    # Clearing votes starts the election's vote log afresh
+    for model in (AuditEntry, MerkleNode, AuditCheckpoint, AuditHead):
+        model.objects.filter(election__in=elections).delete()
+    tally_store.invalidate()
+
+
+def clear(elections, scope, report=None):
+    """Delete the ``scope`` data of ``elections`` (None for every election); return what was deleted.
+
+    ``scope`` is ``votes`` (and reset has_voted), ``voters`` (and their votes),
+    ``all`` (votes, voters and candidates) or ``votes_and_voters``.
+    """
+    if elections is None:
+        elections = Election.objects.all()
+    report = report or (lambda done, total, message=None: None)
+    votes = Vote.objects.filter(election__in=elections)
+    voters = Voter.objects.filter(election__in=elections)
+    candidates = Candidate.objects.filter(election__in=elections)
+
+    deleted = {'votes': votes.count()}
+    if scope != 'votes':
+        deleted['voters'] = voters.count()
+    if scope == 'all':
+        deleted['candidates'] = candidates.count()
+    report(0, 3, 'Deleting votes')
+
+    votes.delete()
+    if scope == 'votes':
+        # Reset has_voted flag for all voters
+        voters.update(has_voted=False, voted_at=None)
+    else:
+        report(1, 3, 'Deleting voters')
+        voters.delete()
+    if scope == 'all':
+        candidates.delete()
+    report(2, 3, 'Resetting counters')
+    _reset_counters(elections)
+    return deleted
 
 
 class Command(BaseCommand):
@@ -21,53 +71,55 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete only voters (and their votes)',
         )
+        parser.add_argument(
+            '--election',
+            type=int,
+            help='Only clear data for the election with this id (default: every election)',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the deletion for "manage.py run_jobs" instead of running it now',
+        )
 
     def handle(self, *args, **options):
+        elections = Election.objects.all()
+        if options['election'] is not None:
+            elections = elections.filter(id=options['election'])
+            if not elections.exists():
+                raise CommandError(f'Election {options["election"]} does not exist')
+
         if options['votes_only']:
-            # Delete only votes
-            vote_count = Vote.objects.count()
-            Vote.objects.all().delete()
-            
-            # Reset has_voted flag for all voters
-            Voter.objects.update(has_voted=False)
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully deleted {vote_count} votes'))
-            self.stdout.write(self.style.SUCCESS('Reset all voters has_voted status'))
-            
+            scope = 'votes'
         elif options['voters_only']:
-            # Delete voters (this will cascade delete votes too)
-            voter_count = Voter.objects.count()
-            vote_count = Vote.objects.count()
-            Voter.objects.all().delete()
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully deleted {voter_count} voters and {vote_count} votes'))
-            
+            scope = 'voters'
         elif options['all']:
-            # Delete everything except admin users and settings
-            vote_count = Vote.objects.count()
-            voter_count = Voter.objects.count()
-            candidate_count = Candidate.objects.count()
-            
-            Vote.objects.all().delete()
-            Voter.objects.all().delete()
-            Candidate.objects.all().delete()
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully deleted:'))
-            self.stdout.write(self.style.SUCCESS(f'  - {vote_count} votes'))
-            self.stdout.write(self.style.SUCCESS(f'  - {voter_count} voters'))
-            self.stdout.write(self.style.SUCCESS(f'  - {candidate_count} candidates'))
-            self.stdout.write(self.style.WARNING('Admin users and election settings preserved'))
-            
+            scope = 'all'
         else:
-            # Default: Delete votes and voters, keep candidates
-            vote_count = Vote.objects.count()
-            voter_count = Voter.objects.count()
-            
-            Vote.objects.all().delete()
-            Voter.objects.all().delete()
-            
-            self.stdout.write(self.style.SUCCESS(f'Successfully deleted:'))
-            self.stdout.write(self.style.SUCCESS(f'  - {vote_count} votes'))
-            self.stdout.write(self.style.SUCCESS(f'  - {voter_count} voters'))
-            self.stdout.write(self.style.WARNING('Candidates, admin users, and settings preserved'))
+            scope = 'votes_and_voters'
 
+        if options['background']:
+            election = elections.first() if options['election'] is not None else None
+            job = Job.enqueue('clear_data', election=election, max_attempts=1, scope=scope)
+            self.stdout.write(self.style.SUCCESS(f'Queued job #{job.id}; run "manage.py run_jobs" to process it'))
+            return
+
+        deleted = clear(elections, scope)
+
+        if scope == 'votes':
+            self.stdout.write(self.style.SUCCESS(f'Successfully deleted {deleted["votes"]} votes'))
+            self.stdout.write(self.style.SUCCESS('Reset all voters has_voted status'))
+        elif scope == 'voters':
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully deleted {deleted["voters"]} voters and {deleted["votes"]} votes')
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully deleted:'))
+            for name in ('votes', 'voters', 'candidates'):
+                if name in deleted:
+                    self.stdout.write(self.style.SUCCESS(f'  - {deleted[name]} {name}'))
+            if scope == 'all':
+                # Delete everything except admin users and settings
+                self.stdout.write(self.style.WARNING('Admin users and election settings preserved'))
+            else:
+                self.stdout.write(self.style.WARNING('Candidates, admin users, and settings preserved'))
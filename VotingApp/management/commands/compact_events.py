@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import events
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the closed segments of the change log keeping the latest event per key'
+
+    def handle(self, *args, **options):
+        log = events.get_log()
+        if log is None:
+            raise CommandError('The event log is disabled; set VOTING_EVENTS_DIR')
+
+        started = time.monotonic()
+        try:
+            before, after = log.compact()
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f'Compacted {before} events to {after} in {(time.monotonic() - started) * 1000:.0f}ms'
+        )
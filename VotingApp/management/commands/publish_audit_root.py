@@ -0,0 +1,32 @@
+import json
+from django.core.management.base import BaseCommand
+from VotingApp.models import Election, AuditHead, AuditCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Record the current vote log root as a checkpoint and print it for publication'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--election',
+            type=int,
+            help='Only publish the election with this id (default: every election)',
+        )
+
+    def handle(self, *args, **options):
+        elections = Election.objects.order_by('id')
+        if options['election'] is not None:
+            elections = elections.filter(id=options['election'])
+        for election in elections:
+            head, _ = AuditHead.objects.get_or_create(election=election)
+            checkpoint = AuditCheckpoint.objects.create(
+                election=election, size=head.size, root_hash=head.root_hash, chain_hash=head.chain_hash,
+            )
+            self.stdout.write(json.dumps({
+                'election': election.id,
+                'title': election.election_title,
+                'size': checkpoint.size,
+                'root_hash': checkpoint.root_hash,
+                'chain_hash': checkpoint.chain_hash,
+                'published_at': checkpoint.published_at.isoformat(),
+            }))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import publisher
+
+
+class Command(BaseCommand):
+    help = 'Render the public results pages and JSON feed to static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='Keep running and re-render when the tallies change, at most once every this many seconds',
+        )
+        parser.add_argument(
+            '--refresh',
+            type=float,
+            help='With --every, re-render at least this often (default: VOTING_PUBLISH_REFRESH)',
+        )
+        parser.add_argument('--dir', help='Output directory (default: VOTING_PUBLISH_DIR)')
+
+    def handle(self, *args, **options):
+        root = options['dir'] or publisher.publish_dir()
+        if root is None:
+            raise CommandError('Set VOTING_PUBLISH_DIR or pass --dir')
+
+        if not options['every']:
+            started = time.monotonic()
+            written = publisher.publish(root)
+            self.report(written, time.monotonic() - started)
+            return
+        publisher.watch(options['every'], options['refresh'], root, on_publish=self.report)
+
+    def report(self, written, elapsed):
+        self.stdout.write(f'Published {len(written)} files in {elapsed * 1000:.0f}ms')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from VotingApp.models import VoteRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-minute and per-hour vote rollups from the Vote table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of votes fetched per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        buckets, scanned = VoteRollup.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} rollup buckets from {scanned} votes'))
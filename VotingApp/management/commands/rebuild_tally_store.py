@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import tally_store
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared memory-mapped tally store from the Vote table'
+
+    def handle(self, *args, **options):
+        store = tally_store.get_store()
+        if store is None:
+            raise CommandError('The tally store is disabled (VOTING_TALLY_STORE_PATH is not set)')
+
+        try:
+            store.rebuild()
+        except tally_store.TallyStoreFull as e:
+            raise CommandError(f'{e}; raise VOTING_TALLY_STORE_SLOTS')
+
+        started = time.perf_counter()
+        snapshot = store.snapshot()
+        elapsed_us = (time.perf_counter() - started) * 1e6
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt tally store at {store.path}'))
+        self.stdout.write(f'  - {len(snapshot.counts)} candidates with votes')
+        self.stdout.write(f'  - {sum(snapshot.counts.values())} votes')
+        self.stdout.write(f'  - {sum(snapshot.turnout.values())} voters have voted across {len(snapshot.turnout)} elections')
+        self.stdout.write(f'  - snapshot read in {elapsed_us:.0f}µs')
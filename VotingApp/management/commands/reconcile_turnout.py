@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from VotingApp.models import Voter, Vote, Election, TurnoutCounter
+from VotingApp import tally_store
+
+
+class Command(BaseCommand):
+    help = 'Verify the incremental turnout counter against the Voter and Vote tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Repair has_voted flags and reset the counter when a mismatch is found',
+        )
+
+    def handle(self, *args, **options):
+        repaired = False
+        for election in Election.objects.order_by('id'):
+            repaired |= self._reconcile(election, options['fix'])
+        if repaired:
+            tally_store.invalidate()
+
+    def _reconcile(self, election, fix):
+        """Check one election's counter; return True when it was repaired"""
+        voters = Voter.objects.filter(election=election)
+        counter = TurnoutCounter.get_count(election)
+        flagged = voters.filter(has_voted=True).count()
+        voted_ids = Vote.objects.filter(election=election).values('voter_id')
+        missing_flag = voters.filter(id__in=voted_ids, has_voted=False).count()
+        stale_flag = voters.filter(has_voted=True).exclude(id__in=voted_ids).count()
+
+        self.stdout.write(f'{election} (id {election.id})')
+        self.stdout.write(f'  Turnout counter:          {counter}')
+        self.stdout.write(f'  Voters flagged has_voted: {flagged}')
+        self.stdout.write(f'  Voters with votes but no has_voted flag: {missing_flag}')
+        self.stdout.write(f'  Voters flagged has_voted without votes:  {stale_flag}')
+
+        if counter == flagged and not missing_flag and not stale_flag:
+            self.stdout.write(self.style.SUCCESS('  Turnout counter is consistent'))
+            return False
+
+        self.stdout.write(self.style.WARNING('  Turnout counter is out of sync'))
+        if not fix:
+            self.stdout.write('  Run again with --fix to repair')
+            return False
+
+        with transaction.atomic():
+            voters.filter(id__in=voted_ids, has_voted=False).update(has_voted=True)
+            voters.filter(has_voted=True).exclude(id__in=voted_ids).update(has_voted=False, voted_at=None)
+            TurnoutCounter.reset(election, voters.filter(has_voted=True).count())
+        self.stdout.write(self.style.SUCCESS(f'  Turnout counter reset to {TurnoutCounter.get_count(election)}'))
+        return True
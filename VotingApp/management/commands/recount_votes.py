@@ -0,0 +1,191 @@
+import os
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min, Sum
+from VotingApp import tally_store
+from VotingApp.models import Candidate, Election, TurnoutCounter, Vote, Voter, VoteRollup
+
+
+def _init_worker():
+    # Spawned workers start from a bare interpreter; forked ones already
+    # have the app registry and only need their own database connection
+    import django
+    django.setup()
+
+
+def _count_partition(election_id, low, high, chunk_size):
+    """Recount votes of voters with ``low <= id < high``.
+
+    Votes are read in voter order, so duplicate votes for a position and the
+    set of voters who voted are found while streaming, and the voted ids can
+    be merge-joined against the ``has_voted`` flags without holding either
+    table in memory.
+    """
+    result = {
+        'rows': 0,
+        'candidates': Counter(),
+        'positions': Counter(),
+        'voters': 0,
+        'duplicates': 0,
+        'position_drift': 0,
+        'missing_flag': 0,
+        'stale_flag': 0,
+        'examples': [],
+    }
+    voted = array('q')
+    current_voter, seen_positions = None, set()
+    rows = (
+        Vote.objects.filter(election_id=election_id, voter_id__gte=low, voter_id__lt=high)
+        .order_by('voter_id')
+        .values_list('voter_id', 'candidate_id', 'position', 'candidate__position')
+        .iterator(chunk_size=chunk_size)
+    )
+    for voter_id, candidate_id, position, candidate_position in rows:
+        result['rows'] += 1
+        result['candidates'][candidate_id] += 1
+        result['positions'][candidate_position] += 1
+        if voter_id != current_voter:
+            current_voter, seen_positions = voter_id, set()
+            voted.append(voter_id)
+        if candidate_position in seen_positions:
+            result['duplicates'] += 1
+            if len(result['examples']) < 5:
+                result['examples'].append(f'voter {voter_id} voted twice for {candidate_position}')
+        seen_positions.add(candidate_position)
+        if position != candidate_position:
+            result['position_drift'] += 1
+    result['voters'] = len(voted)
+
+    flagged = (
+        Voter.objects.filter(election_id=election_id, id__gte=low, id__lt=high, has_voted=True)
+        .order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+    )
+    i = 0
+    for voter_id in flagged:
+        while i < len(voted) and voted[i] < voter_id:
+            result['missing_flag'] += 1
+            i += 1
+        if i < len(voted) and voted[i] == voter_id:
+            i += 1
+        else:
+            result['stale_flag'] += 1
+    result['missing_flag'] += len(voted) - i
+
+    connections.close_all()
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Recount an election from the Vote table in parallel and reconcile the stored tallies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--election', type=int, help='Election id (default: the current election)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (1 counts in this process)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=20000,
+            help='Number of votes fetched per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        if options['election'] is None:
+            election = Election.get_default()
+        else:
+            election = Election.objects.filter(id=options['election']).first()
+            if election is None:
+                raise CommandError(f'Election {options["election"]} does not exist')
+
+        started = time.perf_counter()
+        bounds = Voter.objects.filter(election=election).aggregate(low=Min('id'), high=Max('id'))
+        workers = max(1, options['workers'])
+        partitions = []
+        if bounds['low'] is not None:
+            # A few partitions per worker keeps them busy when voter ids are uneven
+            count = workers * 4 if workers > 1 else 1
+            span = bounds['high'] - bounds['low'] + 1
+            step = -(-span // count)
+            partitions = [
+                (election.id, low, min(low + step, bounds['high'] + 1), options['chunk_size'])
+                for low in range(bounds['low'], bounds['high'] + 1, step)
+            ]
+
+        if workers == 1:
+            results = [_count_partition(*partition) for partition in partitions]
+        else:
+            # Children must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(_count_partition, *zip(*partitions))) if partitions else []
+
+        total = {'rows': 0, 'voters': 0, 'duplicates': 0, 'position_drift': 0, 'missing_flag': 0, 'stale_flag': 0}
+        candidates, positions, examples = Counter(), Counter(), []
+        for result in results:
+            for key in total:
+                total[key] += result[key]
+            candidates.update(result['candidates'])
+            positions.update(result['positions'])
+            examples.extend(result['examples'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{election} (id {election.id})')
+        self.stdout.write(
+            f'Recounted {total["rows"]} votes from {total["voters"]} voters '
+            f'in {elapsed:.2f}s ({len(partitions)} partitions, {workers} workers)'
+        )
+        names = dict(Candidate.objects.filter(election=election).values_list('id', 'name'))
+        for position in sorted(positions):
+            self.stdout.write(f'  {position}: {positions[position]}')
+        for candidate_id, votes in candidates.most_common():
+            self.stdout.write(f'    {names.get(candidate_id, candidate_id)}: {votes}')
+
+        problems = []
+        if total['duplicates']:
+            problems.append(f'{total["duplicates"]} votes break one-vote-per-position')
+            problems.extend(f'  e.g. {example}' for example in examples[:5])
+        if total['position_drift']:
+            problems.append(f'{total["position_drift"]} votes store a position that differs from their candidate')
+        if total['missing_flag']:
+            problems.append(f'{total["missing_flag"]} voters have votes but has_voted is not set')
+        if total['stale_flag']:
+            problems.append(f'{total["stale_flag"]} voters are flagged has_voted without any vote')
+
+        counter = TurnoutCounter.get_count(election)
+        if counter != total['voters']:
+            problems.append(f'turnout counter says {counter}, recount found {total["voters"]}')
+        rollups = dict(
+            VoteRollup.objects.filter(election=election, granularity=VoteRollup.HOUR)
+            .values_list('position').annotate(total=Sum('votes'))
+        )
+        for position in sorted(set(rollups) | set(positions)):
+            if rollups.get(position, 0) != positions[position]:
+                problems.append(
+                    f'rollups hold {rollups.get(position, 0)} votes for {position}, recount found {positions[position]}'
+                )
+        snapshot = tally_store.get_snapshot()
+        if snapshot is not None:
+            for candidate_id in sorted(set(names) | set(candidates)):
+                if snapshot.votes_for(candidate_id) != candidates[candidate_id]:
+                    problems.append(
+                        f'tally store holds {snapshot.votes_for(candidate_id)} votes for '
+                        f'{names.get(candidate_id, candidate_id)}, recount found {candidates[candidate_id]}'
+                    )
+            if snapshot.turnout_for(election.id) != total['voters']:
+                problems.append(
+                    f'tally store turnout is {snapshot.turnout_for(election.id)}, recount found {total["voters"]}'
+                )
+
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(problem))
+        if problems:
+            raise CommandError('Recount does not match the stored tallies')
+        self.stdout.write(self.style.SUCCESS('Recount matches the stored tallies'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from VotingApp import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (voter imports, result reports, data clearing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Jobs to run at once (default: 2)')
+        parser.add_argument(
+            '--processes',
+            action='store_true',
+            help='Run jobs in a pool of worker processes instead of threads',
+        )
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between checks for new jobs')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        jobs.work(
+            workers=options['workers'], processes=options['processes'], poll=options['poll'], once=options['once'],
+            on_finish=self.report,
+        )
+
+    def report(self, job):
+        style = self.style.SUCCESS if job.status == job.SUCCEEDED else self.style.WARNING
+        self.stdout.write(style(f'Job #{job.id} {job.kind}: {job.status} (attempt {job.attempts} of {job.max_attempts})'))
@@ -0,0 +1,37 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import replica
+
+
+class Command(BaseCommand):
+    help = 'Copy the database into the read-only replica that serves public results pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='Keep running and take a snapshot every this many seconds',
+        )
+        parser.add_argument('--path', help='Replica file (default: VOTING_REPLICA_PATH)')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The replica snapshot needs the SQLite backend')
+        path = options['path'] or replica.replica_path()
+        if path is None:
+            raise CommandError('Set VOTING_REPLICA_PATH or pass --path')
+
+        max_age = getattr(settings, 'VOTING_REPLICA_MAX_AGE', 30)
+        if options['every'] and options['every'] >= max_age:
+            self.stderr.write(self.style.WARNING(
+                f'Snapshots every {options["every"]}s will often be older than VOTING_REPLICA_MAX_AGE '
+                f'({max_age}s), and public pages will fall back to the primary'
+            ))
+        while True:
+            started = time.monotonic()
+            elapsed = replica.take_snapshot(path=path)
+            self.stdout.write(f'Snapshot written to {path} in {elapsed * 1000:.0f}ms')
+            if not options['every']:
+                break
+            time.sleep(max(0.0, options['every'] - (time.monotonic() - started)))
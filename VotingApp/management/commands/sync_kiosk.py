@@ -0,0 +1,46 @@
+import time
+import urllib.error
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import kiosk
+
+
+class Command(BaseCommand):
+    help = "Send this polling-station kiosk's unsynced votes to the central server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every',
+            type=float,
+            help='Keep running and sync every this many seconds, riding out network outages',
+        )
+        parser.add_argument('--batch-size', type=int, help='Votes per batch (default: VOTING_KIOSK_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        for name in ('VOTING_KIOSK_SYNC_URL', 'VOTING_KIOSK_STATION', 'VOTING_KIOSK_KEY'):
+            if not getattr(settings, name, None):
+                raise CommandError(f'Set {name} on the kiosk')
+
+        while True:
+            try:
+                answers = kiosk.push(batch_size=options['batch_size'])
+            except (urllib.error.URLError, OSError) as e:
+                if not options['every']:
+                    raise CommandError(f'Sync failed: {e}')
+                self.stderr.write(f'Sync failed, retrying: {e}')
+            else:
+                self.report(answers)
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def report(self, answers):
+        for answer in answers:
+            self.stdout.write(
+                f"Batch {answer['batch']}: {answer['accepted']} accepted, {answer['duplicates']} duplicates, "
+                f"{len(answer['rejected'])} rejected" + (' (already applied)' if answer['replayed'] else '')
+            )
+            for rejected in answer['rejected']:
+                self.stderr.write(f"  vote {rejected['index']}: {rejected['error']}")
+        if not answers:
+            self.stdout.write('Nothing to sync')
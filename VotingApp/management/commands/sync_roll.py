@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import roll_sync
+from VotingApp.models import Election
+
+
+class Command(BaseCommand):
+    help = 'Diff a full voter roll file against an election and optionally apply the changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roll', help='Roll file: one phone number per line, or CSV with the number first')
+        parser.add_argument('--election', type=int, help='Election id (default: the current election)')
+        parser.add_argument('--apply', action='store_true', help='Apply the changes after showing the preview')
+        parser.add_argument(
+            '--expect',
+            help='Only apply if the diff still has this fingerprint (as shown by an earlier preview)',
+        )
+        parser.add_argument(
+            '--remove-voted',
+            action='store_true',
+            help='Also remove voters missing from the roll who have already voted, with their votes',
+        )
+        parser.add_argument('--batch-size', type=int, default=roll_sync.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['election'] is None:
+            election = Election.get_default()
+        else:
+            election = Election.objects.filter(id=options['election']).first()
+            if election is None:
+                raise CommandError(f'Election {options["election"]} does not exist')
+
+        started = time.perf_counter()
+        try:
+            with open(options['roll'], encoding='utf-8-sig', newline='') as lines:
+                diff = roll_sync.diff_roll(election, lines)
+        except OSError as e:
+            raise CommandError(f'Cannot read roll: {e}')
+        elapsed = time.perf_counter() - started
+
+        summary = diff.summary()
+        self.stdout.write(f'{election} (id {election.id}): diff computed in {elapsed:.2f}s, fingerprint {diff.fingerprint}')
+        self.stdout.write(f'  to add:     {summary["add"]}')
+        self.stdout.write(f'  to remove:  {summary["remove"]}')
+        self.stdout.write(f'  kept because they voted: {summary["protected"]}')
+        self.stdout.write(f'  unchanged:  {summary["unchanged"]}')
+        self.stdout.write(f'  duplicates in file: {summary["duplicates"]}')
+        self.stdout.write(f'  invalid numbers:    {summary["invalid"]}')
+        for line in diff.samples()['invalid'][:5]:
+            self.stdout.write(self.style.WARNING(f'    {line}'))
+
+        if not options['apply']:
+            self.stdout.write('Preview only; run again with --apply to make these changes')
+            return
+        if options['expect'] and options['expect'] != diff.fingerprint:
+            raise CommandError(f'Roll changed since the preview (fingerprint {diff.fingerprint}, expected {options["expect"]})')
+
+        started = time.perf_counter()
+        added, removed = roll_sync.apply_diff(diff, remove_voted=options['remove_voted'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Added {added} and removed {removed} voters in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from VotingApp import events
+
+
+class Command(BaseCommand):
+    help = 'Print the change log events after an offset, one JSON line each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after', type=int, default=0, help='Offset of the last event already handled')
+        parser.add_argument('--follow', action='store_true', help='Keep printing new events as they are written')
+        parser.add_argument('--poll', type=float, default=1.0, help='With --follow, seconds between checks')
+
+    def handle(self, *args, **options):
+        log = events.get_log()
+        if log is None:
+            raise CommandError('The event log is disabled; set VOTING_EVENTS_DIR')
+
+        after = options['after']
+        while True:
+            lines = log.read(after)
+            for line in lines:
+                # Events are plain ASCII JSON
+                self.stdout.write(line.decode())
+            self.stdout.flush()
+            if lines:
+                after = events.offset_of(lines[-1])
+            elif not options['follow']:
+                return
+            else:
+                time.sleep(options['poll'])
@@ -0,0 +1,99 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from VotingApp import merkle
+from VotingApp.models import Election, Vote, AuditEntry, AuditHead, AuditCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Verify the hash chain and Merkle roots of the vote log and check it against the Vote table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--election',
+            type=int,
+            help='Only verify the election with this id (default: every election)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Number of log entries fetched per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        elections = Election.objects.order_by('id')
+        if options['election'] is not None:
+            elections = elections.filter(id=options['election'])
+        failures = 0
+        for election in elections:
+            failures += self._verify(election, options['chunk_size'])
+        if failures:
+            raise CommandError(f'Vote log verification failed with {failures} problem(s)')
+
+    def _verify(self, election, chunk_size):
+        """Stream one election's log in sequence order; return the number of problems"""
+        self.stdout.write(f'{election} (id {election.id})')
+        started = time.perf_counter()
+        problems = []
+        checkpoints = {}
+        for checkpoint in AuditCheckpoint.objects.filter(election=election):
+            checkpoints.setdefault(checkpoint.size, []).append(checkpoint)
+
+        frontier = merkle.Frontier()
+        chain = merkle.GENESIS
+        rows = (
+            AuditEntry.objects.filter(election=election).order_by('seq')
+            .values_list('seq', 'vote_ref', 'voter_ref', 'candidate_ref', 'position', 'voted_at', 'leaf_hash', 'chain_hash')
+            .iterator(chunk_size=chunk_size)
+        )
+        for seq, vote_ref, voter_ref, candidate_ref, position, voted_at, leaf_hex, chain_hex in rows:
+            if seq != frontier.size:
+                problems.append(f'entry #{frontier.size} is missing (next entry is #{seq})')
+                break
+            leaf = merkle.vote_leaf(election.id, seq, vote_ref, voter_ref, candidate_ref, position, voted_at)
+            chain = merkle.chain_hash(chain, leaf)
+            if leaf.hex() != leaf_hex:
+                problems.append(f'entry #{seq} does not match its leaf hash')
+            if chain.hex() != chain_hex:
+                problems.append(f'entry #{seq} breaks the hash chain')
+                # Carry on from the stored link so one break is reported once
+                chain = bytes.fromhex(chain_hex)
+            frontier.append(leaf)
+            for checkpoint in checkpoints.get(frontier.size, ()):
+                if frontier.root().hex() != checkpoint.root_hash or chain.hex() != checkpoint.chain_hash:
+                    problems.append(f'checkpoint at size {checkpoint.size} ({checkpoint.published_at:%Y-%m-%d %H:%M}) no longer matches')
+
+        head = AuditHead.objects.filter(election=election).first()
+        if head is None:
+            if frontier.size:
+                problems.append('log has entries but no head')
+        elif (head.size, head.root_hash, head.chain_hash) != (frontier.size, frontier.root().hex(), chain.hex()):
+            problems.append('head does not match the recomputed log')
+        elif head.frontier != frontier.to_hex():
+            problems.append('head frontier does not match the recomputed log')
+        for size in checkpoints:
+            if size > frontier.size:
+                problems.append(f'checkpoint at size {size} is beyond the end of the log')
+
+        # Cross-check the Vote table against every field the log hashed
+        edited = AuditEntry.objects.filter(election=election, vote__isnull=False).exclude(
+            vote__id=F('vote_ref'), vote__election_id=F('election_id'), vote__voter_id=F('voter_ref'),
+            vote__candidate_id=F('candidate_ref'), vote__position=F('position'), vote__voted_at=F('voted_at'),
+        ).count()
+        if edited:
+            problems.append(f'{edited} vote row(s) were changed after being logged')
+        unlogged = Vote.objects.filter(election=election, audit_entry__isnull=True).count()
+        if unlogged:
+            problems.append(f'{unlogged} vote row(s) are missing from the log')
+        removed = AuditEntry.objects.filter(election=election, vote__isnull=True).count()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {frontier.size} entries verified in {elapsed:.2f}s, root {frontier.root().hex()}')
+        if removed:
+            self.stdout.write(f'  {removed} logged vote(s) have since been deleted (voter removed)')
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f'  {problem}'))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('  Vote log is intact'))
+        return len(problems)
@@ -0,0 +1,210 @@
+"""
+Hashing helpers for the tamper-evident vote log.
+
+The log is a Merkle tree in the RFC 6962 / RFC 9162 shape: leaves and inner
+nodes are hashed with distinct prefixes, and a tree of ``n`` leaves is split
+at the largest power of two below ``n``. That shape means the tree is fully
+described by its perfect subtrees, so appending only needs the "frontier" --
+the root of each pending perfect subtree, one per set bit of the size -- and
+every stored node is final the moment it is written. Inclusion proofs show
+a vote is in the log; consistency proofs show an earlier log (a published
+checkpoint) is a prefix of a later one, i.e. nothing was removed or
+rewritten in between.
+
+Nothing here touches the database; callers pass in stored node hashes.
+"""
+import hashlib
+
+GENESIS = bytes(32)
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+
+def leaf_hash(data):
+    return hashlib.sha256(b'\x00' + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def chain_hash(previous, leaf):
+    """Link a leaf to everything before it, so reordering breaks the chain"""
+    return hashlib.sha256(previous + leaf).digest()
+
+
+def vote_leaf(election_id, seq, vote_id, voter_id, candidate_id, position, voted_at):
+    """Leaf hash of one recorded vote"""
+    payload = '|'.join([
+        str(election_id), str(seq), str(vote_id), str(voter_id), str(candidate_id), position, voted_at.isoformat(),
+    ])
+    return leaf_hash(payload.encode())
+
+
+class Frontier:
+    """The roots of the perfect subtrees that make up a tree, by level"""
+
+    def __init__(self, size=0, peaks=None):
+        self.size = size
+        self.peaks = list(peaks or [])
+
+    @classmethod
+    def from_hex(cls, size, peaks):
+        return cls(size, [bytes.fromhex(p) if p else None for p in peaks])
+
+    def to_hex(self):
+        return [p.hex() if p else None for p in self.peaks]
+
+    def append(self, leaf):
+        """Add a leaf; return the ``(level, index, hash)`` nodes it completes.
+
+        The leaf itself is the first node returned. Amortised cost is O(1)
+        hashes and never more than O(log n).
+        """
+        index = self.size
+        created = [(0, index, leaf)]
+        current = leaf
+        level = 0
+        while (index >> level) & 1:
+            current = node_hash(self.peaks[level], current)
+            self.peaks[level] = None
+            level += 1
+            created.append((level, index >> level, current))
+        if level == len(self.peaks):
+            self.peaks.append(None)
+        self.peaks[level] = current
+        self.size += 1
+        return created
+
+    def root(self):
+        root = None
+        for peak in self.peaks:
+            if peak is not None:
+                root = peak if root is None else node_hash(peak, root)
+        return EMPTY_ROOT if root is None else root
+
+
+def _largest_power_below(n):
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+def subtree_hash(start, end, get_node):
+    """Hash of leaves ``[start, end)`` built from stored perfect subtrees"""
+    size = end - start
+    if size & (size - 1) == 0:
+        level = size.bit_length() - 1
+        return get_node(level, start >> level)
+    split = start + _largest_power_below(size)
+    return node_hash(subtree_hash(start, split, get_node), subtree_hash(split, end, get_node))
+
+
+def inclusion_proof(index, size, get_node):
+    """Audit path for leaf ``index`` in the first ``size`` leaves, bottom-up"""
+    path = []
+    start, end = 0, size
+    while end - start > 1:
+        split = start + _largest_power_below(end - start)
+        if index < split:
+            path.append(subtree_hash(split, end, get_node))
+            end = split
+        else:
+            path.append(subtree_hash(start, split, get_node))
+            start = split
+    path.reverse()
+    return path
+
+
+def proof_nodes(index, size):
+    """The ``(level, index)`` keys ``inclusion_proof`` and the root will read"""
+    keys = set()
+
+    def record(level, position):
+        keys.add((level, position))
+        return b''
+
+    inclusion_proof(index, size, record)
+    subtree_hash(0, size, record)
+    return keys
+
+
+def consistency_proof(old_size, size, get_node):
+    """Nodes proving the first ``old_size`` leaves are a prefix of the first ``size`` (RFC 9162, section 2.1.4.1)"""
+    def subproof(m, start, end, complete):
+        if m == end - start:
+            return [] if complete else [subtree_hash(start, end, get_node)]
+        split = start + _largest_power_below(end - start)
+        if m <= split - start:
+            return subproof(m, start, split, complete) + [subtree_hash(split, end, get_node)]
+        return subproof(m - (split - start), split, end, False) + [subtree_hash(start, split, get_node)]
+
+    if not 0 < old_size < size:
+        return []
+    return subproof(old_size, 0, size, True)
+
+
+def consistency_nodes(old_size, size):
+    """The ``(level, index)`` keys ``consistency_proof`` and both roots will read"""
+    keys = set()
+
+    def record(level, position):
+        keys.add((level, position))
+        return b''
+
+    consistency_proof(old_size, size, record)
+    for tree_size in (old_size, size):
+        if tree_size:
+            subtree_hash(0, tree_size, record)
+    return keys
+
+
+def verify_inclusion(leaf, index, size, path, root):
+    """Check an audit path against a root (RFC 9162, section 2.1.3.2)"""
+    if index >= size:
+        return False
+    fn, sn = index, size - 1
+    current = leaf
+    for sibling in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            current = node_hash(sibling, current)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            current = node_hash(current, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and current == root
+
+
+def verify_consistency(old_size, size, path, old_root, root):
+    """Check a consistency proof between two roots (RFC 9162, section 2.1.4.2)"""
+    if old_size > size:
+        return False
+    if old_size == size:
+        return not path and old_root == root
+    if old_size == 0:
+        return not path
+    if old_size & (old_size - 1) == 0:
+        path = [old_root] + list(path)
+    if not path:
+        return False
+    fn, sn = old_size - 1, size - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    first = second = path[0]
+    for node in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            first = node_hash(node, first)
+            second = node_hash(node, second)
+            while not fn & 1 and fn:
+                fn >>= 1
+                sn >>= 1
+        else:
+            second = node_hash(second, node)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and first == old_root and second == root
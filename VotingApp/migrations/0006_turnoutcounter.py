@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+def seed_turnout_counter(apps, schema_editor):
+    Voter = apps.get_model('VotingApp', 'Voter')
+    Vote = apps.get_model('VotingApp', 'Vote')
+    TurnoutCounter = apps.get_model('VotingApp', 'TurnoutCounter')
+    # Older rows may have votes without the has_voted flag set
+    Voter.objects.filter(id__in=Vote.objects.values('voter_id'), has_voted=False).update(has_voted=True)
+    TurnoutCounter.objects.update_or_create(
+        id=1, defaults={'voters_voted': Voter.objects.filter(has_voted=True).count()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0005_electionsettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TurnoutCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voters_voted', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Turnout Counter',
+                'verbose_name_plural': 'Turnout Counter',
+            },
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='has_voted',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(seed_turnout_counter, migrations.RunPython.noop),
+    ]
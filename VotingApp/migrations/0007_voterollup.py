@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-19 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0006_turnoutcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('position', models.CharField(max_length=80)),
+                ('votes', models.IntegerField(default=0)),
+                ('new_voters', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Vote Rollup',
+                'verbose_name_plural': 'Vote Rollups',
+                'ordering': ['granularity', 'bucket_start', 'position'],
+                'unique_together': {('granularity', 'bucket_start', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,128 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_default_election(apps, schema_editor):
+    # Existing voters, candidates and votes all belong to the former singleton
+    # settings row (id=1), so make sure it exists before pointing them at it
+    Election = apps.get_model('VotingApp', 'Election')
+    Election.objects.get_or_create(id=1)
+
+
+def copy_vote_positions(apps, schema_editor):
+    Vote = apps.get_model('VotingApp', 'Vote')
+    Candidate = apps.get_model('VotingApp', 'Candidate')
+    for candidate in Candidate.objects.all():
+        Vote.objects.filter(candidate=candidate).update(position=candidate.position, election_id=candidate.election_id)
+
+
+def attach_turnout_counter(apps, schema_editor):
+    TurnoutCounter = apps.get_model('VotingApp', 'TurnoutCounter')
+    TurnoutCounter.objects.exclude(id=1).delete()
+    TurnoutCounter.objects.filter(id=1).update(election_id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0007_voterollup'),
+    ]
+
+    operations = [
+        migrations.RenameModel('ElectionSettings', 'Election'),
+        migrations.AlterModelOptions(
+            name='election',
+            options={'ordering': ['-id'], 'verbose_name': 'Election', 'verbose_name_plural': 'Elections'},
+        ),
+        migrations.RunPython(create_default_election, migrations.RunPython.noop),
+
+        # Voters: phone numbers are unique per election rather than globally
+        migrations.AddField(
+            model_name='voter',
+            name='election',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='VotingApp.election'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='phone_number',
+            field=models.CharField(help_text='Phone number in international format: +[country code][number]', max_length=20, validators=[django.core.validators.RegexValidator(message='Phone number must be in international format: +[country code][number] (e.g., +1234567890)', regex='^\\+\\d{1,3}\\d{4,14}$')]),
+        ),
+        migrations.AddConstraint(
+            model_name='voter',
+            constraint=models.UniqueConstraint(fields=('election', 'phone_number'), name='unique_voter_per_election'),
+        ),
+
+        # Candidates
+        migrations.AddField(
+            model_name='candidate',
+            name='election',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='VotingApp.election'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['election', 'position'], name='candidate_election_position'),
+        ),
+
+        # Votes carry their candidate's election and position
+        migrations.AddField(
+            model_name='vote',
+            name='election',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='VotingApp.election'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='position',
+            field=models.CharField(default='', max_length=80),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_vote_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('election', 'voter', 'position'), name='one_vote_per_position'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['election', 'candidate'], name='vote_election_candidate'),
+        ),
+
+        # Turnout counters are per election
+        migrations.AddField(
+            model_name='turnoutcounter',
+            name='election',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='turnout_counter', to='VotingApp.election'),
+        ),
+        migrations.RunPython(attach_turnout_counter, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='turnoutcounter',
+            name='election',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='turnout_counter', to='VotingApp.election'),
+        ),
+        migrations.AlterModelOptions(
+            name='turnoutcounter',
+            options={'verbose_name': 'Turnout Counter', 'verbose_name_plural': 'Turnout Counters'},
+        ),
+
+        # Rollup buckets are per election
+        migrations.AlterUniqueTogether(
+            name='voterollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='voterollup',
+            name='election',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='VotingApp.election'),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='voterollup',
+            unique_together={('election', 'granularity', 'bucket_start', 'position')},
+        ),
+        migrations.AlterModelOptions(
+            name='voterollup',
+            options={'ordering': ['election', 'granularity', 'bucket_start', 'position'], 'verbose_name': 'Vote Rollup', 'verbose_name_plural': 'Vote Rollups'},
+        ),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 5.0.2 on 2026-10-19 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from VotingApp import merkle
+
+
+def log_existing_votes(apps, schema_editor):
+    Election = apps.get_model('VotingApp', 'Election')
+    Vote = apps.get_model('VotingApp', 'Vote')
+    AuditHead = apps.get_model('VotingApp', 'AuditHead')
+    AuditEntry = apps.get_model('VotingApp', 'AuditEntry')
+    MerkleNode = apps.get_model('VotingApp', 'MerkleNode')
+    # Votes cast before the log existed are appended in the order they were cast
+    for election in Election.objects.all():
+        frontier = merkle.Frontier()
+        chain = merkle.GENESIS
+        entries, nodes = [], []
+        rows = Vote.objects.filter(election=election).order_by('voted_at', 'id').values_list(
+            'id', 'voter_id', 'candidate_id', 'position', 'voted_at',
+        )
+        for vote_id, voter_id, candidate_id, position, voted_at in rows.iterator():
+            seq = frontier.size
+            leaf = merkle.vote_leaf(election.id, seq, vote_id, voter_id, candidate_id, position, voted_at)
+            chain = merkle.chain_hash(chain, leaf)
+            entries.append(AuditEntry(
+                election=election, seq=seq, vote_id=vote_id, vote_ref=vote_id, voter_ref=voter_id,
+                candidate_ref=candidate_id, position=position, voted_at=voted_at,
+                leaf_hash=leaf.hex(), chain_hash=chain.hex(),
+            ))
+            nodes.extend(
+                MerkleNode(election=election, level=level, index=index, hash=digest.hex())
+                for level, index, digest in frontier.append(leaf)
+            )
+        AuditEntry.objects.bulk_create(entries, batch_size=1000)
+        MerkleNode.objects.bulk_create(nodes, batch_size=1000)
+        AuditHead.objects.create(
+            election=election, size=frontier.size, frontier=frontier.to_hex(),
+            root_hash=frontier.root().hex(), chain_hash=chain.hex(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0008_election'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveBigIntegerField()),
+                ('root_hash', models.CharField(max_length=64)),
+                ('chain_hash', models.CharField(max_length=64)),
+                ('published_at', models.DateTimeField(auto_now_add=True)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_checkpoints', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Audit Checkpoint',
+                'verbose_name_plural': 'Audit Checkpoints',
+                'ordering': ['-published_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('frontier', models.JSONField(default=list)),
+                ('root_hash', models.CharField(default='e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855', max_length=64)),
+                ('chain_hash', models.CharField(default='0000000000000000000000000000000000000000000000000000000000000000', max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='audit_head', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Audit Head',
+                'verbose_name_plural': 'Audit Heads',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('vote_ref', models.PositiveBigIntegerField()),
+                ('voter_ref', models.PositiveBigIntegerField()),
+                ('candidate_ref', models.PositiveBigIntegerField()),
+                ('position', models.CharField(max_length=80)),
+                ('voted_at', models.DateTimeField()),
+                ('leaf_hash', models.CharField(max_length=64)),
+                ('chain_hash', models.CharField(max_length=64)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_entries', to='VotingApp.election')),
+                ('vote', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entry', to='VotingApp.vote')),
+            ],
+            options={
+                'verbose_name': 'Audit Entry',
+                'verbose_name_plural': 'Audit Entries',
+                'ordering': ['election', 'seq'],
+                'unique_together': {('election', 'seq')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MerkleNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('index', models.PositiveBigIntegerField()),
+                ('hash', models.CharField(max_length=64)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='merkle_nodes', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Merkle Node',
+                'verbose_name_plural': 'Merkle Nodes',
+                'unique_together': {('election', 'level', 'index')},
+            },
+        ),
+        migrations.RunPython(log_existing_votes, migrations.RunPython.noop),
+    ]
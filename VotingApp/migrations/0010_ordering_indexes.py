@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0009_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['election', '-voted_at'], name='vote_election_voted_at'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['election', '-registered_at'], name='voter_election_registered'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0010_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankedBallot',
+            fields=[
+                ('vote', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranked_ballot', serialize=False, to='VotingApp.vote')),
+                ('position', models.CharField(max_length=80)),
+                ('ranking', models.BinaryField(max_length=256)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranked_ballots', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Ranked Ballot',
+                'verbose_name_plural': 'Ranked Ballots',
+                'indexes': [models.Index(fields=['election', 'position'], name='ballot_election_position')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RankedPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.CharField(max_length=80)),
+                ('method', models.CharField(choices=[('irv', 'Instant runoff'), ('stv', 'Single transferable vote')], default='irv', max_length=3)),
+                ('seats', models.PositiveSmallIntegerField(default=1)),
+                ('candidates', models.JSONField(default=list)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ranked_positions', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Ranked Position',
+                'verbose_name_plural': 'Ranked Positions',
+                'unique_together': {('election', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0012_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['phone_number'], name='voter_phone'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('VotingApp', '0013_voter_phone_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KioskBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station', models.CharField(max_length=60)),
+                ('batch_id', models.CharField(max_length=60)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('accepted', models.PositiveIntegerField(default=0)),
+                ('duplicates', models.PositiveIntegerField(default=0)),
+                ('rejected', models.JSONField(blank=True, default=list)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kiosk_batches', to='VotingApp.election')),
+            ],
+            options={
+                'verbose_name': 'Kiosk Batch',
+                'verbose_name_plural': 'Kiosk Batches',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='kioskbatch',
+            constraint=models.UniqueConstraint(fields=('station', 'batch_id'), name='unique_kiosk_batch'),
+        ),
+    ]
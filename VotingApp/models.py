@@ -1,6 +1,12 @@
-from django.db import models
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, Sum, When
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.utils import timezone
+
+from . import events, merkle, ranked
 
 # Create your models here.
 
@@ -11,14 +17,14 @@ class Voter(models.Model):
         message="Phone number must be in international format: +[country code][number] (e.g., +1234567890)"
     )
     
+    election = models.ForeignKey('Election', on_delete=models.CASCADE, related_name='voters')
     phone_number = models.CharField(
         max_length=20,
-        unique=True,
         validators=[phone_validator],
         help_text="Phone number in international format: +[country code][number]"
     )
     is_verified = models.BooleanField(default=False)
-    has_voted = models.BooleanField(default=False)
+    has_voted = models.BooleanField(default=False, db_index=True)
     registered_at = models.DateTimeField(auto_now_add=True)
     voted_at = models.DateTimeField(null=True, blank=True)
     
@@ -26,9 +32,58 @@ class Voter(models.Model):
         ordering = ['-registered_at']
         verbose_name = 'Voter'
         verbose_name_plural = 'Voters'
+        constraints = [
+            # A phone number is on each election's roll at most once
+            models.UniqueConstraint(fields=['election', 'phone_number'], name='unique_voter_per_election'),
+        ]
+        indexes = [
+            # Serves the default ordering of an election's voter list
+            models.Index(fields=['election', '-registered_at'], name='voter_election_registered'),
+            # Serves phone number prefix searches in the admin across elections
+            models.Index(fields=['phone_number'], name='voter_phone'),
+        ]
     
     def __str__(self):
         return self.phone_number
+
+    @classmethod
+    def remove(cls, election, voter_ids, keep_voters=False):
+        """Delete a batch of voters, or only their votes, with set-based statements.
+
+        Keeps the turnout counter and dashboard rollups in step; the caller
+        invalidates the tally store once it is done. Returns the affected ids.
+        """
+        with transaction.atomic():
+            # Look the batch up by primary key: with an election filter SQLite
+            # prefers the election index and walks the whole roll
+            roll = [
+                (voter_id, has_voted, phone)
+                for voter_id, has_voted, phone, election_id in cls.objects.filter(id__in=voter_ids)
+                .values_list('id', 'has_voted', 'phone_number', 'election_id')
+                if election_id == election.id
+            ]
+            voters = cls.objects.filter(id__in=[voter_id for voter_id, _, _ in roll])
+            votes = list(
+                Vote.objects.filter(election=election, voter_id__in=voter_ids)
+                .order_by('voter_id', 'voted_at', 'id').values_list('id', 'voter_id', 'voted_at', 'position')
+            )
+            flagged = [voter_id for voter_id, has_voted, _ in roll if has_voted]
+            if keep_voters:
+                affected = sorted(set(flagged) | {voter_id for _, voter_id, _, _ in votes})
+                Vote.objects.filter(election=election, voter_id__in=affected).delete()
+                voters.filter(has_voted=True).update(has_voted=False, voted_at=None)
+            else:
+                affected = [voter_id for voter_id, _, _ in roll]
+                voters.delete()
+            if flagged:
+                TurnoutCounter.increment(election, -len(flagged))
+            VoteRollup.retract(election, [vote[1:] for vote in votes])
+            phones = {voter_id: phone for voter_id, _, phone in roll}
+            events.voters_changed(
+                election.id, 'voter.reset' if keep_voters else 'voter.removed',
+                [(voter_id, phones.get(voter_id)) for voter_id in affected], [vote[0] for vote in votes],
+            )
+        return affected
     
     @staticmethod
     def normalize_phone_number(phone):
@@ -70,6 +125,7 @@ class Voter(models.Model):
 
 class Candidate(models.Model):
     """Model to store candidates"""
+    election = models.ForeignKey('Election', on_delete=models.CASCADE, related_name='candidates')
     name = models.CharField(max_length=100)
     nickname = models.CharField(max_length=60, blank=True)
     position = models.CharField(max_length=80, default='Candidate')
@@ -80,6 +136,9 @@ class Candidate(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['election', 'position'], name='candidate_election_position'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.position})"
@@ -87,17 +146,160 @@ class Candidate(models.Model):
 
 class Vote(models.Model):
     """Model to track votes"""
+    # election and position are copied from the candidate so the hot lookups
+    # (has this voter voted in this position? votes in this election?) hit an
+    # index without joining Candidate
+    election = models.ForeignKey('Election', on_delete=models.CASCADE, related_name='votes')
     voter = models.ForeignKey(Voter, on_delete=models.CASCADE)
     candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE)
+    position = models.CharField(max_length=80)
     voted_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ['voter', 'candidate']
         ordering = ['-voted_at']
+        constraints = [
+            models.UniqueConstraint(fields=['election', 'voter', 'position'], name='one_vote_per_position'),
+        ]
+        indexes = [
+            models.Index(fields=['election', 'candidate'], name='vote_election_candidate'),
+            # Serves the default ordering, the vote log and first/last vote lookups
+            models.Index(fields=['election', '-voted_at'], name='vote_election_voted_at'),
+        ]
     
     def __str__(self):
         return f"{self.voter.phone_number} -> {self.candidate.name}"
 
+    @classmethod
+    def remove(cls, election, vote_ids):
+        """Delete a batch of votes, clearing ``has_voted`` for voters left without any.
+
+        Keeps the turnout counter in step and recounts the election's
+        dashboard rollups, as a voter's first vote may be among the removed
+        ones; the caller invalidates the tally store. Returns the removed ids.
+        """
+        with transaction.atomic():
+            votes = list(cls.objects.filter(election=election, id__in=vote_ids).values_list('id', 'voter_id'))
+            removed = [vote_id for vote_id, _ in votes]
+            cls.objects.filter(id__in=removed).delete()
+            voter_ids = {voter_id for _, voter_id in votes}
+            cleared = (
+                Voter.objects.filter(id__in=voter_ids, has_voted=True)
+                .exclude(id__in=cls.objects.filter(election=election, voter_id__in=voter_ids).values('voter_id'))
+                .update(has_voted=False, voted_at=None)
+            )
+            if cleared:
+                TurnoutCounter.increment(election, -cleared)
+            if removed:
+                VoteRollup.rebuild(election)
+            events.votes_retracted(election.id, removed)
+        return removed
+
+
+class RankedPosition(models.Model):
+    """A position counted from ranked ballots instead of by plurality.
+
+    ``candidates`` fixes each candidate's index in the packed ballots. It
+    only ever grows, so ballots keep their meaning when candidates are
+    added or removed later.
+    """
+    IRV = ranked.IRV
+    STV = ranked.STV
+    METHOD_CHOICES = [
+        (IRV, 'Instant runoff'),
+        (STV, 'Single transferable vote'),
+    ]
+
+    election = models.ForeignKey('Election', on_delete=models.CASCADE, related_name='ranked_positions')
+    position = models.CharField(max_length=80)
+    method = models.CharField(max_length=3, choices=METHOD_CHOICES, default=IRV)
+    seats = models.PositiveSmallIntegerField(default=1)
+    candidates = models.JSONField(default=list)
+
+    class Meta:
+        unique_together = ['election', 'position']
+        verbose_name = 'Ranked Position'
+        verbose_name_plural = 'Ranked Positions'
+
+    def __str__(self):
+        return f"{self.position} ({self.get_method_display()})"
+
+    def encode(self, candidate_ids):
+        """Pack a ranking of candidate ids; call inside the vote's transaction"""
+        if not set(candidate_ids) <= set(self.candidates):
+            # Lock the row so concurrent ballots agree on new indexes
+            locked = type(self).objects.select_for_update().get(pk=self.pk)
+            self.candidates = locked.candidates + [
+                candidate_id for candidate_id in dict.fromkeys(candidate_ids)
+                if candidate_id not in locked.candidates
+            ]
+            if len(self.candidates) > ranked.MAX_CANDIDATES:
+                raise ValueError(f'A ranked position holds at most {ranked.MAX_CANDIDATES} candidates')
+            type(self).objects.filter(pk=self.pk).update(candidates=self.candidates)
+        index = {candidate_id: i for i, candidate_id in enumerate(self.candidates)}
+        return ranked.encode(index[candidate_id] for candidate_id in candidate_ids)
+
+    def count(self):
+        """Run the count over every ballot cast; return ``(count, candidates by index)``.
+
+        Votes cast before the position was ranked count as ballots with a
+        single preference.
+        """
+        contest = {'election_id': self.election_id, 'position': self.position}
+        ballots = [
+            (bytes(ranking), weight)
+            for ranking, weight in RankedBallot.objects.filter(**contest)
+            .order_by().values_list('ranking').annotate(weight=models.Count('pk'))
+        ]
+        single = list(
+            Vote.objects.filter(ranked_ballot__isnull=True, **contest)
+            .order_by().values_list('candidate_id').annotate(weight=models.Count('pk'))
+        )
+        standing = {candidate.id: candidate for candidate in Candidate.objects.filter(**contest)}
+        candidate_ids = self.candidates + [
+            candidate_id for candidate_id, _ in single if candidate_id not in self.candidates
+        ]
+        index = {candidate_id: i for i, candidate_id in enumerate(candidate_ids)}
+        ballots += [(ranked.encode([index[candidate_id]]), weight) for candidate_id, weight in single]
+        indexed = [standing.get(candidate_id) for candidate_id in candidate_ids]
+        excluded = {i for i, candidate in enumerate(indexed) if candidate is None}
+        result = ranked.count(ballots, len(indexed), seats=self.seats, method=self.method, excluded=excluded)
+        return result, indexed
+
+
+class RankedBallot(models.Model):
+    """A voter's full ranking for a ranked position.
+
+    The first preference is also recorded as a regular :class:`Vote`, which
+    keeps turnout, rollups, the audit log and first-preference tallies
+    working unchanged; deleting the vote deletes the ballot.
+    """
+    vote = models.OneToOneField(Vote, on_delete=models.CASCADE, primary_key=True, related_name='ranked_ballot')
+    election = models.ForeignKey('Election', on_delete=models.CASCADE, related_name='ranked_ballots')
+    position = models.CharField(max_length=80)
+    ranking = models.BinaryField(max_length=ranked.MAX_CANDIDATES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['election', 'position'], name='ballot_election_position'),
+        ]
+        verbose_name = 'Ranked Ballot'
+        verbose_name_plural = 'Ranked Ballots'
+
+    def __str__(self):
+        return f"{self.position}: {ranked.decode(self.ranking)}"
+
+    @classmethod
+    def record(cls, ranked_votes):
+        """Store the rankings behind first preferences just created, in one insert.
+
+        ``ranked_votes`` holds ``(vote, contest, candidate_ids)`` triples.
+        """
+        return cls.objects.bulk_create([
+            cls(vote=vote, election_id=vote.election_id, position=vote.position, ranking=contest.encode(candidate_ids))
+            for vote, contest, candidate_ids in ranked_votes
+        ])
+
 
 class AdminUser(models.Model):
     """Link Django User to admin sessions for password management"""
@@ -112,8 +314,8 @@ class AdminUser(models.Model):
         return f"Admin: {self.user.username}"
 
 
-class ElectionSettings(models.Model):
-    """Model to store election settings"""
+class Election(models.Model):
+    """An election with its own roll of voters, candidates and votes"""
     election_title = models.CharField(max_length=200, default='Porpon Young Generation Chairman and Lady Election')
     election_description = models.TextField(default='Vote for your preferred candidate for the position of Chairman and Lady')
     start_time = models.DateTimeField(null=True, blank=True, help_text='When voting starts')
@@ -124,14 +326,614 @@ class ElectionSettings(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        verbose_name = 'Election Settings'
-        verbose_name_plural = 'Election Settings'
+        ordering = ['-id']
+        verbose_name = 'Election'
+        verbose_name_plural = 'Elections'
     
     def __str__(self):
-        return f"Election Settings - {self.election_title}"
+        return self.election_title
     
     @classmethod
-    def get_settings(cls):
-        """Get or create election settings"""
-        settings, created = cls.objects.get_or_create(id=1)
-        return settings
+    def get_default(cls):
+        """The election shown when none is selected: the newest active one"""
+        election = cls.objects.filter(is_active=True).first() or cls.objects.first()
+        if election is None:
+            election = cls.objects.create()
+        return election
+
+    @classmethod
+    async def aget_default(cls):
+        """Async variant of :meth:`get_default`"""
+        election = await cls.objects.filter(is_active=True).afirst() or await cls.objects.afirst()
+        if election is None:
+            election = await cls.objects.acreate()
+        return election
+
+
+class TurnoutCounter(models.Model):
+    """Running count of an election's voters who have cast at least one vote.
+
+    Maintained incrementally when a voter's ``has_voted`` flag flips, so
+    turnout can be read in constant time instead of scanning the Vote table.
+    Use the ``reconcile_turnout`` management command to verify it.
+    """
+    election = models.OneToOneField(Election, on_delete=models.CASCADE, related_name='turnout_counter')
+    voters_voted = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Turnout Counter'
+        verbose_name_plural = 'Turnout Counters'
+
+    def __str__(self):
+        return f"Turnout: {self.voters_voted}"
+
+    @classmethod
+    def get_count(cls, election):
+        """Return the number of voters who have voted in ``election``"""
+        count = cls.objects.filter(election=election).values_list('voters_voted', flat=True).first()
+        return count or 0
+
+    @classmethod
+    def increment(cls, election, amount=1):
+        """Atomically add ``amount`` (may be negative) to the election's counter"""
+        updated = cls.objects.filter(election=election).update(
+            voters_voted=F('voters_voted') + amount,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            cls.objects.create(election=election, voters_voted=max(amount, 0))
+
+    @classmethod
+    def reset(cls, election, value=0):
+        """Overwrite the counter, e.g. after clearing or reconciling data"""
+        cls.objects.update_or_create(election=election, defaults={'voters_voted': value})
+
+
+class VoteRollup(models.Model):
+    """Vote counts per time bucket and position for the dashboard charts.
+
+    One row per (granularity, bucket, position), updated incrementally as votes
+    are recorded. ``new_voters`` counts voters whose first vote fell in the
+    bucket, so cumulative turnout can be drawn without touching the Vote table.
+    Rebuild from scratch with the ``rebuild_rollups`` management command.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    GRANULARITY_CHOICES = [
+        (MINUTE, 'Minute'),
+        (HOUR, 'Hour'),
+    ]
+    BUCKET_SIZES = {
+        MINUTE: timedelta(minutes=1),
+        HOUR: timedelta(hours=1),
+    }
+    # Buckets updated per statement by record_batch
+    BATCH_BUCKETS = 200
+
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=6, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    position = models.CharField(max_length=80)
+    votes = models.IntegerField(default=0)
+    new_voters = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['election', 'granularity', 'bucket_start', 'position']
+        ordering = ['election', 'granularity', 'bucket_start', 'position']
+        verbose_name = 'Vote Rollup'
+        verbose_name_plural = 'Vote Rollups'
+
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d %H:%M} {self.position}: {self.votes}"
+
+    @classmethod
+    def bucket_for(cls, moment, granularity):
+        """Truncate a datetime to the start of its bucket"""
+        if granularity == cls.HOUR:
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(second=0, microsecond=0)
+
+    @classmethod
+    def record(cls, election, voted_at, position, new_voter=False, delta=1):
+        """Add ``delta`` votes (negative to retract) to every bucket covering ``voted_at``"""
+        voter_delta = delta if new_voter else 0
+        for granularity in (cls.MINUTE, cls.HOUR):
+            lookup = {
+                'election': election,
+                'granularity': granularity,
+                'bucket_start': cls.bucket_for(voted_at, granularity),
+                'position': position,
+            }
+            changes = {
+                'votes': F('votes') + delta,
+                'new_voters': F('new_voters') + voter_delta,
+            }
+            if cls.objects.filter(**lookup).update(**changes) or delta < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(votes=delta, new_voters=voter_delta, **lookup)
+            except IntegrityError:
+                # Another request created the bucket first
+                cls.objects.filter(**lookup).update(**changes)
+
+    @classmethod
+    def record_many(cls, election, voted_at, positions, new_voter=False):
+        """Add one vote in each of ``positions``, all cast at ``voted_at``.
+
+        Two statements per granularity however many positions there are:
+        missing buckets are inserted empty, then all are bumped at once. The
+        voter's ``new_voters`` count goes to the first position.
+        """
+        if len(positions) == 1:
+            return cls.record(election, voted_at, positions[0], new_voter=new_voter)
+        for granularity in (cls.MINUTE, cls.HOUR):
+            bucket_start = cls.bucket_for(voted_at, granularity)
+            cls.objects.bulk_create(
+                [
+                    cls(election=election, granularity=granularity, bucket_start=bucket_start, position=position)
+                    for position in positions
+                ],
+                ignore_conflicts=True,
+            )
+            cls.objects.filter(
+                election=election, granularity=granularity, bucket_start=bucket_start, position__in=positions,
+            ).update(
+                votes=F('votes') + 1,
+                new_voters=F('new_voters') + Case(When(position=positions[0], then=int(new_voter)), default=0),
+            )
+
+    @classmethod
+    def record_batch(cls, election, votes):
+        """Add many votes cast at different times, with a few statements per granularity.
+
+        ``votes`` holds ``(voted_at, position, new_voter)`` triples.
+        """
+        changes = {}
+        for voted_at, position, new_voter in votes:
+            for granularity in (cls.MINUTE, cls.HOUR):
+                counts = changes.setdefault((granularity, cls.bucket_for(voted_at, granularity), position), [0, 0])
+                counts[0] += 1
+                counts[1] += new_voter
+        for granularity in (cls.MINUTE, cls.HOUR):
+            buckets = {
+                (bucket_start, position): counts
+                for (gran, bucket_start, position), counts in changes.items() if gran == granularity
+            }
+            if not buckets:
+                continue
+            cls.objects.bulk_create(
+                [
+                    cls(election=election, granularity=granularity, bucket_start=bucket_start, position=position)
+                    for bucket_start, position in buckets
+                ],
+                ignore_conflicts=True,
+            )
+            # SQLite nests each OR one level deeper, so match a bounded number of buckets per UPDATE
+            keys = list(buckets)
+            for start in range(0, len(keys), cls.BATCH_BUCKETS):
+                matches = {key: models.Q(bucket_start=key[0], position=key[1]) for key in keys[start:start + cls.BATCH_BUCKETS]}
+                cls.objects.filter(
+                    models.Q(*matches.values(), _connector=models.Q.OR), election=election, granularity=granularity,
+                ).update(
+                    votes=F('votes') + Case(
+                        *[When(match, then=buckets[key][0]) for key, match in matches.items()], default=0,
+                    ),
+                    new_voters=F('new_voters') + Case(
+                        *[When(match, then=buckets[key][1]) for key, match in matches.items()], default=0,
+                    ),
+                )
+
+    @classmethod
+    def retract(cls, election, votes):
+        """Take removed votes back out of their buckets, one UPDATE per bucket.
+
+        ``votes`` holds ``(voter_id, voted_at, position)`` ordered by voter,
+        time and id; each voter's first vote also gives back its ``new_voters``
+        count.
+        """
+        changes = {}
+        last_voter = None
+        for voter_id, voted_at, position in votes:
+            first_vote = voter_id != last_voter
+            last_voter = voter_id
+            for granularity in (cls.MINUTE, cls.HOUR):
+                key = (granularity, cls.bucket_for(voted_at, granularity), position)
+                counts = changes.setdefault(key, [0, 0])
+                counts[0] += 1
+                counts[1] += first_vote
+        for (granularity, bucket_start, position), (removed, voters) in changes.items():
+            cls.objects.filter(
+                election=election, granularity=granularity, bucket_start=bucket_start, position=position,
+            ).update(votes=F('votes') - removed, new_voters=F('new_voters') - voters)
+
+    @classmethod
+    def rebuild(cls, election=None, chunk_size=5000):
+        """Recount the buckets of ``election`` (or its id; every election if None) from the Vote table.
+
+        Returns ``(buckets, votes scanned)``.
+        """
+        votes = Vote.objects.all() if election is None else Vote.objects.filter(election=election)
+        counts = {}
+        last_voter_id = None
+        scanned = 0
+        # One streaming pass ordered by voter, so each voter's first vote is
+        # seen first and memory only grows with the number of buckets. A
+        # ballot's votes share a time; the first one recorded took new_voters
+        rows = (
+            votes.order_by('voter_id', 'voted_at', 'id')
+            .values_list('election_id', 'voter_id', 'voted_at', 'position')
+            .iterator(chunk_size=chunk_size)
+        )
+        for election_id, voter_id, voted_at, position in rows:
+            first_vote = voter_id != last_voter_id
+            last_voter_id = voter_id
+            scanned += 1
+            for granularity in (cls.MINUTE, cls.HOUR):
+                key = (election_id, granularity, cls.bucket_for(voted_at, granularity), position)
+                bucket = counts.setdefault(key, [0, 0])
+                bucket[0] += 1
+                bucket[1] += first_vote
+
+        rollups = [
+            cls(
+                election_id=election_id, granularity=granularity, bucket_start=bucket_start, position=position,
+                votes=count, new_voters=new_voters,
+            )
+            for (election_id, granularity, bucket_start, position), (count, new_voters) in counts.items()
+        ]
+        with transaction.atomic():
+            (cls.objects.all() if election is None else cls.objects.filter(election=election)).delete()
+            cls.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups), scanned
+
+    @classmethod
+    def timeline(cls, election, granularity, limit=None):
+        """Return the latest ``limit`` buckets as compact, gap-filled arrays.
+
+        The result holds ISO bucket labels, total votes per bucket, cumulative
+        turnout (voters) at the end of each bucket and per-position vote arrays.
+        """
+        if limit is None:
+            limit = getattr(settings, 'VOTING_ROLLUP_BUCKETS', {}).get(granularity, 120)
+        step = cls.BUCKET_SIZES[granularity]
+        rows = cls.objects.filter(election=election, granularity=granularity)
+        last = rows.order_by('-bucket_start').values_list('bucket_start', flat=True).first()
+        if last is None:
+            return {'granularity': granularity, 'labels': [], 'votes': [], 'turnout': [], 'positions': {}}
+
+        first = rows.order_by('bucket_start').values_list('bucket_start', flat=True).first()
+        cutoff = max(first, last - step * (limit - 1))
+        size = int((last - cutoff) / step) + 1
+        baseline = rows.filter(bucket_start__lt=cutoff).aggregate(total=Sum('new_voters'))['total'] or 0
+
+        votes = [0] * size
+        new_voters = [0] * size
+        positions = {}
+        recent = rows.filter(bucket_start__gte=cutoff).values_list('bucket_start', 'position', 'votes', 'new_voters')
+        for bucket_start, position, count, voters in recent:
+            index = int((bucket_start - cutoff) / step)
+            votes[index] += count
+            new_voters[index] += voters
+            positions.setdefault(position, [0] * size)[index] += count
+
+        turnout = []
+        running = baseline
+        for voters in new_voters:
+            running += voters
+            turnout.append(running)
+
+        return {
+            'granularity': granularity,
+            'labels': [(cutoff + step * i).isoformat() for i in range(size)],
+            'votes': votes,
+            'turnout': turnout,
+            'positions': positions,
+        }
+
+
+class AuditHead(models.Model):
+    """Current state of an election's append-only vote log.
+
+    Holds the Merkle frontier, so appending a vote hashes at most O(log n)
+    nodes without reading the tree back, plus the running hash chain.
+    """
+    election = models.OneToOneField(Election, on_delete=models.CASCADE, related_name='audit_head')
+    size = models.PositiveBigIntegerField(default=0)
+    frontier = models.JSONField(default=list)
+    root_hash = models.CharField(max_length=64, default=merkle.EMPTY_ROOT.hex())
+    chain_hash = models.CharField(max_length=64, default=merkle.GENESIS.hex())
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Audit Head'
+        verbose_name_plural = 'Audit Heads'
+
+    def __str__(self):
+        return f"{self.election}: {self.size} entries, root {self.root_hash[:16]}"
+
+    @classmethod
+    def append(cls, vote):
+        """Log a freshly created vote; call inside the vote's transaction"""
+        return cls.append_many([vote])[0]
+
+    @classmethod
+    def append_many(cls, votes):
+        """Log freshly created votes of one election, in order, with one insert per table"""
+        election_id = votes[0].election_id
+        cls.objects.get_or_create(election_id=election_id)
+        # Lock the head so concurrent votes get consecutive sequence numbers
+        head = cls.objects.select_for_update().get(election_id=election_id)
+        frontier = merkle.Frontier.from_hex(head.size, head.frontier)
+        chain = bytes.fromhex(head.chain_hash)
+        entries = []
+        nodes = []
+        for vote in votes:
+            entry = AuditEntry(
+                election_id=election_id,
+                seq=frontier.size,
+                vote=vote,
+                vote_ref=vote.id,
+                voter_ref=vote.voter_id,
+                candidate_ref=vote.candidate_id,
+                position=vote.position,
+                voted_at=vote.voted_at,
+            )
+            leaf = entry.compute_leaf()
+            nodes += frontier.append(leaf)
+            chain = merkle.chain_hash(chain, leaf)
+            entry.leaf_hash = leaf.hex()
+            entry.chain_hash = chain.hex()
+            entries.append(entry)
+        AuditEntry.objects.bulk_create(entries)
+        MerkleNode.objects.bulk_create([
+            MerkleNode(election_id=election_id, level=level, index=index, hash=digest.hex())
+            for level, index, digest in nodes
+        ])
+        head.size = frontier.size
+        head.frontier = frontier.to_hex()
+        head.root_hash = frontier.root().hex()
+        head.chain_hash = entries[-1].chain_hash
+        head.save()
+        return entries
+
+    def proof(self, entry, size=None):
+        """Return ``(audit_path, root)`` for an entry against the first ``size`` entries"""
+        size = self.size if size is None else size
+        get_node = self._node_reader(merkle.proof_nodes(entry.seq, size))
+        return merkle.inclusion_proof(entry.seq, size, get_node), merkle.subtree_hash(0, size, get_node)
+
+    def consistency(self, old_size, size=None):
+        """Return ``(proof, old_root, root)`` showing the first ``old_size`` entries are a prefix of the first ``size``"""
+        size = self.size if size is None else size
+        get_node = self._node_reader(merkle.consistency_nodes(old_size, size))
+        return (
+            merkle.consistency_proof(old_size, size, get_node),
+            merkle.subtree_hash(0, old_size, get_node) if old_size else merkle.EMPTY_ROOT,
+            merkle.subtree_hash(0, size, get_node) if size else merkle.EMPTY_ROOT,
+        )
+
+    def _node_reader(self, keys):
+        """Fetch the stored nodes at ``(level, index)`` ``keys`` in one query; return a lookup function"""
+        if not keys:
+            return lambda level, index: None
+        # One branch per level, each spelled out in full so every branch can
+        # use the (election, level, index) unique index
+        lookup = models.Q()
+        for level in {level for level, _ in keys}:
+            indexes = [index for lv, index in keys if lv == level]
+            lookup |= models.Q(election_id=self.election_id, level=level, index__in=indexes)
+        nodes = {
+            (level, index): bytes.fromhex(digest)
+            for level, index, digest in MerkleNode.objects.filter(lookup).values_list('level', 'index', 'hash')
+        }
+
+        def get_node(level, index):
+            return nodes[(level, index)]
+
+        return get_node
+
+
+class AuditEntry(models.Model):
+    """One vote in the append-only log, hash-chained to the entry before it.
+
+    The vote's identifying fields are copied so the log survives edits to, or
+    deletion of, the Vote row and can be checked against it.
+    """
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, related_name='audit_entries')
+    seq = models.PositiveBigIntegerField()
+    vote = models.OneToOneField(Vote, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_entry')
+    vote_ref = models.PositiveBigIntegerField()
+    voter_ref = models.PositiveBigIntegerField()
+    candidate_ref = models.PositiveBigIntegerField()
+    position = models.CharField(max_length=80)
+    voted_at = models.DateTimeField()
+    leaf_hash = models.CharField(max_length=64)
+    chain_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ['election', 'seq']
+        ordering = ['election', 'seq']
+        verbose_name = 'Audit Entry'
+        verbose_name_plural = 'Audit Entries'
+
+    def __str__(self):
+        return f"#{self.seq} vote {self.vote_ref} ({self.leaf_hash[:16]})"
+
+    def compute_leaf(self):
+        return merkle.vote_leaf(
+            self.election_id, self.seq, self.vote_ref, self.voter_ref, self.candidate_ref, self.position, self.voted_at,
+        )
+
+
+class MerkleNode(models.Model):
+    """A finished perfect subtree of the vote log; level 0 holds the leaves"""
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, related_name='merkle_nodes')
+    level = models.PositiveSmallIntegerField()
+    index = models.PositiveBigIntegerField()
+    hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ['election', 'level', 'index']
+        verbose_name = 'Merkle Node'
+        verbose_name_plural = 'Merkle Nodes'
+
+    def __str__(self):
+        return f"L{self.level}[{self.index}] {self.hash[:16]}"
+
+
+class AuditCheckpoint(models.Model):
+    """A published log root that later verification runs must still reproduce"""
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, related_name='audit_checkpoints')
+    size = models.PositiveBigIntegerField()
+    root_hash = models.CharField(max_length=64)
+    chain_hash = models.CharField(max_length=64)
+    published_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-published_at']
+        verbose_name = 'Audit Checkpoint'
+        verbose_name_plural = 'Audit Checkpoints'
+
+    def __str__(self):
+        return f"{self.election} @ {self.size}: {self.root_hash[:16]}"
+
+
+class Job(models.Model):
+    """A background task run by ``manage.py run_jobs`` (see VotingApp.jobs)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=40)
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    # Name of the file the job wrote under VOTING_JOBS_DIR, if any
+    result_file = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed with every progress report; a running job that stops
+    # reporting is handed to another worker
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # Serves the workers' "next job due" lookup
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+    @property
+    def percent(self):
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.total:
+            return None
+        return min(100, self.progress * 100 // self.total)
+
+    @classmethod
+    def enqueue(cls, kind, election=None, max_attempts=3, **params):
+        return cls.objects.create(kind=kind, election=election, params=params, max_attempts=max_attempts)
+
+    @classmethod
+    def claim(cls):
+        """Mark the oldest due job running and return it, or None if there is none.
+
+        The conditional update makes the claim safe with several workers:
+        whoever updates the row first gets the job.
+        """
+        while True:
+            now = timezone.now()
+            job_id = (
+                cls.objects.filter(status=cls.QUEUED, run_after__lte=now)
+                .order_by('run_after', 'id').values_list('id', flat=True).first()
+            )
+            if job_id is None:
+                return None
+            claimed = cls.objects.filter(id=job_id, status=cls.QUEUED).update(
+                status=cls.RUNNING, started_at=now, heartbeat=now, attempts=F('attempts') + 1, error='',
+            )
+            if claimed:
+                return cls.objects.get(id=job_id)
+
+    @classmethod
+    def requeue_stale(cls, stale_after):
+        """Put running jobs whose worker stopped reporting back in the queue; return how many"""
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        stale = cls.objects.filter(status=cls.RUNNING, heartbeat__lt=cutoff)
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=cls.FAILED, finished_at=timezone.now(), error='The worker running this job stopped responding',
+        )
+        return failed + stale.update(status=cls.QUEUED, run_after=timezone.now())
+
+    def report(self, progress, total=None, message=None):
+        """Record progress; ``total`` and ``message`` are kept unless given"""
+        self.progress = progress
+        changes = {'progress': progress, 'heartbeat': timezone.now()}
+        if total is not None:
+            self.total = changes['total'] = total
+        if message is not None:
+            self.message = changes['message'] = message[:200]
+        type(self).objects.filter(id=self.id).update(**changes)
+
+    def succeed(self, result=None, result_file=''):
+        now = timezone.now()
+        self.status, self.result, self.result_file, self.finished_at = self.SUCCEEDED, result, result_file, now
+        if self.total is not None:
+            self.progress = self.total
+        self.save(update_fields=['status', 'result', 'result_file', 'finished_at', 'progress', 'heartbeat'])
+
+    def fail(self, error, retry_delay):
+        """Record a failed attempt; queue a retry after ``retry_delay * 2 ** (attempts - 1)`` seconds if any are left"""
+        self.error = error
+        if self.attempts < self.max_attempts:
+            self.status = self.QUEUED
+            self.run_after = timezone.now() + timedelta(seconds=retry_delay * 2 ** (self.attempts - 1))
+        else:
+            self.status = self.FAILED
+            self.finished_at = timezone.now()
+        self.save(update_fields=['error', 'status', 'run_after', 'finished_at'])
+
+
+class KioskBatch(models.Model):
+    """A batch of votes synced from an offline polling station (see VotingApp.kiosk).
+
+    Kept so a batch the station sends again, after losing the reply, is
+    answered with the original outcome instead of being applied twice.
+    """
+    station = models.CharField(max_length=60)
+    batch_id = models.CharField(max_length=60)
+    election = models.ForeignKey(Election, on_delete=models.CASCADE, related_name='kiosk_batches')
+    received_at = models.DateTimeField(auto_now_add=True)
+    accepted = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    rejected = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        verbose_name = 'Kiosk Batch'
+        verbose_name_plural = 'Kiosk Batches'
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'batch_id'], name='unique_kiosk_batch'),
+        ]
+
+    def __str__(self):
+        return f"{self.station} batch {self.batch_id}: {self.accepted} accepted"
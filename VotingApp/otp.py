@@ -0,0 +1,85 @@
+"""
+One-time login codes for voters.
+
+Codes only ever live in the cache named by ``VOTING_OTP_CACHE``: a salted
+HMAC of the code under a per-voter key that expires after
+``VOTING_OTP_TTL`` seconds. Nothing is written to the database. Wrong
+guesses are counted with ``cache.incr`` so concurrent workers share the
+limit, and a new code cannot be requested more often than every
+``VOTING_OTP_RESEND_INTERVAL`` seconds.
+
+With more than one worker process the cache must be shared (Redis,
+Memcached, database cache); the default local-memory cache is per process.
+
+Codes are off unless ``VOTING_OTP_ENABLED`` is set, as they need a real SMS
+backend; the ``VotingApp.E001`` system check refuses to start outside
+DEBUG with codes on and a backend that sends nothing.
+"""
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import sms
+
+
+def _setting(name, default):
+    return getattr(settings, f'VOTING_OTP_{name}', default)
+
+
+def enabled():
+    return _setting('ENABLED', False)
+
+
+def _cache():
+    return caches[_setting('CACHE', 'default')]
+
+
+def _key(election, phone, kind):
+    return f'voting:otp:{kind}:{election.id}:{phone}'
+
+
+def _digest(election, phone, code):
+    return salted_hmac('VotingApp.otp', f'{election.id}:{phone}:{code}').hexdigest()
+
+
+def issue(election, phone):
+    """Create a code for ``phone`` and queue it by SMS.
+
+    Returns False without sending anything when a code was issued less than
+    ``VOTING_OTP_RESEND_INTERVAL`` seconds ago.
+    """
+    cache = _cache()
+    if not cache.add(_key(election, phone, 'sent'), 1, _setting('RESEND_INTERVAL', 30)):
+        return False
+    length = _setting('LENGTH', 6)
+    code = f'{secrets.randbelow(10 ** length):0{length}d}'
+    ttl = _setting('TTL', 300)
+    cache.set_many({
+        _key(election, phone, 'code'): _digest(election, phone, code),
+        _key(election, phone, 'tries'): 0,
+    }, ttl)
+    sms.enqueue(phone, f'{code} is your {election.election_title} login code. It expires in {max(1, ttl // 60)} minutes.')
+    return True
+
+
+def verify(election, phone, code):
+    """Check ``code``; a correct code is consumed and cannot be used again"""
+    cache = _cache()
+    code_key, tries_key = _key(election, phone, 'code'), _key(election, phone, 'tries')
+    expected = cache.get(code_key)
+    if expected is None:
+        return False
+    try:
+        tries = cache.incr(tries_key)
+    except ValueError:
+        # The counter expired between the two reads, so the code has too
+        return False
+    if tries > _setting('MAX_ATTEMPTS', 5):
+        cache.delete_many([code_key, tries_key])
+        return False
+    if not constant_time_compare(expected, _digest(election, phone, code.strip())):
+        return False
+    cache.delete_many([code_key, tries_key])
+    return True
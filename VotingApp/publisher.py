@@ -0,0 +1,115 @@
+"""
+Static copies of the public results pages.
+
+Every anonymous visitor sees the same landing page, public results page and
+JSON feed, so ``manage.py publish_results --every 2`` renders them to files
+under ``VOTING_PUBLISH_DIR`` and keeps them current: each interval it
+compares the tallies with the last published ones and re-renders only when
+they changed, so a burst of votes costs at most one render per interval.
+Pages are also re-rendered every ``VOTING_PUBLISH_REFRESH`` seconds for the
+parts that change with time alone (election status, durations).
+
+Files are written to a temporary name and renamed into place, so a static
+file server never sends a half-written page. The layout mirrors the URLs::
+
+    index.html                      landing page of the default election
+    public-results/index.html       public results page
+    api/results/index.json          results feed
+    elections/<id>/...              the same three for each active election
+
+so nginx can serve them with ``try_files $uri/index.html $uri/index.json
+@django`` and fall back to Django for everything else.
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import tally_store
+from .models import Election, TurnoutCounter, Vote
+
+
+def publish_dir():
+    path = getattr(settings, 'VOTING_PUBLISH_DIR', None)
+    return Path(path) if path else None
+
+
+def tally_version():
+    """Something that changes whenever a vote is recorded or removed"""
+    snapshot = tally_store.get_snapshot()
+    if snapshot is not None:
+        return snapshot
+    return (
+        Vote.objects.aggregate(Max('id'))['id__max'],
+        tuple(TurnoutCounter.objects.order_by('election_id').values_list('election_id', 'voters_voted')),
+    )
+
+
+def _write(path, content):
+    """Replace ``path`` with ``content`` in one rename"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def publish_election(election, root):
+    """Render one election's public pages under ``root``; return the paths written"""
+    from .views import _landing_context, _public_results_context, _results_feed
+
+    published_at = timezone.now()
+    landing = _landing_context(election)
+    landing['published_at'] = published_at
+    results = _public_results_context(election)
+    results['published_at'] = published_at
+    feed = _results_feed(election)
+    feed['published_at'] = published_at
+
+    pages = {
+        root / 'index.html': render_to_string('landing.html', landing),
+        root / 'public-results' / 'index.html': render_to_string('public_results.html', results),
+        root / 'api' / 'results' / 'index.json': json.dumps(feed, cls=DjangoJSONEncoder),
+    }
+    for path, content in pages.items():
+        _write(path, content)
+    return list(pages)
+
+
+def publish(root=None):
+    """Render the default and every active election's pages; return the paths written"""
+    root = Path(root) if root else publish_dir()
+    default = Election.get_default()
+    written = publish_election(default, root)
+    for election in Election.objects.filter(is_active=True):
+        written += publish_election(election, root / 'elections' / str(election.id))
+    return written
+
+
+def watch(interval, refresh=None, root=None, on_publish=None):
+    """Publish now, then again whenever the tallies change, at most once per ``interval``"""
+    refresh = refresh or getattr(settings, 'VOTING_PUBLISH_REFRESH', 60)
+    published = None
+    last = 0.0
+    while True:
+        started = time.monotonic()
+        version = tally_version()
+        if published is None or version != published or started - last >= refresh:
+            written = publish(root)
+            published, last = version, started
+            if on_publish:
+                on_publish(written, time.monotonic() - started)
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,160 @@
+"""
+Ranked ballots: compact encoding and an instant-runoff / STV count.
+
+A ranked ballot is stored as the voter's preferences packed one byte per
+choice, each byte the candidate's index in its position's candidate list
+(see ``RankedPosition.candidates``), most preferred first. Identical
+rankings are counted once with a weight, so a count over a million ballots
+only handles as many distinct rankings as the voters actually produced.
+
+The count keeps one integer tally per candidate and, per candidate, the
+pile of ballot groups currently sitting with them. Each round only the pile
+of the candidate elected or eliminated is redistributed, to the next
+preference still in the running; every other pile stays where it is.
+
+Values are fixed-point integers in units of ``1 / SCALE`` votes, so STV
+surplus transfers (Gregory method, value truncated at every transfer as in
+the Scottish STV rules) never go through floating point.
+
+Ties for elimination are broken by the earlier rounds (fewest votes in the
+most recent round where the tied candidates differ) and then by candidate
+order, the one added later being eliminated first.
+"""
+from collections import Counter
+from typing import NamedTuple
+
+IRV = 'irv'
+STV = 'stv'
+SCALE = 100000
+MAX_CANDIDATES = 256
+
+
+def encode(indexes):
+    """Pack a ranking of candidate indexes, most preferred first"""
+    return bytes(indexes)
+
+
+def decode(ranking):
+    return list(ranking)
+
+
+class Round(NamedTuple):
+    number: int
+    tallies: list  # per candidate index, fixed point; None once out of the count
+    exhausted: int
+    elected: list
+    eliminated: list
+
+
+class Count(NamedTuple):
+    method: str
+    seats: int
+    ballots: int
+    quota: int  # fixed point; for IRV a majority of the votes still in the count
+    elected: list
+    rounds: list
+
+
+def votes(value):
+    """A fixed-point tally as a number of votes, to two decimals"""
+    if value is None:
+        return None
+    rounded = round(value / SCALE, 2)
+    return int(rounded) if rounded.is_integer() else rounded
+
+
+def count(ballots, candidates, seats=1, method=IRV, excluded=()):
+    """Count weighted, packed ballots; return the rounds and the elected indexes.
+
+    ``ballots`` is an iterable of ``(ranking, weight)`` pairs or of bare
+    rankings, ``candidates`` the number of candidate indexes and
+    ``excluded`` indexes of candidates no longer standing, whose
+    preferences are skipped.
+    """
+    groups = Counter()
+    for ballot in ballots:
+        if isinstance(ballot, tuple):
+            groups[ballot[0]] += ballot[1]
+        else:
+            groups[ballot] += 1
+
+    standing = [index not in excluded for index in range(candidates)]
+    rankings = list(groups)
+    values = [weight * SCALE for weight in groups.values()]
+    cursor = [0] * len(rankings)
+    tallies = [0] * candidates
+    piles = [[] for _ in range(candidates)]
+    exhausted = 0
+    total = sum(groups.values())
+    if method == IRV:
+        seats = 1
+
+    def place(group, value):
+        """Hand a group on to its next preference still standing"""
+        nonlocal exhausted
+        ranking = rankings[group]
+        position = cursor[group]
+        while position < len(ranking):
+            index = ranking[position]
+            if index < candidates and standing[index]:
+                cursor[group] = position
+                values[group] = value
+                tallies[index] += value
+                piles[index].append(group)
+                return
+            position += 1
+        cursor[group] = position
+        exhausted += value
+
+    def transfer(index, numerator=1, denominator=1):
+        pile, piles[index] = piles[index], []
+        for group in pile:
+            place(group, values[group] * numerator // denominator)
+
+    for group in range(len(rankings)):
+        place(group, values[group])
+
+    quota = (total * SCALE) // (seats + 1) + 1 if method == STV else 0
+    elected = []
+    rounds = []
+    history = []
+    while total and len(elected) < seats:
+        continuing = [index for index in range(candidates) if standing[index]]
+        if not continuing:
+            break
+        history.append(list(tallies))
+        if method == IRV:
+            quota = sum(tallies[index] for index in continuing) // 2 + 1
+        snapshot = [tallies[index] if standing[index] or index in elected else None for index in range(candidates)]
+        if len(continuing) <= seats - len(elected):
+            # Everyone left fills the remaining seats
+            continuing.sort(key=lambda index: -tallies[index])
+            elected += continuing
+            rounds.append(Round(len(rounds) + 1, snapshot, exhausted, continuing, []))
+            break
+
+        winners = sorted((index for index in continuing if tallies[index] >= quota), key=lambda index: -tallies[index])
+        if winners:
+            for index in winners:
+                standing[index] = False
+            elected += winners
+            if method == STV and len(elected) < seats:
+                for index in winners:
+                    surplus = tallies[index] - quota
+                    if surplus > 0:
+                        transfer(index, surplus, tallies[index])
+                    else:
+                        piles[index] = []
+                    tallies[index] = quota
+            rounds.append(Round(len(rounds) + 1, snapshot, exhausted, winners, []))
+            continue
+
+        loser = min(
+            continuing,
+            key=lambda index: (tallies[index], [past[index] for past in reversed(history[:-1])], -index),
+        )
+        standing[loser] = False
+        rounds.append(Round(len(rounds) + 1, snapshot, exhausted, [], [loser]))
+        transfer(loser)
+        tallies[loser] = 0
+    return Count(method, seats, total, quota, elected, rounds)
@@ -0,0 +1,138 @@
+"""
+Read-only snapshot of the database for public results traffic.
+
+``take_snapshot`` copies the live SQLite file with the online backup API into
+a temporary file and renames it over ``VOTING_REPLICA_PATH``, so readers
+always open a complete snapshot. The copy is taken in one step: it holds a
+read lock for the few milliseconds the copy takes, which writers simply wait
+out, rather than restarting over and over while votes keep arriving. Run
+``manage.py snapshot_replica --every 10`` next to the web workers to keep it
+fresh.
+
+Views decorated with :func:`public_read` read the app's tables from the
+``replica`` database alias (see ``ReplicaRouter``) as long as the snapshot
+is younger than ``VOTING_REPLICA_MAX_AGE`` seconds, and from the primary
+otherwise. Sessions and everything written still use the primary. Each
+response says how old its data is in an ``X-Data-Age`` header, and
+templates get ``data_age`` (seconds, or None when read live).
+"""
+import contextvars
+import functools
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+ALIAS = 'replica'
+APP_LABEL = 'VotingApp'
+
+# Age in seconds of the snapshot the current request reads, None when live
+_data_age = contextvars.ContextVar('voting_replica_age', default=None)
+
+
+def replica_path():
+    path = getattr(settings, 'VOTING_REPLICA_PATH', None)
+    return Path(path) if path else None
+
+
+def take_snapshot(source=None, path=None):
+    """Copy the primary database into the replica file; return the seconds it took"""
+    path = Path(path) if path else replica_path()
+    source = source or settings.DATABASES['default']['NAME']
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        src = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        # The snapshot is as old as the moment the copy started
+        os.utime(tmp, (started, started))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return time.time() - started
+
+
+def snapshot_age():
+    """Seconds since the replica was taken, or None if there is none"""
+    path = replica_path()
+    if path is None:
+        return None
+    try:
+        return max(0.0, time.time() - path.stat().st_mtime)
+    except FileNotFoundError:
+        return None
+
+
+def fresh_age():
+    """The replica's age if it may serve reads right now, else None"""
+    if ALIAS not in settings.DATABASES:
+        return None
+    age = snapshot_age()
+    if age is None or age > getattr(settings, 'VOTING_REPLICA_MAX_AGE', 30):
+        return None
+    return age
+
+
+def data_age():
+    """Age of the data the current request reads; None when it reads live"""
+    return _data_age.get()
+
+
+def _finish(response, age):
+    response['X-Data-Age'] = 'live' if age is None else str(int(age))
+    return response
+
+
+def public_read(view):
+    """Serve ``view``'s reads from the replica while it is fresh enough"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            age = fresh_age()
+            token = _data_age.set(age)
+            try:
+                return _finish(await view(request, *args, **kwargs), age)
+            finally:
+                _data_age.reset(token)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            age = fresh_age()
+            token = _data_age.set(age)
+            try:
+                return _finish(view(request, *args, **kwargs), age)
+            finally:
+                _data_age.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Route the app's reads to the replica inside :func:`public_read` views"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_LABEL and _data_age.get() is not None:
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary and is never migrated itself
+        return False if db == ALIAS else None
@@ -0,0 +1,156 @@
+"""
+Declarative sync of an election's voter roll against a full roll file.
+
+The electoral office sends the complete roll every round. ``diff_roll``
+normalizes the file into a set of phone numbers, then streams the current
+roll from the database once: numbers found in both are unchanged, numbers
+only in the database are removals and whatever is left of the file's set are
+additions. Voters who have already voted are never removed unless asked for
+explicitly.
+
+A diff is a preview. Its ``fingerprint`` identifies the exact set of changes,
+so ``apply_diff`` can be given a fresh diff and refuse to run if the roll
+changed since the preview was shown.
+"""
+import csv
+import hashlib
+import re
+
+
+from .models import Voter
+from . import events, tally_store
+
+BATCH_SIZE = 1000
+SAMPLE_SIZE = 20
+# Raised while reading a file that is not a text roll
+UNREADABLE = (UnicodeDecodeError, csv.Error)
+
+
+# Exactly what Voter.phone_validator accepts. Numbers already in this form
+# (nearly all of an official roll) skip normalization and validation.
+CANONICAL = re.compile(r'\+\d{5,17}')
+
+
+def read_roll(lines):
+    """Yield ``(line_number, raw, normalized)`` for each number in a roll file.
+
+    Takes an iterable of text lines: one number per line, or CSV whose first
+    column is the number. Blank lines and a non-numeric header are skipped.
+    """
+    canonical = CANONICAL.fullmatch
+    for number, row in enumerate(csv.reader(lines), start=1):
+        raw = row[0].strip() if row else ''
+        if not raw or (number == 1 and not any(c.isdigit() for c in raw)):
+            continue
+        yield number, raw, raw if canonical(raw) else Voter.normalize_phone_number(raw)
+
+
+class RollDiff:
+    """Changes needed to turn an election's roll into the uploaded one"""
+
+    def __init__(self, election):
+        self.election = election
+        self.to_add = []
+        self.to_remove = []
+        self.protected = []
+        self.unchanged = 0
+        self.duplicates = 0
+        self.invalid = []
+
+    @property
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        digest.update(f'{self.election.id}\n'.encode())
+        for phone in sorted(self.to_add):
+            digest.update(f'+{phone}\n'.encode())
+        for voter_id, phone in sorted(self.to_remove):
+            digest.update(f'-{voter_id}\n'.encode())
+        for voter_id, phone in sorted(self.protected):
+            digest.update(f'!{voter_id}\n'.encode())
+        return digest.hexdigest()[:16]
+
+    def summary(self):
+        return {
+            'add': len(self.to_add),
+            'remove': len(self.to_remove),
+            'protected': len(self.protected),
+            'unchanged': self.unchanged,
+            'duplicates': self.duplicates,
+            'invalid': len(self.invalid),
+        }
+
+    def samples(self):
+        """A few entries of each kind for the preview"""
+        return {
+            'add': sorted(self.to_add)[:SAMPLE_SIZE],
+            'remove': sorted(phone for _, phone in self.to_remove)[:SAMPLE_SIZE],
+            'protected': sorted(phone for _, phone in self.protected)[:SAMPLE_SIZE],
+            'invalid': self.invalid[:SAMPLE_SIZE],
+        }
+
+
+def diff_roll(election, lines, chunk_size=20000):
+    """Compare a full roll file with the election's current roll"""
+    diff = RollDiff(election)
+    canonical = CANONICAL.fullmatch
+    wanted = set()
+    for number, raw, phone in read_roll(lines):
+        if not canonical(phone):
+            diff.invalid.append(f'line {number}: {raw}')
+            continue
+        if phone in wanted:
+            diff.duplicates += 1
+        wanted.add(phone)
+
+    # One query per has_voted value keeps the flag out of the rows, so they
+    # come back as plain tuples without per-row field conversion
+    for has_voted, missing in ((False, diff.to_remove), (True, diff.protected)):
+        current = (
+            Voter.objects.filter(election=election, has_voted=has_voted).order_by()
+            .values_list('id', 'phone_number').iterator(chunk_size=chunk_size)
+        )
+        for voter_id, phone in current:
+            if phone in wanted:
+                wanted.discard(phone)
+                diff.unchanged += 1
+            else:
+                missing.append((voter_id, phone))
+    diff.to_add = list(wanted)
+    return diff
+
+
+def apply_diff(diff, remove_voted=False, batch_size=BATCH_SIZE):
+    """Apply a previewed diff in batches; return ``(added, removed)``.
+
+    Voters who have voted are only removed (with their votes) when
+    ``remove_voted`` is set.
+    """
+    election = diff.election
+    added = 0
+    for start in range(0, len(diff.to_add), batch_size):
+        batch = diff.to_add[start:start + batch_size]
+        on_roll = Voter.objects.filter(election=election, phone_number__in=batch)
+        # A number added by hand since the preview is simply skipped
+        existing = set(on_roll.values_list('id', flat=True))
+        Voter.objects.bulk_create(
+            [Voter(election=election, phone_number=phone) for phone in batch], ignore_conflicts=True,
+        )
+        # ignore_conflicts leaves the new voters without ids and does not say
+        # which rows it skipped, so look the batch up again
+        inserted = [(voter_id, phone) for voter_id, phone in on_roll.values_list('id', 'phone_number') if voter_id not in existing]
+        events.voters_added(election.id, inserted)
+        added += len(inserted)
+
+    removals = [voter_id for voter_id, _ in diff.to_remove]
+    if remove_voted:
+        removals.extend(voter_id for voter_id, _ in diff.protected)
+    removed = 0
+    for start in range(0, len(removals), batch_size):
+        batch = removals[start:start + batch_size]
+        if not remove_voted:
+            # Someone may have voted since the preview
+            batch = list(Voter.objects.filter(id__in=batch, has_voted=False).values_list('id', flat=True))
+        removed += len(Voter.remove(election, batch))
+    if remove_voted and diff.protected:
+        tally_store.invalidate()
+    return added, removed
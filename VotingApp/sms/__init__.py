@@ -0,0 +1,76 @@
+"""
+Outbound SMS for voter login codes.
+
+Backends follow ``django.core.mail``: ``VOTING_SMS_BACKEND`` names a class
+with a ``send_messages`` method (see ``backends.base``). ``console`` prints
+messages, ``filebased`` appends them to ``VOTING_SMS_FILE_PATH``, ``locmem``
+collects them in ``outbox`` for tests and ``http`` posts batches to a JSON
+gateway.
+
+``enqueue`` is what views call: it hands the message to this process's
+outbound queue and returns at once. ``send`` delivers synchronously.
+"""
+import atexit
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .outbound import OutboundQueue
+
+DEFAULT_BACKEND = 'VotingApp.sms.backends.console.SmsBackend'
+
+# Messages delivered by the locmem backend
+outbox = []
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+class SmsMessage:
+    __slots__ = ('to', 'body', 'attempts')
+
+    def __init__(self, to, body):
+        self.to = to
+        self.body = body
+        self.attempts = 0
+
+    def __repr__(self):
+        return f'<SmsMessage to={self.to!r}>'
+
+
+def get_backend(backend=None, **kwargs):
+    """Instantiate ``backend`` (a dotted path), by default ``VOTING_SMS_BACKEND``"""
+    path = backend or getattr(settings, 'VOTING_SMS_BACKEND', DEFAULT_BACKEND)
+    return import_string(path)(**kwargs)
+
+
+def get_queue():
+    """This process's outbound queue, created on first use"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = OutboundQueue(
+                    get_backend,
+                    batch_size=getattr(settings, 'VOTING_SMS_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'VOTING_SMS_FLUSH_INTERVAL', 0.05),
+                    max_attempts=getattr(settings, 'VOTING_SMS_MAX_ATTEMPTS', 5),
+                    retry_delay=getattr(settings, 'VOTING_SMS_RETRY_DELAY', 1.0),
+                )
+                # Give messages queued just before shutdown a moment to go out
+                atexit.register(_queue.flush, 5)
+    return _queue
+
+
+def enqueue(to, body):
+    """Queue a message for background delivery"""
+    message = SmsMessage(to, body)
+    get_queue().put(message)
+    return message
+
+
+def send(to, body):
+    """Deliver a message now; return True if the backend accepted it"""
+    message = SmsMessage(to, body)
+    return not get_backend().send_messages([message])
@@ -0,0 +1,16 @@
+"""Base class for SMS backends"""
+
+
+class BaseSmsBackend:
+    """Deliver batches of ``SmsMessage`` objects.
+
+    Subclasses implement ``send_messages``. It returns the messages that
+    could not be delivered (an empty list when all went through); raising
+    means none of the batch was delivered. The outbound queue retries both.
+    """
+
+    def __init__(self, **kwargs):
+        pass
+
+    def send_messages(self, messages):
+        raise NotImplementedError('subclasses of BaseSmsBackend must override send_messages()')
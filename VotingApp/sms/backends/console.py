@@ -0,0 +1,22 @@
+"""SMS backend that writes messages to stdout instead of sending them"""
+import sys
+import threading
+
+from .base import BaseSmsBackend
+
+
+class SmsBackend(BaseSmsBackend):
+    def __init__(self, stream=None, **kwargs):
+        super().__init__(**kwargs)
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def write_message(self, message):
+        self.stream.write(f'SMS to {message.to}: {message.body}\n')
+
+    def send_messages(self, messages):
+        with self._lock:
+            for message in messages:
+                self.write_message(message)
+            self.stream.flush()
+        return []
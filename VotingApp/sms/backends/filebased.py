@@ -0,0 +1,22 @@
+"""SMS backend that appends messages to a file"""
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+from .console import SmsBackend as ConsoleSmsBackend
+
+
+class SmsBackend(ConsoleSmsBackend):
+    def __init__(self, file_path=None, **kwargs):
+        super().__init__(**kwargs)
+        default = Path(settings.BASE_DIR) / 'var' / 'sms.log'
+        self.file_path = Path(file_path or getattr(settings, 'VOTING_SMS_FILE_PATH', default))
+
+    def send_messages(self, messages):
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.file_path, 'a', encoding='utf-8') as out:
+            stamp = datetime.now().isoformat(timespec='seconds')
+            for message in messages:
+                out.write(f'{stamp}\t{message.to}\t{message.body}\n')
+        return []
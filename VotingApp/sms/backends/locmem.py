@@ -0,0 +1,9 @@
+"""SMS backend that keeps messages in ``VotingApp.sms.outbox``, for tests"""
+from .base import BaseSmsBackend
+
+
+class SmsBackend(BaseSmsBackend):
+    def send_messages(self, messages):
+        from VotingApp import sms
+        sms.outbox.extend(messages)
+        return []
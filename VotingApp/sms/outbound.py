@@ -0,0 +1,114 @@
+"""
+In-process outbound SMS queue.
+
+``put`` only appends to a queue, so the request that wants a message sent
+never waits on the gateway. A background thread collects messages for up to
+``flush_interval`` seconds (or until ``batch_size`` are waiting) and hands
+each batch to the backend in one call. Messages the backend could not
+deliver are retried with exponential backoff, up to ``max_attempts`` sends.
+"""
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundQueue:
+    def __init__(self, get_backend, batch_size=100, flush_interval=0.05, max_attempts=5, retry_delay=1.0):
+        self.get_backend = get_backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stats = Counter()
+        self._incoming = queue.SimpleQueue()
+        self._retries = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, message):
+        with self._idle:
+            self._pending += 1
+        self._ensure_worker()
+        self._incoming.put(message)
+
+    def flush(self, timeout=None):
+        """Wait until every queued message was delivered or given up on.
+
+        Returns False if ``timeout`` seconds passed first.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a forked worker process starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='sms-outbound', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """Block until a batch is due; return the messages to send"""
+        batch = []
+        while not batch:
+            timeout = None
+            if self._retries:
+                timeout = max(0.0, self._retries[0][0] - time.monotonic())
+            try:
+                batch.append(self._incoming.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            # Give messages arriving right behind the first one a chance to
+            # share its gateway call
+            deadline = time.monotonic() + self.flush_interval
+            while batch and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._incoming.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._retries)[2])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                failed = self.get_backend().send_messages(batch)
+            except Exception:
+                logger.exception('SMS backend failed to send a batch of %d messages', len(batch))
+                failed = batch
+            self.stats['batches'] += 1
+            self.stats['sent'] += len(batch) - len(failed)
+            finished = len(batch) - len(failed)
+            for message in failed:
+                message.attempts += 1
+                if message.attempts >= self.max_attempts:
+                    logger.error('Giving up on SMS to %s after %d attempts', message.to, message.attempts)
+                    self.stats['dropped'] += 1
+                    finished += 1
+                else:
+                    self.stats['retried'] += 1
+                    due = time.monotonic() + self.retry_delay * 2 ** (message.attempts - 1)
+                    heapq.heappush(self._retries, (due, next(self._sequence), message))
+            with self._idle:
+                self._pending -= finished
+                if self._pending == 0:
+                    self._idle.notify_all()
@@ -0,0 +1,337 @@
+"""
+Memory-mapped tally and turnout store shared by every worker process on a host.
+
+Each gunicorn/uvicorn worker maps the same file, so a vote recorded by one
+process is visible to all the others without re-aggregating the Vote table.
+
+File layout (little-endian)::
+
+    header  magic[8] seq generation ready capacity used boot (padded to 64 bytes)
+    slots   capacity x (key, value)
+
+A positive key is a candidate id and its value that candidate's vote count.
+A negative key is ``-election_id`` and its value the election's turnout, so
+every election's figures live side by side in the one shared file.
+
+Writers serialise on an ``flock`` of the file and bump ``seq`` to an odd value
+while they modify it (a seqlock). Readers never lock: they copy the used slots
+and retry if ``seq`` was odd or changed underneath them.
+
+The store is rebuilt from the Vote table the first time a process finds it
+uninitialised (or after :func:`invalidate`), and can be rebuilt explicitly
+with the ``rebuild_tally_store`` management command. The file outlives the
+server, while the database may be restored or edited while it is down, so
+``boot`` records which start of the server last built it: the first process
+of a new start (see :func:`boot_id`) marks it stale and the first read
+rebuilds it.
+
+A vote is counted by :func:`record_vote` once its transaction commits, so a
+rebuild could read a committed vote from the table before its increment
+lands. Rebuilds bump ``generation`` while holding the same database lock
+ballots take to log their votes (:meth:`TallyStore.rebuild`), and a ballot
+notes the generation while it holds that lock: an increment from an older
+generation was already read by the rebuild and drops itself.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection, transaction
+
+MAGIC = b'VTALLY03'
+HEADER = struct.Struct('<8sQQQQQQ')
+HEADER_SIZE = 64
+SLOT = struct.Struct('<qq')
+SEQ_OFFSET = 8
+SEQ = struct.Struct('<Q')
+
+
+class TallySnapshot(NamedTuple):
+    counts: dict
+    turnout: dict
+
+    def votes_for(self, candidate_id):
+        return self.counts.get(candidate_id, 0)
+
+    def turnout_for(self, election_id):
+        return self.turnout.get(election_id, 0)
+
+
+class TallyStoreFull(Exception):
+    """Raised when there are more candidates than slots in the store"""
+
+
+class TallyStore:
+    """A fixed-size, file-backed table of vote and turnout counts"""
+
+    def __init__(self, path, capacity=1024):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.size = HEADER_SIZE + SLOT.size * capacity
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        # flock is per open file description, so threads in one process
+        # also need a lock of their own
+        self._thread_lock = threading.Lock()
+        with self._locked():
+            if os.fstat(self._fd).st_size < self.size:
+                os.ftruncate(self._fd, self.size)
+            self._mm = mmap.mmap(self._fd, self.size)
+            magic, _, _, _, capacity, _, _ = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or capacity != self.capacity:
+                self._mm[:self.size] = bytes(self.size)
+                HEADER.pack_into(self._mm, 0, MAGIC, 0, 0, 0, self.capacity, 0, 0)
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _publishing(self):
+        """Mark the store as mid-update for readers; the write lock must be held"""
+        seq = SEQ.unpack_from(self._mm, SEQ_OFFSET)[0]
+        SEQ.pack_into(self._mm, SEQ_OFFSET, seq + 1)
+        try:
+            yield
+        finally:
+            SEQ.pack_into(self._mm, SEQ_OFFSET, seq + 2)
+
+    @contextmanager
+    def _writing(self):
+        with self._locked(), self._publishing():
+            yield
+
+    def _header(self):
+        _, seq, generation, ready, capacity, used, _ = HEADER.unpack_from(self._mm, 0)
+        return seq, generation, ready, used
+
+    def _write_header(self, generation, ready, used, boot=None):
+        _, seq, _, _, _, _, current_boot = HEADER.unpack_from(self._mm, 0)
+        boot = current_boot if boot is None else boot
+        HEADER.pack_into(self._mm, 0, MAGIC, seq, generation, ready, self.capacity, used, boot)
+
+    def ready(self):
+        return bool(self._header()[2])
+
+    def generation(self):
+        """The current rebuild generation, to pass to :meth:`increment`"""
+        return self._header()[1]
+
+    def claim_boot(self, boot):
+        """Mark the store stale unless it was built during server start ``boot``"""
+        with self._writing():
+            if HEADER.unpack_from(self._mm, 0)[6] == boot:
+                return False
+            _, generation, _, used = self._header()
+            self._write_header(generation, 0, used, boot=boot)
+            return True
+
+    def snapshot(self):
+        """Return the current counts without taking any lock"""
+        while True:
+            seq, _, ready, used = self._header()
+            if seq % 2:
+                time.sleep(0)
+                continue
+            slots = bytes(self._mm[HEADER_SIZE:HEADER_SIZE + SLOT.size * used])
+            if SEQ.unpack_from(self._mm, SEQ_OFFSET)[0] == seq:
+                break
+        if not ready:
+            return None
+        counts = {}
+        turnout = {}
+        for key, value in SLOT.iter_unpack(slots):
+            if key > 0:
+                counts[key] = value
+            else:
+                turnout[-key] = value
+        return TallySnapshot(counts, turnout)
+
+    def _add(self, key, delta, used):
+        """Add ``delta`` to the slot for ``key``, appending it if needed.
+
+        Returns the new number of used slots, or None when the store is full.
+        """
+        for index in range(used):
+            offset = HEADER_SIZE + SLOT.size * index
+            slot_key, value = SLOT.unpack_from(self._mm, offset)
+            if slot_key == key:
+                SLOT.pack_into(self._mm, offset, key, value + delta)
+                return used
+        if used >= self.capacity:
+            return None
+        SLOT.pack_into(self._mm, HEADER_SIZE + SLOT.size * used, key, delta)
+        return used + 1
+
+    def increment(self, candidate_id, election_id, delta=1, new_voter=False, generation=None):
+        """Add a vote for ``candidate_id``; a no-op until the store is built.
+
+        ``generation`` is the store's generation when the vote was logged
+        (see :meth:`rebuild`); the increment is dropped if a rebuild has
+        started since, as that rebuild counted the vote.
+        """
+        with self._writing():
+            _, current, ready, used = self._header()
+            if not ready or (generation is not None and generation != current):
+                # The rebuild reads this vote from the database
+                return
+            generation = current
+            used = self._add(candidate_id, delta, used)
+            if used is not None and new_voter:
+                used = self._add(-election_id, delta, used)
+            if used is None:
+                # Drop back to the database until an operator raises the capacity
+                self._write_header(generation, 0, self._header()[3])
+                return
+            self._write_header(generation, ready, used)
+
+    def rebuild(self, force=True):
+        """Reload every count from the Vote table.
+
+        With ``force=False`` the rebuild is skipped if another process
+        finished one while this one was waiting for the lock.
+
+        The generation is bumped while holding the lock ballots take on their
+        election's :class:`~VotingApp.models.AuditHead`, so every ballot
+        either committed before the counts are read and noted an older
+        generation, or logs its votes after the read and notes the new one.
+        """
+        from django.db.models import Count
+        from .models import AuditHead, Vote, TurnoutCounter
+
+        # Hold off increments while reading the database, but only make readers
+        # wait for the (short) copy into the map
+        with self._locked(), transaction.atomic():
+            if not force and self.ready():
+                return
+            list(AuditHead.objects.select_for_update().values_list('pk', flat=True))
+            if connection.vendor == 'sqlite':
+                # No row locks; an update, even of no rows, takes the database's write lock
+                AuditHead.objects.filter(size__lt=0).update(size=0)
+            with self._publishing():
+                _, generation, ready, used = self._header()
+                generation += 1
+                self._write_header(generation, ready, used)
+            slots = list(
+                Vote.objects.order_by().values_list('candidate_id').annotate(votes=Count('id'))
+            )
+            slots += [
+                (-election_id, voters)
+                for election_id, voters in TurnoutCounter.objects.values_list('election_id', 'voters_voted')
+            ]
+            if len(slots) > self.capacity:
+                # Increments of the old generation now drop themselves, so stop serving its counts
+                with self._publishing():
+                    self._write_header(generation, 0, used)
+                raise TallyStoreFull(f'{len(slots)} tallies do not fit in {self.capacity} slots')
+            with self._publishing():
+                self._fill(generation, slots)
+
+    def _fill(self, generation, slots):
+        for index, (key, value) in enumerate(slots):
+            SLOT.pack_into(self._mm, HEADER_SIZE + SLOT.size * index, key, value)
+        self._write_header(generation, 1, len(slots))
+
+    def invalidate(self):
+        """Force the next reader to rebuild from the database"""
+        with self._writing():
+            _, generation, _, used = self._header()
+            self._write_header(generation, 0, used)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+_boot_id = None
+
+
+def boot_id():
+    """A number naming this start of the server.
+
+    Worker processes share it with the master that forked them: it is derived
+    from the process group leader and the time it started (and, on Linux, the
+    machine's boot), so every restart of the server gets a new one.
+    """
+    global _boot_id
+    if _boot_id is None:
+        leader = os.getpgrp()
+        parts = [str(leader)]
+        for path in (f'/proc/{leader}/stat', '/proc/sys/kernel/random/boot_id'):
+            try:
+                parts.append(Path(path).read_text().strip())
+            except OSError:
+                pass
+        if len(parts) > 1 and parts[1].startswith(f'{leader} '):
+            # Keep only the leader's start time; the rest of its stat line keeps changing
+            parts[1] = parts[1].rsplit(')', 1)[1].split()[19]
+        digest = hashlib.blake2b(':'.join(parts).encode(), digest_size=8).digest()
+        _boot_id = int.from_bytes(digest, 'little')
+    return _boot_id
+
+
+def get_store():
+    """Return this process's handle on the shared store, or None if disabled"""
+    path = getattr(settings, 'VOTING_TALLY_STORE_PATH', None)
+    if not path or fcntl is None:
+        return None
+    capacity = getattr(settings, 'VOTING_TALLY_STORE_SLOTS', 1024)
+    key = (str(path), capacity)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = TallyStore(path, capacity)
+                # Counts persisted by an earlier start may predate a restore or offline edits
+                store.claim_boot(boot_id())
+                _stores[key] = store
+    return store
+
+
+def get_snapshot():
+    """Current tallies, rebuilding the store first if needed; None if disabled"""
+    store = get_store()
+    if store is None:
+        return None
+    snapshot = store.snapshot()
+    if snapshot is None:
+        try:
+            store.rebuild(force=False)
+        except TallyStoreFull:
+            return None
+        snapshot = store.snapshot()
+    return snapshot
+
+
+def generation():
+    """The store's generation, for a ballot to note while it holds its election's audit lock"""
+    store = get_store()
+    return store.generation() if store is not None else None
+
+
+def record_vote(candidate_id, election_id, new_voter=False, generation=None):
+    store = get_store()
+    if store is not None:
+        store.increment(candidate_id, election_id, new_voter=new_voter, generation=generation)
+
+
+def invalidate():
+    store = get_store()
+    if store is not None:
+        store.invalidate()
@@ -1,3 +1,2130 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pytz
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, router, transaction
+from django.db.models import Count, F, Max, Sum
+from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import (
+    admission, anomaly, async_views, checks, events, idempotency, jobs, kiosk, merkle, publisher, ranked, replica,
+    roll_sync, sms, tally_store, views,
+)
+from .admin import phone_prefix_filter
+from .exports import columnar, incremental
+from .models import (
+    AdminUser, AuditEntry, AuditHead, Candidate, Election, Job, KioskBatch, RankedBallot, RankedPosition, TurnoutCounter,
+    Vote, VoteRollup, Voter,
+)
+from .views import _record_vote
+
+
+def seed_election(election, voters=40, voted=30, first_phone=0):
+    """Register ``voters`` voters and cast a full ballot for the first ``voted``"""
+    if not election.candidates.exists():
+        for position in ('Chair', 'Lady', 'Secretary'):
+            for name in ('Ada', 'Ben', 'Cy'):
+                Candidate.objects.create(election=election, name=f'{name} {position}', position=position)
+    candidates = list(election.candidates.order_by('position', 'name'))
+    roll = Voter.objects.bulk_create([
+        Voter(election=election, phone_number=f'+2327{first_phone + i:07d}') for i in range(voters)
+    ])
+    # Cast every vote at one instant an hour back, so the seed never spans
+    # a rollup bucket boundary or shares a bucket with votes cast by a test
+    now = timezone.now().replace(second=30, microsecond=0) - timedelta(hours=1)
+    with mock.patch('django.utils.timezone.now', return_value=now):
+        for i, voter in enumerate(roll[:voted]):
+            for position_index in range(3):
+                _record_vote(election, voter, candidates[position_index * 3 + i % 3], now)
+    return roll
+
+
+@override_settings(
+    VOTING_TALLY_STORE_PATH=None, VOTING_REPLICA_PATH=None, VOTING_OTP_ENABLED=True,
+    VOTING_SMS_BACKEND='VotingApp.sms.backends.locmem.SmsBackend',
+)
+class QueryBudgetTests(TestCase):
+    """Every URL must stay within a fixed number of queries on a seeded election"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Budget Election')
+        cls.voters = seed_election(cls.election)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass')
+        AdminUser.objects.create(user=cls.user)
+        cls.vote = Vote.objects.filter(election=cls.election).order_by('id').first()
+        cls.candidate = cls.election.candidates.order_by('id').first()
+        # A registered voter who has not voted yet
+        cls.ballot_voter = cls.voters[-1]
+
+    def setUp(self):
+        # Commit hooks run in these tests, so send what they write somewhere temporary
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            VOTING_EVENTS_DIR=os.path.join(directory.name, 'events'),
+            VOTING_PUBLISH_DIR=os.path.join(directory.name, 'public'),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(events._logs.clear)
+
+    def admin_client(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session.update({'is_admin': True, 'admin_user_id': self.user.id, 'election_id': self.election.id})
+        session.save()
+        return self.client
+
+    def voter_client(self):
+        session = self.client.session
+        session.update({'voter_phone': self.ballot_voter.phone_number, 'election_id': self.election.id})
+        session.save()
+        return self.client
+
+    def count_queries(self, method, url, data=None, **extra):
+        # The commit hooks (tallies, events, anomaly detection) are counted with the request
+        with CaptureQueriesContext(connection) as captured, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data or {}, **extra)
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 500, url)
+        return len(captured), captured
+
+    def assertQueryBudget(self, budget, method, url, data=None, **extra):
+        count, captured = self.count_queries(method, url, data, **extra)
+        queries = '\n'.join(q['sql'] for q in captured.captured_queries)
+        self.assertLessEqual(count, budget, f'{method.upper()} {url} ran {count} queries:\n{queries}')
+
+    def test_public_pages(self):
+        self.assertQueryBudget(4, 'get', reverse('landing'))
+        self.assertQueryBudget(1, 'get', reverse('login'))
+        self.assertQueryBudget(5, 'get', reverse('public_results'))
+        self.assertQueryBudget(4, 'get', reverse('results_api'))
+        self.assertQueryBudget(2, 'get', reverse('audit_root', args=[self.election.id]))
+        self.assertQueryBudget(2, 'get', reverse('audit_consistency', args=[self.election.id]), {'first': 50})
+        self.assertQueryBudget(0, 'get', reverse('admin_login'))
+        self.assertQueryBudget(0, 'get', reverse('queue_status'), {'ticket': 'expired'})
+        self.assertQueryBudget(0, 'post', reverse('kiosk_sync'), '{}', content_type='application/json')
+
+    def test_voter_flow(self):
+        cache.clear()
+        self.assertQueryBudget(
+            6, 'post', reverse('login') + f'?election={self.election.id}',
+            {'phone_number': self.ballot_voter.phone_number},
+        )
+        self.assertTrue(sms.get_queue().flush(5))
+        code = sms.outbox[-1].body.split()[0]
+        self.assertQueryBudget(2, 'get', reverse('login_verify'))
+        self.assertQueryBudget(2, 'post', reverse('login_verify'), {'code': 'x'})
+        self.assertQueryBudget(12, 'post', reverse('login_verify'), {'code': code})
+        self.voter_client()
+        self.assertQueryBudget(5, 'get', reverse('vote'))
+        self.assertQueryBudget(26, 'post', reverse('vote'), {'candidate_id': self.candidate.id})
+        RankedPosition.objects.create(election=self.election, position='Lady')
+        ranking = list(self.election.candidates.filter(position='Lady').values_list('id', flat=True))
+        self.assertQueryBudget(28, 'post', reverse('vote'), {'position': 'Lady', 'rank': ranking})
+        self.assertTrue(RankedBallot.objects.filter(vote__voter=self.ballot_voter, position='Lady').exists())
+
+        # All three positions, one of them ranked, in a single request
+        self.ballot_voter = self.voters[-2]
+        self.voter_client()
+        ballot = {
+            f'candidate:{candidate.position}': candidate.id
+            for candidate in self.election.candidates.exclude(position='Lady').order_by('-name')
+        }
+        ballot['rank:Lady'] = ranking
+        ballot[idempotency.FIELD] = idempotency.new_key()
+        self.assertQueryBudget(21, 'post', reverse('submit_ballot'), ballot)
+        self.assertEqual(Vote.objects.filter(voter=self.ballot_voter).count(), 3)
+        # A retry of the same submission is answered from memory
+        self.assertQueryBudget(0, 'post', reverse('submit_ballot'), ballot)
+
+    def test_admin_pages(self):
+        self.admin_client()
+        self.assertQueryBudget(15, 'get', reverse('results'))
+        self.assertQueryBudget(6, 'get', reverse('add_voters'))
+        self.assertQueryBudget(4, 'get', reverse('add_candidates'))
+        self.assertQueryBudget(2, 'get', reverse('edit_candidate', args=[self.candidate.id]))
+        self.assertQueryBudget(2, 'get', reverse('admin_change_password'))
+        self.assertQueryBudget(5, 'get', reverse('election_settings'))
+        self.assertQueryBudget(2, 'get', reverse('sync_roll'))
+        self.assertQueryBudget(7, 'get', reverse('download_results'))
+        self.assertQueryBudget(6, 'get', reverse('download_results_pdf'))
+        self.assertQueryBudget(7, 'get', reverse('export_votes'))
+        self.assertQueryBudget(4, 'get', reverse('audit_proof', args=[self.vote.id]))
+        self.assertQueryBudget(1, 'get', reverse('admission_stats'))
+        self.assertQueryBudget(1, 'get', reverse('anomalies'))
+        self.assertQueryBudget(2, 'get', reverse('job_status', args=[0]))
+        self.assertQueryBudget(2, 'get', reverse('job_download', args=[0]))
+        self.assertQueryBudget(1, 'get', reverse('events_feed'), {'after': 0})
+        self.assertQueryBudget(3, 'get', reverse('admin:index'))
+
+    def test_admin_changelists(self):
+        self.admin_client()
+        self.assertQueryBudget(7, 'get', reverse('admin:VotingApp_vote_changelist'))
+        self.assertQueryBudget(6, 'get', reverse('admin:VotingApp_vote_changelist'), {'q': '+2328'})
+        self.assertQueryBudget(6, 'get', reverse('admin:VotingApp_vote_changelist'), {'q': 'Ada'})
+        self.assertQueryBudget(5, 'get', reverse('admin:VotingApp_voter_changelist'), {'q': '2328'})
+        self.assertQueryBudget(9, 'get', reverse('admin:VotingApp_vote_change', args=[self.vote.id]))
+        self.assertQueryBudget(
+            3, 'get', reverse('admin:autocomplete'),
+            {'app_label': 'VotingApp', 'model_name': 'vote', 'field_name': 'voter', 'term': '+2328'},
+        )
+
+    def test_large_table_changelist_count_is_estimated(self):
+        self.admin_client()
+        with override_settings(VOTING_ADMIN_EXACT_COUNT_LIMIT=5):
+            count, captured = self.count_queries('get', reverse('admin:VotingApp_vote_changelist'))
+        self.assertFalse(
+            [q['sql'] for q in captured.captured_queries if 'COUNT(' in q['sql'] and 'VotingApp_vote' in q['sql']],
+        )
+
+    def test_admin_writes(self):
+        self.admin_client()
+        phones = '\n'.join(f'+2328{i:07d}' for i in range(5))
+        self.assertQueryBudget(26, 'post', reverse('add_voters'), {'phone_numbers': phones})
+        self.assertQueryBudget(
+            5, 'post', reverse('add_candidates'), {'name': 'Dee', 'position': 'Chair', 'nickname': ''},
+        )
+        self.assertQueryBudget(
+            11, 'post', reverse('edit_candidate', args=[self.candidate.id]),
+            {'name': self.candidate.name, 'position': 'Treasurer', 'nickname': ''},
+        )
+        self.assertQueryBudget(19, 'post', reverse('delete_voter', args=[self.voters[0].id]))
+        ids = [voter.id for voter in self.voters[1:21]]
+        self.assertQueryBudget(
+            6, 'post', reverse('bulk_voters'), json.dumps({'action': 'verify', 'ids': ids}),
+            content_type='application/json',
+        )
+        self.assertQueryBudget(
+            23, 'post', reverse('bulk_voters'), json.dumps({'action': 'reset', 'ids': ids}),
+            content_type='application/json',
+        )
+        self.assertQueryBudget(
+            12, 'post', reverse('bulk_voters'), json.dumps({'action': 'delete', 'filter': {'has_voted': False}}),
+            content_type='application/json',
+        )
+        self.assertQueryBudget(3, 'post', reverse('start_job'), {'kind': 'results_csv'})
+        self.assertQueryBudget(4, 'get', reverse('admin_logout'))
+
+    def test_read_queries_do_not_grow_with_the_election(self):
+        self.admin_client()
+        urls = [
+            reverse('landing'), reverse('public_results'), reverse('results_api'), reverse('results'),
+            reverse('add_voters'), reverse('download_results'), reverse('export_votes'),
+            reverse('admin:VotingApp_vote_changelist'), reverse('admin:VotingApp_voter_changelist'),
+        ]
+        before = {url: self.count_queries('get', url)[0] for url in urls}
+        seed_election(self.election, voters=25, voted=20, first_phone=1000)
+        after = {url: self.count_queries('get', url)[0] for url in urls}
+        self.assertEqual(before, after)
+
+
+@override_settings(
+    VOTING_TALLY_STORE_PATH=None, VOTING_REPLICA_PATH=None, VOTING_EVENTS_DIR=None,
+    VOTING_KIOSK_STATIONS={'north': 'north-key', 'south': 'south-key'},
+)
+class KioskSyncTests(TransactionTestCase):
+    """Two polling stations syncing overlapping rolls at once keep one vote per voter and position"""
+
+    VOTERS = 1500
+    BATCH = 500
+
+    def setUp(self):
+        self.election = Election.objects.create(election_title='Kiosk Election')
+        for position in ('Chair', 'Lady', 'Secretary'):
+            for name in ('Ada', 'Ben', 'Cy'):
+                Candidate.objects.create(election=self.election, name=f'{name} {position}', position=position)
+        self.by_position = {}
+        for candidate in self.election.candidates.order_by('id'):
+            self.by_position.setdefault(candidate.position, []).append(candidate.id)
+        self.roll = Voter.objects.bulk_create([
+            Voter(election=self.election, phone_number=f'+2327{i:07d}') for i in range(self.VOTERS)
+        ])
+        self.cast_from = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+
+    def station_batches(self, voters, choice):
+        """Full ballots for ``voters``, as a kiosk would send them in batches"""
+        votes = [
+            {
+                'phone': voter.phone_number,
+                'candidate': self.by_position[position][choice],
+                'position': position,
+                'voted_at': (self.cast_from + timedelta(seconds=index)).isoformat(),
+            }
+            for index, voter in enumerate(voters) for position in sorted(self.by_position)
+        ]
+        return [
+            {'batch': f'{start + 1}-{start + len(votes[start:start + self.BATCH])}', 'election': self.election.id,
+             'votes': votes[start:start + self.BATCH]}
+            for start in range(0, len(votes), self.BATCH)
+        ]
+
+    def post(self, client, station, payload):
+        body = json.dumps(payload).encode()
+        response = client.post(
+            reverse('kiosk_sync'), body, content_type='application/json',
+            headers={kiosk.STATION_HEADER: station, kiosk.SIGNATURE_HEADER: kiosk.sign(body, f'{station}-key')},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_concurrent_stations(self):
+        # The stations share a third of their voters, who turn up at both
+        stations = {
+            'north': self.station_batches(self.roll[:1000], choice=0),
+            'south': self.station_batches(self.roll[500:], choice=1),
+        }
+        answers = {station: [] for station in stations}
+        errors = []
+
+        def sync(station):
+            client = Client()
+            try:
+                for payload in stations[station]:
+                    answers[station].append(self.post(client, station, payload))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sync, args=[station]) for station in stations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        sent = sum(len(payload['votes']) for batches in stations.values() for payload in batches)
+        outcomes = [answer for station_answers in answers.values() for answer in station_answers]
+        self.assertEqual([answer['rejected'] for answer in outcomes], [[]] * len(outcomes))
+        accepted = sum(answer['accepted'] for answer in outcomes)
+        self.assertEqual(accepted, self.VOTERS * 3)
+        self.assertEqual(sum(answer['duplicates'] for answer in outcomes), sent - accepted)
+
+        votes = Vote.objects.filter(election=self.election)
+        self.assertEqual(votes.count(), self.VOTERS * 3)
+        self.assertEqual(
+            votes.values('voter', 'position').annotate(n=Count('id')).aggregate(most=Max('n'))['most'], 1,
+        )
+        self.assertEqual(Voter.objects.filter(election=self.election, has_voted=True).count(), self.VOTERS)
+        self.assertEqual(TurnoutCounter.get_count(self.election), self.VOTERS)
+        self.assertEqual(AuditHead.objects.get(election=self.election).size, self.VOTERS * 3)
+        self.assertEqual(
+            VoteRollup.objects.filter(election=self.election, granularity=VoteRollup.MINUTE)
+            .aggregate(votes=Sum('votes'), new_voters=Sum('new_voters')),
+            {'votes': self.VOTERS * 3, 'new_voters': self.VOTERS},
+        )
+        # Votes keep the time they were cast at the station
+        self.assertEqual(votes.order_by('voted_at').first().voted_at, self.cast_from)
+
+        # A batch sent again after a lost reply is answered, not applied twice
+        replay = self.post(Client(), 'north', stations['north'][0])
+        self.assertTrue(replay['replayed'])
+        self.assertEqual(replay['accepted'], answers['north'][0]['accepted'])
+        self.assertEqual(votes.count(), self.VOTERS * 3)
+        self.assertEqual(KioskBatch.objects.filter(election=self.election).count(), len(outcomes))
+
+    def test_unsigned_batch_is_refused(self):
+        payload = self.station_batches(self.roll[:10], choice=0)[0]
+        body = json.dumps(payload).encode()
+        response = self.client.post(
+            reverse('kiosk_sync'), body, content_type='application/json',
+            headers={kiosk.STATION_HEADER: 'north', kiosk.SIGNATURE_HEADER: kiosk.sign(body, 'south-key')},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Vote.objects.exists())
+
+
+class TallyStoreTests(TestCase):
+    """The shared tally file agrees with the Vote table across rebuilds and restarts"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            VOTING_TALLY_STORE_PATH=os.path.join(directory.name, 'tally.mmap'), VOTING_EVENTS_DIR=None,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(tally_store._stores.clear)
+        self.election = Election.objects.create(election_title='Tally Election')
+        self.roll = seed_election(self.election, voters=10, voted=6)
+        self.candidate = self.election.candidates.order_by('id').first()
+
+    def counts(self):
+        return {
+            candidate_id: votes
+            for candidate_id, votes in Vote.objects.values_list('candidate_id').annotate(votes=Count('id'))
+        }
+
+    def restart(self, boot):
+        tally_store._stores.clear()
+        with mock.patch.object(tally_store, '_boot_id', boot):
+            return tally_store.get_snapshot()
+
+    def test_a_new_start_rebuilds_the_persisted_file(self):
+        boot = tally_store.boot_id()
+        self.assertEqual(tally_store.get_snapshot().counts, self.counts())
+        # Votes removed while the server is down, e.g. by restoring a backup
+        Vote.objects.filter(candidate=self.candidate).delete()
+        self.assertIn(self.candidate.id, self.restart(boot).counts)
+        snapshot = self.restart(boot + 1)
+        self.assertEqual(snapshot.counts, self.counts())
+        self.assertNotIn(self.candidate.id, snapshot.counts)
+
+    def test_increment_counted_by_a_rebuild_is_dropped(self):
+        tally_store.get_snapshot()
+        now = timezone.now()
+        with self.captureOnCommitCallbacks() as callbacks:
+            _record_vote(self.election, self.roll[7], self.candidate, now)
+        # The rebuild reads the committed vote before its increment lands
+        tally_store.get_store().rebuild()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(tally_store.get_snapshot().counts, self.counts())
+
+        # A ballot logged after the rebuild is counted once
+        with self.captureOnCommitCallbacks(execute=True):
+            _record_vote(self.election, self.roll[8], self.candidate, now)
+        self.assertEqual(tally_store.get_snapshot().counts, self.counts())
+        self.assertEqual(tally_store.get_snapshot().turnout_for(self.election.id), 8)
+
+
+class RankedCountTests(SimpleTestCase):
+    """Round-by-round results of the instant-runoff and STV counts"""
+
+    def ballots(self, *groups):
+        return [(ranked.encode(ranking), weight) for ranking, weight in groups]
+
+    def test_instant_runoff_transfers_the_eliminated_candidates_votes(self):
+        count = ranked.count(self.ballots(([0, 2], 5), ([1, 2], 4), ([2, 1], 3)), candidates=3)
+        first, second = count.rounds
+        self.assertEqual([ranked.votes(v) for v in first.tallies], [5, 4, 3])
+        self.assertEqual((first.elected, first.eliminated), ([], [2]))
+        self.assertEqual([ranked.votes(v) for v in second.tallies], [5, 7, None])
+        self.assertEqual(second.elected, [1])
+        self.assertEqual(count.elected, [1])
+        self.assertEqual(count.quota, 6 * ranked.SCALE + 1)
+
+    def test_exhausted_ballots_leave_the_majority(self):
+        count = ranked.count(self.ballots(([0], 5), ([1], 4), ([2], 3)), candidates=3)
+        first, second = count.rounds
+        self.assertEqual((first.exhausted, first.eliminated), (0, [2]))
+        self.assertEqual(second.exhausted, 3 * ranked.SCALE)
+        # A majority of the nine votes still in the count, not of all twelve
+        self.assertEqual(count.quota, 9 * ranked.SCALE // 2 + 1)
+        self.assertEqual(count.elected, [0])
+
+    def test_stv_surplus_is_transferred_at_a_truncated_fraction(self):
+        count = ranked.count(self.ballots(([0, 1], 6), ([0, 2], 3), ([2], 1)), candidates=3, seats=2, method=ranked.STV)
+        self.assertEqual(count.quota, 10 * ranked.SCALE // 3 + 1)
+        first, second = count.rounds
+        self.assertEqual(first.tallies, [900000, 0, 100000])
+        self.assertEqual(first.elected, [0])
+        # A's surplus of 566666 goes on at 566666/900000 of each ballot's value, rounded down
+        self.assertEqual(second.tallies, [count.quota, 600000 * 566666 // 900000, 100000 + 300000 * 566666 // 900000])
+        self.assertEqual(second.tallies, [333334, 377777, 288888])
+        self.assertEqual(second.elected, [1])
+        self.assertEqual(count.elected, [0, 1])
+
+    def test_ties_are_broken_by_earlier_rounds_then_by_candidate_order(self):
+        count = ranked.count(self.ballots(([0], 4), ([1], 3), ([2], 2), ([3, 2], 2)), candidates=4)
+        eliminated = [round.eliminated for round in count.rounds]
+        # C and D tie in the first round: the one added later goes first.
+        # A and C then tie twice running; C had fewer votes in the first round.
+        self.assertEqual(eliminated, [[3], [1], [2], []])
+        self.assertEqual([ranked.votes(v) for v in count.rounds[2].tallies], [4, None, 4, None])
+        self.assertEqual(count.elected, [0])
+
+    def test_excluded_candidates_are_skipped(self):
+        count = ranked.count(self.ballots(([1, 0], 3), ([0], 2), ([2], 1)), candidates=3, excluded={1})
+        self.assertEqual(count.rounds[0].tallies, [5 * ranked.SCALE, None, ranked.SCALE])
+        self.assertEqual(count.elected, [0])
+
+
+class RankedBallotTests(TestCase):
+    def test_single_choice_post_is_refused_for_a_ranked_position(self):
+        election = Election.objects.create(election_title='Ranked Election')
+        voter = seed_election(election, voters=1, voted=0)[0]
+        RankedPosition.objects.create(election=election, position='Lady')
+        session = self.client.session
+        session.update({'voter_phone': voter.phone_number, 'election_id': election.id})
+        session.save()
+        candidate = election.candidates.filter(position='Lady').first()
+        response = self.client.post(reverse('vote'), {'candidate_id': candidate.id}, follow=True)
+        self.assertContains(response, 'needs candidates ranked in order of preference')
+        self.assertFalse(Vote.objects.filter(voter=voter).exists())
+
+
+class EventLogTests(TestCase):
+    """Appending to, reading, rotating and compacting the change log"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(events._logs.clear)
+        self.dir = directory.name
+
+    def log(self, name='log', segment_bytes=16 * 1024 * 1024):
+        return events.EventLog(os.path.join(self.dir, name), segment_bytes)
+
+    def event(self, key, kind='voter.added'):
+        return {'type': kind, 'at': '2026-01-01T00:00:00Z', 'election': 1, 'key': key, 'data': {}}
+
+    def offsets(self, lines):
+        return [events.offset_of(line) for line in lines]
+
+    def test_append_and_read_after_an_offset(self):
+        log = self.log()
+        self.assertEqual(log.append([self.event('voter:1'), self.event('voter:2'), self.event('voter:3')]), 3)
+        self.assertEqual(log.append([self.event('voter:4')]), 4)
+        self.assertEqual(self.offsets(log.read()), [1, 2, 3, 4])
+        self.assertEqual(self.offsets(log.read(after=2)), [3, 4])
+        self.assertEqual(self.offsets(log.read(limit=2)), [1, 2])
+        self.assertEqual(log.read(after=4), [])
+        self.assertEqual(json.loads(log.read(after=3)[0]), {'offset': 4, **self.event('voter:4')})
+
+        # A write cut short by a crash is not read, and the next append replaces it
+        with open(log.segments()[-1][1], 'ab') as f:
+            f.write(b'{"offset":5,"type":"vot')
+        self.assertEqual(log.read(after=4), [])
+        restarted = self.log()
+        self.assertEqual(restarted.append([self.event('voter:5')]), 5)
+        self.assertEqual([json.loads(line)['key'] for line in restarted.read(after=3)], ['voter:4', 'voter:5'])
+
+    def test_segments_rotate_and_reads_seek_into_them(self):
+        log = self.log(segment_bytes=8192)
+        for start in range(0, 2000, 100):
+            log.append([self.event(f'voter:{i}') for i in range(start, start + 100)])
+        segments = log.segments()
+        self.assertGreater(len(segments), 2)
+        for first, path in segments:
+            with open(path, 'rb') as f:
+                self.assertEqual(events.offset_of(f.readline()), first)
+        for after in (0, 1, 99, 100, 777, 1998, 2000):
+            self.assertEqual(self.offsets(log.read(after, limit=3)), list(range(after + 1, min(after + 3, 2000) + 1)))
+
+    def test_compaction_keeps_the_latest_event_per_key(self):
+        # Every append after the first starts a segment
+        log = self.log(segment_bytes=1)
+        log.append([self.event('voter:1'), self.event('voter:2')])
+        log.append([self.event('vote:1', 'vote.cast')])
+        log.append([self.event('vote:1', 'vote.retracted'), self.event('voter:1', 'voter.removed')])
+        log.append([self.event('voter:3')])
+        self.assertEqual([first for first, _ in log.segments()], [1, 3, 4, 6])
+
+        self.assertEqual(log.compact(), (5, 3))
+        lines = log.read()
+        self.assertEqual(self.offsets(lines), [2, 4, 5, 6])
+        self.assertEqual(
+            [json.loads(line)['type'] for line in lines], ['voter.added', 'vote.retracted', 'voter.removed', 'voter.added'],
+        )
+        self.assertEqual(log.first_offset(), 2)
+        # Consumers resume from the offset they had
+        self.assertEqual(self.offsets(log.read(after=3)), [4, 5, 6])
+        self.assertEqual(log.compact(), (3, 3))
+        self.assertEqual(self.offsets(log.read()), [2, 4, 5, 6])
+
+    def test_feed_and_tail_read_what_commits_emit(self):
+        election = Election.objects.create(election_title='Event Election')
+        with override_settings(
+            VOTING_EVENTS_DIR=os.path.join(self.dir, 'feed'), VOTING_EVENTS_TOKENS=['feed-token'],
+            VOTING_EVENTS_PAGE_SIZE=2,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                for name in ('Ada', 'Ben', 'Cy'):
+                    events.candidate_saved(Candidate.objects.create(election=election, name=name, position='Chair'), True)
+
+            url = reverse('events_feed')
+            auth = {'Authorization': 'Bearer feed-token'}
+            page = self.client.get(url, {'after': 0}, headers=auth).json()
+            self.assertEqual([event['offset'] for event in page['events']], [1, 2])
+            self.assertEqual((page['next'], page['first']), (2, 1))
+            self.assertEqual(page['events'][0]['type'], 'candidate.added')
+            self.assertEqual(page['events'][0]['data']['name'], 'Ada')
+            page = self.client.get(url, {'after': page['next']}, headers=auth).json()
+            self.assertEqual(([event['offset'] for event in page['events']], page['next']), ([3], 3))
+            page = self.client.get(url, {'after': 3}, headers=auth).json()
+            self.assertEqual((page['events'], page['next']), ([], 3))
+
+            self.assertEqual(self.client.get(url, {'after': 0}, headers={'Authorization': 'Bearer nope'}).status_code, 403)
+            self.assertEqual(self.client.get(url, {'after': 0}, headers={'Authorization': 'Bearer fëed'}).status_code, 403)
+            self.assertEqual(self.client.get(url, {'after': 0}).status_code, 403)
+            self.assertEqual(self.client.get(url, {'after': 'x'}, headers=auth).status_code, 400)
+
+            out = io.StringIO()
+            call_command('tail_events', after=1, stdout=out)
+            self.assertEqual([json.loads(line)['offset'] for line in out.getvalue().splitlines()], [2, 3])
+
+
+    def test_a_transaction_is_appended_in_one_write(self):
+        with override_settings(VOTING_EVENTS_DIR=os.path.join(self.dir, 'batched')):
+            log = events.get_log()
+            with mock.patch.object(events.EventLog, 'append', autospec=True, side_effect=events.EventLog.append) as append:
+                with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                    with transaction.atomic():
+                        events.voters_added(1, [(1, '+1'), (2, '+2')])
+                        events.emit('voter.added', 1, 'voter:3', {})
+                        try:
+                            with transaction.atomic():
+                                events.voters_added(1, [(4, '+4')])
+                                raise IntegrityError
+                        except IntegrityError:
+                            pass
+                        with transaction.atomic():
+                            events.voters_changed(1, 'voter.removed', [(1, '+1')], [7])
+                        events.emit('voter.added', 1, 'voter:5', {})
+                    self.assertEqual(append.call_count, 0)
+                # The rolled back savepoint's event is dropped, the rest keep their order
+                self.assertEqual(len(callbacks), 3)
+                self.assertEqual(append.call_count, 3)
+                self.assertEqual(
+                    [json.loads(line)['key'] for line in log.read()],
+                    ['voter:1', 'voter:2', 'voter:3', 'vote:7', 'voter:1', 'voter:5'],
+                )
+                # Many events from one call are one write too
+                append.reset_mock()
+                with self.captureOnCommitCallbacks(execute=True):
+                    events.voters_added(1, [(6, '+6'), (8, '+8')])
+                self.assertEqual(append.call_count, 1)
+                self.assertEqual(log.read(after=6)[-1].count(b'voter:8'), 1)
+
+
+class AnomalyTests(SimpleTestCase):
+    """Window arithmetic and the alerts of the streaming detector, on a fake clock"""
+
+    def setUp(self):
+        self.now = 0.0
+        self.detector = anomaly.Detector(clock=lambda: self.now)
+        self.ballots = 0
+        logger = mock.patch.object(anomaly, 'logger')
+        logger.start()
+        self.addCleanup(logger.stop)
+
+    def ballot(self, candidate, position='Chair', ip=None, phone=None, at=None):
+        if at is not None:
+            self.now = at
+        self.ballots += 1
+        # Far-apart numbers and one IP per ballot unless a test says otherwise
+        phone = phone or f'+2327{self.ballots * 1000:07d}'
+        ip = ip or f'10.0.{self.ballots // 256}.{self.ballots % 256}'
+        self.detector.record_ballot(1, phone, ip, [(candidate, f'Candidate {candidate}', position)])
+
+    def kinds(self):
+        return [alert.kind for alert in self.detector.recent_alerts()]
+
+    def test_window_drops_buckets_as_they_leave_the_ring(self):
+        window = anomaly.Window(6, 10)
+        window.add(0)
+        window.add(5)
+        window.add(12, amount=3)
+        self.assertEqual(window.count(12), 5)
+        self.assertEqual(window.count(59.9), 5)
+        # Second 60 reuses the bucket of seconds 0-9
+        self.assertEqual(window.count(60), 3)
+        self.assertEqual(window.count(70), 0)
+        # A long gap clears the ring once, not once per missed bucket
+        window.add(10 ** 6)
+        self.assertEqual((window.count(10 ** 6), sum(window.counts)), (1, 1))
+        self.assertEqual(window.count(10 ** 6 + 59), 1)
+
+    def test_a_burst_from_one_ip_is_a_spike_and_a_steady_one_is_not(self):
+        for i in range(180):
+            self.ballot(i % 3, ip='10.9.9.9', at=i * 10)
+        self.assertEqual(self.kinds(), [])
+        for i in range(30):
+            self.ballot(i % 3, ip='10.9.9.9', at=1800 + i)
+        # Reported once, then held back by the cooldown (the shared dialling prefix spikes too)
+        self.assertEqual(self.kinds().count('ip spike'), 1)
+        alert = next(alert for alert in self.detector.recent_alerts() if alert.kind == 'ip spike')
+        self.assertEqual(alert.key, '10.9.9.9')
+        self.assertRegex(alert.detail, r'^\d+ ballots in the last minute$')
+
+    def test_streak_is_judged_by_the_share_before_it(self):
+        # An even split, then every vote
+        for i in range(60):
+            self.ballot((i + 1) % 2, at=i)
+        for i in range(20):
+            self.ballot(1, at=60 + i)
+        self.assertEqual(self.kinds(), [])
+        # Against the 60 votes before it the share is (30 + 1) / 61 and 21 in a
+        # row is below one in a million; counting the run itself (51 / 81)
+        # would have let it run to 39
+        self.ballot(1, at=80)
+        self.assertEqual(self.kinds(), ['vote streak'])
+        self.assertIn('21 consecutive votes', self.detector.recent_alerts()[0].detail)
+
+    def test_streak_of_a_candidate_already_winning_everything_is_not_reported(self):
+        for i in range(200):
+            self.ballot(0, at=i)
+        self.assertEqual(self.kinds(), [])
+
+    def test_neighbouring_numbers_in_a_row_are_reported(self):
+        for i in range(9):
+            self.ballot(i % 3, phone=f'+2327000{100 + i * 2}', at=i)
+        self.assertEqual(self.kinds(), [])
+        self.ballot(0, phone='+2327000118', at=9)
+        self.assertEqual(self.kinds(), ['sequential voters'])
+
+    @override_settings(VOTING_ANOMALY_MAX_KEYS=5)
+    def test_keys_are_capped_per_kind(self):
+        self.ballot(0, ip='10.9.9.9')
+        for i in range(20):
+            self.ballot(0, ip=f'10.1.1.{i}')
+        self.assertEqual(len(self.detector.rates['ip'].items), 5)
+        self.assertIn('1: Candidate 0 (Chair)', self.detector.rates['candidate'].items)
+        self.assertEqual(len(self.detector.rates['position'].items), 1)
+
+
+@override_settings(
+    VOTING_ADMISSION_LIMITS={'voting': 2, 'results': 1, 'machine': 1, 'admin': 1}, VOTING_ADMISSION_BURST=0.5,
+)
+class AdmissionTests(SimpleTestCase):
+    """Per-lane caps, the waiting room and its signed tickets"""
+
+    def setUp(self):
+        lanes = mock.patch.object(admission, '_lanes', {name: admission.Lane(name) for name in admission._lanes})
+        lanes.start()
+        self.addCleanup(lanes.stop)
+        self.factory = RequestFactory()
+        self.middleware = admission.AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+
+    def admit(self, name, method='get', **kwargs):
+        return self.middleware.admit(getattr(self.factory, method)(reverse(name, **kwargs)))
+
+    def ticket(self, issued, lane=admission.VOTING):
+        return signing.dumps(
+            {'lane': lane, 'next': '/vote/', 'id': f'ticket-{issued}', 'issued': issued}, salt=admission.TICKET_SALT,
+        )
+
+    def test_urls_are_sorted_into_lanes(self):
+        lanes = {
+            name: admission.lane_for(self.factory.get(reverse(name)))
+            for name in ('vote', 'public_results', 'kiosk_sync', 'events_feed', 'export_votes', 'results', 'queue_status')
+        }
+        self.assertEqual(lanes, {
+            'vote': admission.VOTING, 'public_results': admission.RESULTS, 'kiosk_sync': admission.MACHINE,
+            'events_feed': admission.MACHINE, 'export_votes': admission.MACHINE, 'results': admission.ADMIN,
+            'queue_status': None,
+        })
+
+    def test_each_lane_has_its_own_cap(self):
+        lane, refusal = self.admit('kiosk_sync', 'post')
+        self.assertIsNone(refusal)
+        _, refusal = self.admit('events_feed')
+        self.assertEqual((refusal.status_code, refusal['Retry-After']), (503, '2'))
+        # Machines catching up leave the administrators' slot alone
+        admin_lane, refusal = self.admit('results')
+        self.assertIsNone(refusal)
+        _, refusal = self.admit('add_voters')
+        self.assertEqual(refusal.status_code, 503)
+        lane.release()
+        admin_lane.release()
+        self.assertIsNone(self.admit('export_votes')[1])
+        stats = admission.stats()
+        self.assertEqual((stats['machine']['in_flight'], stats['machine']['rejected']), (1, 1))
+        self.assertEqual((stats['admin']['in_flight'], stats['admin']['rejected']), (0, 1))
+
+    def test_full_voting_lane_queues_pages_and_lets_posts_use_the_burst(self):
+        self.admit('vote')
+        self.admit('vote')
+        _, waiting_room = self.admit('vote')
+        self.assertEqual(waiting_room.status_code, 503)
+        self.assertEqual(waiting_room['Cache-Control'], 'no-store')
+        self.assertContains(waiting_room, reverse('queue_status'), status_code=503)
+        # A ballot being posted takes the one burst slot; the next is turned away
+        self.assertIsNone(self.admit('vote', 'post')[1])
+        _, busy = self.admit('submit_ballot', 'post')
+        self.assertEqual((busy.status_code, busy['Content-Type']), (503, 'text/plain'))
+        stats = admission.stats()['voting']
+        self.assertEqual((stats['in_flight'], stats['queued'], stats['rejected']), (3, 1, 1))
+
+    def test_tickets_are_admitted_oldest_first(self):
+        lane, _ = self.admit('vote')
+        self.admit('vote')
+        older, newer = self.ticket(1000.0), self.ticket(2000.0)
+        self.assertEqual(admission.check_ticket(newer), ({'ready': False, 'position': 1, 'retry_after': 2}, None))
+        # The older ticket goes ahead, whichever polled first
+        self.assertEqual(admission.check_ticket(older)[0]['position'], 1)
+        self.assertEqual(admission.check_ticket(newer)[0]['position'], 2)
+        lane.release()
+        self.assertFalse(admission.check_ticket(newer)[0]['ready'])
+        answer, voting_pass = admission.check_ticket(older)
+        self.assertEqual(answer, {'ready': True, 'next': '/vote/'})
+        request = self.factory.get(reverse('vote'))
+        request.COOKIES[admission.PASS_COOKIE] = voting_pass
+        self.assertTrue(admission.has_pass(request, admission.VOTING))
+        self.assertFalse(admission.has_pass(request, admission.RESULTS))
+
+    def test_forged_expired_and_unknown_tickets_are_refused(self):
+        expired = {'ready': False, 'expired': True}
+        ticket = admission.issue_ticket(admission.VOTING, '/vote/')
+        self.assertEqual(admission.read_ticket(ticket)['next'], '/vote/')
+        self.assertEqual(admission.check_ticket(ticket[:-2] + ('AA' if ticket[-2:] != 'AA' else 'BB')), (expired, None))
+        self.assertEqual(admission.check_ticket(self.ticket(1000.0, lane='nope')), (expired, None))
+        self.assertEqual(admission.check_ticket('not a ticket'), (expired, None))
+        with override_settings(VOTING_ADMISSION_TICKET_TTL=-1):
+            self.assertEqual(admission.check_ticket(ticket), (expired, None))
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EXPORT_TOKEN='export-token', VOTING_EXPORT_PAGE_SIZE=5)
+class VoteExportTests(TestCase):
+    """Cursor paging, ``since`` and the formats of the incremental vote export"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Export Election')
+        cls.voters = seed_election(cls.election, voters=10, voted=4)
+
+    def export(self, token='export-token', **params):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.get(reverse('export_votes'), {'election': self.election.id, **params}, headers=headers)
+        content = b''.join(response.streaming_content).decode() if response.streaming else ''
+        return response, content
+
+    def records(self, **params):
+        response, content = self.export(**params)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_token_is_required(self):
+        self.assertEqual(self.export(token=None)[0].status_code, 403)
+        self.assertEqual(self.export(token='export-tokeN')[0].status_code, 403)
+        self.assertEqual(self.export(token='export-token-2')[0].status_code, 403)
+        self.assertEqual(self.export(token='ëxport')[0].status_code, 403)
+        self.assertEqual(self.export()[0].status_code, 200)
+
+    def test_cursor_pages_through_every_vote_once(self):
+        expected = list(Vote.objects.filter(election=self.election).order_by('id').values_list('id', flat=True))
+        seen = []
+        cursor = 0
+        while True:
+            records = self.records(cursor=cursor)
+            votes = [record for record in records if record['type'] == 'vote']
+            self.assertLessEqual(len(votes), 5)
+            seen += [vote['id'] for vote in votes]
+            # Each page carries the touched candidates' current tallies, then the cursor
+            tallies = {record['candidate_id']: record['votes'] for record in records if record['type'] == 'tally'}
+            self.assertEqual(set(tallies), {vote['candidate_id'] for vote in votes})
+            for candidate_id, count in tallies.items():
+                self.assertEqual(count, Vote.objects.filter(candidate_id=candidate_id).count())
+            self.assertEqual(records[-1]['type'], 'cursor')
+            cursor = records[-1]['next']
+            if not records[-1]['has_more']:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(self.records(cursor=cursor), [{'type': 'cursor', 'next': cursor, 'has_more': False}])
+        self.assertEqual(self.export(cursor='abc')[0].status_code, 400)
+
+    def test_since_starts_after_the_votes_cast_before_it(self):
+        now = timezone.now()
+        candidate = self.election.candidates.order_by('id').first()
+        _record_vote(self.election, self.voters[5], candidate, now)
+        since = now - timedelta(minutes=1)
+        records = self.records(since=since.isoformat())
+        self.assertEqual([record['voter_phone'] for record in records if record['type'] == 'vote'], [self.voters[5].phone_number])
+        # A naive time is read in the election's time zone
+        local = timezone.localtime(since, pytz.timezone(self.election.timezone)).replace(tzinfo=None)
+        self.assertEqual(self.records(since=local.isoformat()), records)
+        # Nothing after it: the cursor is the newest vote
+        later = self.records(since=(now + timedelta(minutes=1)).isoformat())
+        self.assertEqual(later, [{'type': 'cursor', 'next': Vote.objects.latest('id').id, 'has_more': False}])
+        self.assertEqual(self.export(since='yesterday')[0].status_code, 400)
+
+    def test_csv_export(self):
+        response, content = self.export(format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], incremental.CSV_HEADER)
+        votes = [row for row in rows if row[0] == 'vote']
+        first = Vote.objects.filter(election=self.election).order_by('id').select_related('candidate', 'voter').first()
+        self.assertEqual(votes[0], [
+            'vote', str(first.id), first.voted_at.isoformat(), first.voter.phone_number, str(first.candidate_id),
+            first.candidate.name, first.position, '',
+        ])
+        self.assertEqual(len(votes), 5)
+        self.assertEqual(rows[-1], ['cursor', response['X-Next-Cursor'], '', '', '', '', '', '1'])
+        self.assertEqual(response['X-Has-More'], 'true')
+        self.assertEqual(self.export(format='xml')[0].status_code, 400)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None)
+class AuditLogTests(TestCase):
+    """Merkle proofs of the vote log and the verifier's tamper detection"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Audit Election')
+        cls.voters = seed_election(cls.election, voters=8, voted=5)
+
+    def build(self, size):
+        """Stored nodes and the root at every size of a log of ``size`` made-up leaves"""
+        frontier = merkle.Frontier()
+        nodes = {}
+        roots = [merkle.EMPTY_ROOT]
+        leaves = [merkle.leaf_hash(b'vote %d' % i) for i in range(size)]
+        for leaf in leaves:
+            for level, index, digest in frontier.append(leaf):
+                nodes[(level, index)] = digest
+            roots.append(frontier.root())
+        return leaves, roots, lambda level, index: nodes[(level, index)]
+
+    def test_inclusion_proofs(self):
+        leaves, roots, get_node = self.build(21)
+        other = merkle.leaf_hash(b'forged')
+        for size in range(1, 22):
+            self.assertEqual(merkle.subtree_hash(0, size, get_node), roots[size])
+            for index in range(size):
+                path = merkle.inclusion_proof(index, size, get_node)
+                self.assertTrue(merkle.verify_inclusion(leaves[index], index, size, path, roots[size]))
+                self.assertFalse(merkle.verify_inclusion(other, index, size, path, roots[size]))
+                self.assertFalse(merkle.verify_inclusion(leaves[index], index, size, path, roots[size - 1]))
+                if size > 1:
+                    self.assertFalse(merkle.verify_inclusion(leaves[index], (index + 1) % size, size, path, roots[size]))
+
+    def test_consistency_proofs(self):
+        _, roots, get_node = self.build(21)
+        for size in range(1, 22):
+            for old_size in range(1, size + 1):
+                proof = merkle.consistency_proof(old_size, size, get_node)
+                self.assertTrue(merkle.verify_consistency(old_size, size, proof, roots[old_size], roots[size]))
+                if old_size == size:
+                    continue
+                # A rewritten earlier log, a wrong new root or a tampered proof all fail
+                self.assertFalse(merkle.verify_consistency(old_size, size, proof, roots[old_size - 1], roots[size]))
+                self.assertFalse(merkle.verify_consistency(old_size, size, proof, roots[old_size], roots[size - 1]))
+                for index in range(len(proof)):
+                    tampered = proof[:index] + [merkle.leaf_hash(b'forged')] + proof[index + 1:]
+                    self.assertFalse(merkle.verify_consistency(old_size, size, tampered, roots[old_size], roots[size]))
+
+    def test_stored_log_proofs(self):
+        head = AuditHead.objects.get(election=self.election)
+        self.assertEqual(head.size, 15)
+        leaves = [bytes.fromhex(h) for h in AuditEntry.objects.filter(election=self.election).values_list('leaf_hash', flat=True)]
+        frontier = merkle.Frontier()
+        roots = [merkle.EMPTY_ROOT]
+        for leaf in leaves:
+            frontier.append(leaf)
+            roots.append(frontier.root())
+        self.assertEqual(roots[-1].hex(), head.root_hash)
+
+        entry = AuditEntry.objects.get(election=self.election, seq=6)
+        path, root = head.proof(entry, 9)
+        self.assertEqual(root, roots[9])
+        self.assertTrue(merkle.verify_inclusion(leaves[6], 6, 9, path, root))
+
+        response = self.client.get(reverse('audit_consistency', args=[self.election.id]), {'first': 6})
+        answer = response.json()
+        self.assertEqual((answer['first'], answer['second'], answer['verified']), (6, 15, True))
+        self.assertEqual((answer['first_root'], answer['second_root']), (roots[6].hex(), head.root_hash))
+        proof = [bytes.fromhex(node) for node in answer['proof']]
+        self.assertTrue(merkle.verify_consistency(6, 15, proof, roots[6], roots[15]))
+        for params in ({}, {'first': 0}, {'first': 16}, {'first': 7, 'second': 6}):
+            self.assertEqual(self.client.get(reverse('audit_consistency', args=[self.election.id]), params).status_code, 400)
+
+    def verify(self):
+        out = io.StringIO()
+        try:
+            call_command('verify_audit_log', election=self.election.id, stdout=out)
+        except CommandError:
+            pass
+        return out.getvalue()
+
+    def test_verifier_detects_each_tampered_field(self):
+        self.assertIn('Vote log is intact', self.verify())
+        entry = AuditEntry.objects.get(election=self.election, seq=4)
+        vote = entry.vote
+        other = Election.objects.create(election_title='Other Election')
+        later = entry.voted_at + timedelta(seconds=1)
+        entry_edits = {
+            'vote_ref': entry.vote_ref + 1000, 'voter_ref': entry.voter_ref + 1000,
+            'candidate_ref': entry.candidate_ref + 1000, 'position': 'Treasurer', 'voted_at': later,
+        }
+        for field, value in entry_edits.items():
+            with self.subTest(entry=field), transaction.atomic():
+                AuditEntry.objects.filter(pk=entry.pk).update(**{field: value})
+                self.assertIn('entry #4 does not match its leaf hash', self.verify())
+                transaction.set_rollback(True)
+        with self.subTest(entry='chain_hash'), transaction.atomic():
+            AuditEntry.objects.filter(pk=entry.pk).update(chain_hash='0' * 64)
+            self.assertIn('entry #4 breaks the hash chain', self.verify())
+            transaction.set_rollback(True)
+        with self.subTest(entry='removed'), transaction.atomic():
+            AuditEntry.objects.filter(pk=entry.pk).delete()
+            self.assertIn('entry #4 is missing', self.verify())
+            transaction.set_rollback(True)
+
+        unused = self.voters[-1]
+        candidate = Candidate.objects.filter(election=self.election, position=vote.position).exclude(id=vote.candidate_id).first()
+        vote_edits = {
+            'election': other, 'voter': unused, 'candidate': candidate, 'position': 'Treasurer', 'voted_at': later,
+        }
+        for field, value in vote_edits.items():
+            with self.subTest(vote=field), transaction.atomic():
+                Vote.objects.filter(pk=vote.pk).update(**{field: value})
+                self.assertIn('1 vote row(s) were changed after being logged', self.verify())
+                transaction.set_rollback(True)
+        self.assertIn('Vote log is intact', self.verify())
+
+
+class SettingsCheckTests(SimpleTestCase):
+    @override_settings(VOTING_OTP_ENABLED=True, VOTING_SMS_BACKEND='VotingApp.sms.backends.console.SmsBackend', DEBUG=False)
+    def test_login_codes_need_a_backend_that_sends_them(self):
+        self.assertEqual([error.id for error in checks.check_otp_delivery(None)], ['VotingApp.E001'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(checks.check_otp_delivery(None), [])
+        with override_settings(VOTING_SMS_BACKEND='VotingApp.sms.backends.http.SmsBackend'):
+            self.assertEqual(checks.check_otp_delivery(None), [])
+        with override_settings(VOTING_OTP_ENABLED=False):
+            self.assertEqual(checks.check_otp_delivery(None), [])
+
+
+def async_urlconf():
+    """A fresh copy of the project URLconf with ``VOTING_ASYNC_VIEWS`` on"""
+    spec = importlib.util.find_spec(settings.ROOT_URLCONF)
+    module = importlib.util.module_from_spec(spec)
+    with override_settings(VOTING_ASYNC_VIEWS=True):
+        spec.loader.exec_module(module)
+    return module
+
+
+@override_settings(
+    VOTING_TALLY_STORE_PATH=None, VOTING_REPLICA_PATH=None, VOTING_EVENTS_DIR=None, VOTING_OTP_ENABLED=True,
+    VOTING_SMS_BACKEND='VotingApp.sms.backends.locmem.SmsBackend',
+)
+class AsyncViewTests(TestCase):
+    """The async views log a voter in, take their vote and report it like the sync ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Async Election')
+        cls.voter = seed_election(cls.election, voters=3, voted=2)[-1]
+        cls.candidate = cls.election.candidates.order_by('id').first()
+
+    def setUp(self):
+        override = override_settings(ROOT_URLCONF=async_urlconf())
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    async def test_login_and_vote(self):
+        self.assertIs(resolve(reverse('vote')).func, async_views.vote)
+        response = await self.async_client.post(
+            reverse('login') + f'?election={self.election.id}', {'phone_number': self.voter.phone_number},
+        )
+        self.assertRedirects(response, reverse('login_verify'), fetch_redirect_response=False)
+        self.assertTrue(sms.get_queue().flush(5))
+        code = sms.outbox[-1].body.split()[0]
+
+        response = await self.async_client.post(reverse('login_verify'), {'code': 'x'})
+        self.assertContains(response, 'That code is wrong or has expired.')
+        response = await self.async_client.post(reverse('login_verify'), {'code': code})
+        self.assertRedirects(response, reverse('vote'), fetch_redirect_response=False)
+
+        response = await self.async_client.get(reverse('vote'))
+        self.assertContains(response, self.candidate.name)
+        await self.async_client.post(reverse('vote'), {'candidate_id': self.candidate.id})
+        vote = await Vote.objects.select_related('voter').aget(voter=self.voter)
+        self.assertEqual((vote.candidate_id, vote.position), (self.candidate.id, self.candidate.position))
+        self.assertTrue(vote.voter.has_voted)
+        # A second vote for the same position is refused
+        await self.async_client.post(reverse('vote'), {'candidate_id': self.candidate.id})
+        self.assertEqual(await Vote.objects.filter(voter=self.voter).acount(), 1)
+
+    async def test_results_match_the_sync_views(self):
+        response = await self.async_client.get(reverse('results_api'), {'election': self.election.id})
+        feed = await sync_to_async(views._results_feed)(self.election)
+        self.assertEqual(response.json(), {**json.loads(json.dumps(feed)), 'data_age': None})
+        self.assertEqual(response.json()['total_votes'], 6)
+        response = await self.async_client.get(reverse('public_results'), {'election': self.election.id})
+        self.assertContains(response, 'Async Election')
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class TurnoutTests(TestCase):
+    """The turnout counter follows first votes and deletes, and reconcile_turnout repairs it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Turnout Election')
+        cls.voters = seed_election(cls.election, voters=6, voted=3)
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass')
+
+    def assertTurnout(self, count):
+        self.assertEqual(TurnoutCounter.get_count(self.election), count)
+        self.assertEqual(Voter.objects.filter(election=self.election, has_voted=True).count(), count)
+        self.assertEqual(Vote.objects.filter(election=self.election).values('voter').distinct().count(), count)
+        rollups = VoteRollup.objects.filter(election=self.election, granularity=VoteRollup.MINUTE)
+        totals = rollups.aggregate(votes=Sum('votes'), voters=Sum('new_voters'))
+        self.assertEqual(
+            (totals['votes'] or 0, totals['voters'] or 0), (Vote.objects.filter(election=self.election).count(), count),
+        )
+
+    def test_only_a_voters_first_vote_counts(self):
+        self.assertTurnout(3)
+        voter = self.voters[3]
+        for candidate in self.election.candidates.filter(name__startswith='Ada'):
+            self.assertTrue(_record_vote(self.election, voter, candidate, timezone.now()))
+            self.assertTurnout(4)
+        # A repeat for a position already voted in changes nothing
+        self.assertFalse(_record_vote(self.election, voter, candidate, timezone.now()))
+        self.assertTurnout(4)
+
+    def test_reconcile_turnout_reports_and_fixes(self):
+        TurnoutCounter.reset(self.election, 7)
+        Voter.objects.filter(id=self.voters[0].id).update(has_voted=False)
+        Voter.objects.filter(id=self.voters[5].id).update(has_voted=True, voted_at=timezone.now())
+        out = io.StringIO()
+        call_command('reconcile_turnout', stdout=out)
+        self.assertIn('Turnout counter is out of sync', out.getvalue())
+        self.assertIn('Voters with votes but no has_voted flag: 1', out.getvalue())
+        self.assertIn('Voters flagged has_voted without votes:  1', out.getvalue())
+        self.assertEqual(TurnoutCounter.get_count(self.election), 7)
+
+        call_command('reconcile_turnout', fix=True, stdout=out)
+        self.assertIn('Turnout counter reset to 3', out.getvalue())
+        self.assertTurnout(3)
+        out = io.StringIO()
+        call_command('reconcile_turnout', stdout=out)
+        self.assertIn('Turnout counter is consistent', out.getvalue())
+
+    def test_admin_deletes_keep_turnout_in_step(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:VotingApp_voter_delete', args=[self.voters[0].id]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Voter.objects.filter(id=self.voters[0].id).exists())
+        self.assertTurnout(2)
+
+        # One of a voter's three votes: they have still voted
+        vote = Vote.objects.filter(voter=self.voters[1]).order_by('voted_at', 'id').first()
+        self.client.post(reverse('admin:VotingApp_vote_delete', args=[vote.id]), {'post': 'yes'})
+        self.assertEqual(Vote.objects.filter(voter=self.voters[1]).count(), 2)
+        self.assertTurnout(2)
+
+        # The rest of them, from the changelist action
+        ids = list(Vote.objects.filter(voter=self.voters[1]).values_list('id', flat=True))
+        self.client.post(
+            reverse('admin:VotingApp_vote_changelist'),
+            {'action': 'delete_selected', '_selected_action': ids, 'post': 'yes'},
+        )
+        self.assertFalse(Voter.objects.get(id=self.voters[1].id).has_voted)
+        self.assertTurnout(1)
+
+        # A candidate takes their votes with them
+        candidate = Vote.objects.get(voter=self.voters[2], position='Chair').candidate
+        self.client.post(reverse('admin:VotingApp_candidate_delete', args=[candidate.id]), {'post': 'yes'})
+        self.assertFalse(Candidate.objects.filter(id=candidate.id).exists())
+        self.assertEqual(Vote.objects.filter(voter=self.voters[2]).count(), 2)
+        self.assertTurnout(1)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class VoteRollupTests(TestCase):
+    """Incremental rollup updates agree with a rebuild from the Vote table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Rollup Election')
+        cls.voters = seed_election(cls.election, voters=6, voted=4)
+
+    def rollups(self):
+        """Every non-empty bucket as a sorted list of tuples"""
+        return sorted(
+            VoteRollup.objects.filter(election=self.election).exclude(votes=0, new_voters=0)
+            .values_list('granularity', 'bucket_start', 'position', 'votes', 'new_voters')
+        )
+
+    def rebuilt(self):
+        call_command('rebuild_rollups', chunk_size=5, stdout=io.StringIO())
+        return self.rollups()
+
+    def test_bucket_boundaries(self):
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        for moment in (hour, hour + timedelta(seconds=59), hour + timedelta(minutes=59, seconds=59), hour + timedelta(hours=1)):
+            VoteRollup.record(self.election, moment, 'Treasurer')
+        rows = VoteRollup.objects.filter(election=self.election, position='Treasurer')
+        self.assertEqual(
+            sorted(rows.filter(granularity=VoteRollup.MINUTE).values_list('bucket_start', 'votes')),
+            [(hour, 2), (hour + timedelta(minutes=59), 1), (hour + timedelta(hours=1), 1)],
+        )
+        self.assertEqual(
+            sorted(rows.filter(granularity=VoteRollup.HOUR).values_list('bucket_start', 'votes')),
+            [(hour, 3), (hour + timedelta(hours=1), 1)],
+        )
+
+    def test_record_many_counts_the_voter_once(self):
+        moment = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=3)
+        VoteRollup.record_many(self.election, moment, ['Chair', 'Lady', 'Secretary'], new_voter=True)
+        VoteRollup.record_many(self.election, moment + timedelta(seconds=10), ['Chair', 'Lady'])
+        for granularity in (VoteRollup.MINUTE, VoteRollup.HOUR):
+            rows = VoteRollup.objects.filter(
+                election=self.election, granularity=granularity,
+                bucket_start=VoteRollup.bucket_for(moment, granularity),
+            )
+            self.assertEqual(
+                sorted(rows.values_list('position', 'votes', 'new_voters')),
+                [('Chair', 2, 1), ('Lady', 2, 0), ('Secretary', 1, 0)],
+            )
+
+    def test_record_batch_matches_a_rebuild(self):
+        before = self.rollups()
+        self.assertEqual(self.rebuilt(), before)
+        moment = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=2)
+        candidates = list(self.election.candidates.order_by('position', 'name'))
+        votes = Vote.objects.bulk_create([
+            Vote(election=self.election, voter=voter, candidate=candidates[index * 3], position=candidates[index * 3].position)
+            for voter in self.voters[4:] for index in range(3)
+        ])
+        times = [moment + timedelta(minutes=i * 40) for i in range(len(votes))]
+        for vote, voted_at in zip(votes, times):
+            Vote.objects.filter(id=vote.id).update(voted_at=voted_at)
+        VoteRollup.record_batch(
+            self.election, [(voted_at, vote.position, i % 3 == 0) for i, (vote, voted_at) in enumerate(zip(votes, times))],
+        )
+        incremental = self.rollups()
+        self.assertNotEqual(incremental, before)
+        self.assertEqual(self.rebuilt(), incremental)
+
+    def test_retract_matches_a_rebuild(self):
+        Voter.remove(self.election, [self.voters[0].id, self.voters[5].id])
+        Voter.remove(self.election, [self.voters[1].id], keep_voters=True)
+        retracted = self.rollups()
+        self.assertEqual(sum(row[3] for row in retracted if row[0] == VoteRollup.MINUTE), 6)
+        self.assertEqual(sum(row[4] for row in retracted if row[0] == VoteRollup.MINUTE), 2)
+        self.assertEqual(self.rebuilt(), retracted)
+
+    def test_rebuild_rollups_repairs_the_buckets(self):
+        before = self.rollups()
+        VoteRollup.objects.filter(election=self.election, position='Chair').delete()
+        VoteRollup.objects.filter(election=self.election).update(votes=F('votes') + 5)
+        VoteRollup.record(self.election, timezone.now() - timedelta(days=1), 'Stale')
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('from 12 votes', out.getvalue())
+        self.assertEqual(self.rollups(), before)
+
+    def test_moving_a_candidate_moves_their_votes(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass')
+        self.client.force_login(user)
+        session = self.client.session
+        session.update({'is_admin': True, 'admin_user_id': user.id, 'election_id': self.election.id})
+        session.save()
+        candidate = self.election.candidates.get(name='Ada Chair')
+        self.client.post(
+            reverse('edit_candidate', args=[candidate.id]),
+            {'name': candidate.name, 'position': 'Treasurer', 'nickname': ''},
+        )
+        moved = dict(
+            VoteRollup.objects.filter(election=self.election, granularity=VoteRollup.HOUR)
+            .values_list('position').annotate(Sum('votes'))
+        )
+        self.assertEqual(moved, {'Chair': 2, 'Treasurer': 2, 'Lady': 4, 'Secretary': 4})
+        self.assertEqual(self.rebuilt(), self.rollups())
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None)
+class ColumnarSnapshotTests(TestCase):
+    """A snapshot reads back the vote log it was written from"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Columnar Election')
+        seed_election(cls.election, voters=12, voted=7)
+        # Spread the votes out so the time column is not one value
+        for index, vote in enumerate(Vote.objects.filter(election=cls.election).order_by('id')):
+            Vote.objects.filter(id=vote.id).update(voted_at=vote.voted_at + timedelta(seconds=index, microseconds=index))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'votes.cols')
+
+    def test_round_trip(self):
+        votes = list(Vote.objects.filter(election=self.election).order_by('id').values_list('voter_id', 'candidate_id', 'voted_at'))
+        # A chunk size that splits the log unevenly, and one that divides it
+        for chunk_size in (4, 7):
+            self.assertEqual(columnar.write_snapshot(self.election, self.path, chunk_size=chunk_size), 21)
+            with columnar.ColumnarSnapshot(self.path) as snapshot:
+                self.assertEqual(snapshot.rows, 21)
+                self.assertEqual(list(snapshot.voter_ids), [vote[0] for vote in votes])
+                self.assertEqual(list(snapshot.candidate_ids), [vote[1] for vote in votes])
+                self.assertEqual(
+                    [columnar.EPOCH + columnar.ONE_MICROSECOND * t for t in snapshot.timestamps], [vote[2] for vote in votes],
+                )
+                self.assertEqual(snapshot.time_range(), (votes[0][2], votes[-1][2]))
+                self.assertEqual(snapshot.turnout(), 7)
+                self.assertEqual(
+                    snapshot.election,
+                    {'id': self.election.id, 'title': 'Columnar Election', 'timezone': self.election.timezone},
+                )
+                self.assertEqual(snapshot.positions, ['Chair', 'Lady', 'Secretary'])
+                self.assertEqual(
+                    snapshot.tally(),
+                    dict(Vote.objects.filter(election=self.election).values_list('candidate_id').annotate(Count('id'))),
+                )
+                expected = {}
+                for name, position, count in (
+                    Candidate.objects.filter(election=self.election).annotate(n=Count('vote')).filter(n__gt=0)
+                    .values_list('name', 'position', 'n')
+                ):
+                    expected.setdefault(position, {})[name] = count
+                self.assertEqual(snapshot.tally_by_position(), expected)
+
+    def test_empty_election(self):
+        election = Election.objects.create(election_title='No Votes')
+        self.assertEqual(columnar.write_snapshot(election, self.path), 0)
+        with columnar.ColumnarSnapshot(self.path) as snapshot:
+            self.assertEqual((snapshot.rows, snapshot.turnout(), snapshot.tally()), (0, 0, {}))
+            self.assertEqual(snapshot.time_range(), (None, None))
+
+    def test_other_files_are_refused(self):
+        for content in (b'not a snapshot at all' * 4, b'short', b''):
+            with open(self.path, 'wb') as f:
+                f.write(content)
+            with self.assertRaises(columnar.SnapshotFormatError):
+                columnar.ColumnarSnapshot(self.path)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class RecountTests(TransactionTestCase):
+    """recount_votes finds the same counts and problems however it is partitioned"""
+
+    def setUp(self):
+        self.election = Election.objects.create(election_title='Recount Election')
+        # Committed at once here, so the ballots reach the anomaly detector
+        with mock.patch.object(anomaly, 'logger'):
+            roll = seed_election(self.election, voters=40, voted=25)
+        # Gaps in the voter ids leave some partitions empty and others full
+        Voter.remove(self.election, [voter.id for voter in roll[5:15]])
+
+    def recount(self, workers, chunk_size):
+        out = io.StringIO()
+        # Worker processes would open their own, empty in-memory test
+        # database; threads share it and still run every partition apart
+        with mock.patch(
+            'VotingApp.management.commands.recount_votes.ProcessPoolExecutor', ThreadPoolExecutor,
+        ), mock.patch('VotingApp.management.commands.recount_votes._init_worker'):
+            try:
+                call_command(
+                    'recount_votes', election=self.election.id, workers=workers, chunk_size=chunk_size, stdout=out,
+                )
+                failed = False
+            except CommandError:
+                failed = True
+        # Everything but the timing line
+        return failed, [line for line in out.getvalue().splitlines() if not line.startswith('Recounted ')]
+
+    def assertSameRecount(self):
+        serial = self.recount(workers=1, chunk_size=1000)
+        for workers, chunk_size in ((2, 3), (4, 7)):
+            self.assertEqual(self.recount(workers, chunk_size), serial)
+        return serial
+
+    def test_parallel_count_matches_serial(self):
+        failed, lines = self.assertSameRecount()
+        self.assertFalse(failed)
+        self.assertIn('  Chair: 15', lines)
+        self.assertEqual(lines[-1], 'Recount matches the stored tallies')
+
+    def test_parallel_problems_match_serial(self):
+        voters = list(Voter.objects.filter(election=self.election).order_by('id'))
+        Voter.objects.filter(id=voters[0].id).update(has_voted=False)
+        Voter.objects.filter(id__in=[voters[-1].id, voters[-2].id]).update(has_voted=True)
+        vote = Vote.objects.filter(voter=voters[3], position='Lady').get()
+        Vote.objects.filter(id=vote.id).update(position='Treasurer')
+        failed, lines = self.assertSameRecount()
+        self.assertTrue(failed)
+        self.assertIn('1 votes store a position that differs from their candidate', lines)
+        self.assertIn('1 voters have votes but has_voted is not set', lines)
+        self.assertIn('2 voters are flagged has_voted without any vote', lines)
+
+
+@override_settings(VOTING_JOBS_RETRY_DELAY=10)
+class JobTests(TestCase):
+    """Failed jobs are retried with backoff, and jobs whose worker went quiet are requeued"""
+
+    def setUp(self):
+        # Ahead of the real clock, which the fields' defaults still read
+        self.now = timezone.now() + timedelta(seconds=1)
+        clock = mock.patch('django.utils.timezone.now', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.outcomes = []
+        tasks = mock.patch.dict(jobs.TASKS, {'flaky': self.flaky})
+        tasks.start()
+        self.addCleanup(tasks.stop)
+        quiet = mock.patch.object(jobs, 'logger')
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def flaky(self, job, size):
+        """Fails while ``self.outcomes`` holds exceptions, then succeeds"""
+        job.report(size // 2, size)
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return {'size': size}
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+    def test_retries_back_off_until_attempts_run_out(self):
+        self.outcomes = [ValueError('first'), ValueError('second'), ValueError('third')]
+        job = Job.enqueue('flaky', size=4)
+        for attempt, delay in ((1, 10), (2, 20)):
+            jobs.run(Job.claim())
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+            self.assertEqual(job.run_after, self.now + timedelta(seconds=delay))
+            self.assertIn('ValueError', job.error)
+            # Not due until the delay has passed
+            self.advance(delay - 1)
+            self.assertIsNone(Job.claim())
+            self.advance(1)
+        jobs.run(Job.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.finished_at), (Job.FAILED, 3, self.now))
+        self.assertIn('third', job.error)
+        self.advance(3600)
+        self.assertIsNone(Job.claim())
+
+    def test_a_retry_can_succeed(self):
+        self.outcomes = [ValueError('first')]
+        job = Job.enqueue('flaky', size=4)
+        jobs.run(Job.claim())
+        self.advance(10)
+        claimed = Job.claim()
+        self.assertEqual(claimed.error, '')
+        jobs.run(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.SUCCEEDED, 2, {'size': 4}))
+        self.assertEqual((job.progress, job.percent), (4, 100))
+
+    def test_unknown_kind_fails_like_a_task(self):
+        job = Job.enqueue('missing', max_attempts=1)
+        jobs.run(Job.claim())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("No task is registered for jobs of kind 'missing'", job.error)
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retried = Job.enqueue('flaky', size=4)
+        exhausted = Job.enqueue('flaky', max_attempts=1, size=4)
+        alive = Job.enqueue('flaky', size=4)
+        for _ in range(3):
+            Job.claim()
+        self.advance(200)
+        Job.objects.get(id=alive.id).report(1, 4)
+        self.advance(101)
+        self.assertEqual(Job.requeue_stale(300), 2)
+
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts, retried.run_after), (Job.QUEUED, 1, self.now))
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, Job.FAILED)
+        self.assertEqual(exhausted.error, 'The worker running this job stopped responding')
+        self.assertEqual(Job.objects.get(id=alive.id).status, Job.RUNNING)
+        # The requeued job is claimed again, and counts another attempt
+        self.assertEqual(Job.claim().id, retried.id)
+        retried.refresh_from_db()
+        self.assertEqual(retried.attempts, 2)
+
+
+@override_settings(VOTING_JOBS_RETRY_DELAY=0)
+class JobWorkerTests(TransactionTestCase):
+    """run_jobs' loop runs queued jobs on its pool and retries the failed ones"""
+
+    def test_work_once_runs_and_retries(self):
+        outcomes = [ValueError('flaky')]
+
+        def flaky(job, size):
+            job.report(size, size)
+            if outcomes:
+                raise outcomes.pop()
+            return {'size': size}
+
+        queued = [Job.enqueue('flaky', size=size) for size in (1, 2, 3)]
+        finished = []
+        with mock.patch.dict(jobs.TASKS, {'flaky': flaky}), mock.patch.object(jobs, 'logger'):
+            jobs.work(workers=2, poll=0.01, once=True, on_finish=lambda job: finished.append((job.id, job.status)))
+        # One job failed once and was run again at once
+        self.assertEqual(sorted(status for _, status in finished), [Job.QUEUED] + [Job.SUCCEEDED] * 3)
+        self.assertEqual({job_id for job_id, _ in finished}, {job.id for job in queued})
+        self.assertEqual(
+            list(Job.objects.order_by('id').values_list('status', 'result')),
+            [(Job.SUCCEEDED, {'size': 1}), (Job.SUCCEEDED, {'size': 2}), (Job.SUCCEEDED, {'size': 3})],
+        )
+        self.assertEqual(sum(Job.objects.values_list('attempts', flat=True)), 4)
+
+
+@override_settings(VOTING_IDEMPOTENCY_TTL=300, VOTING_IDEMPOTENCY_WAIT=5)
+class IdempotencyTests(SimpleTestCase):
+    """Repeats of a submission get the first response; other sessions, paths and expired keys do not"""
+
+    def setUp(self):
+        idempotency.responses.clear()
+        self.addCleanup(idempotency.responses.clear)
+        self.now = 1000.0
+        clock = mock.patch.object(idempotency, 'time', mock.Mock(monotonic=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.calls = []
+        self.status = 200
+        self.view = idempotency.idempotent(self.receipt)
+
+    def receipt(self, request):
+        self.calls.append(request.path)
+        return HttpResponse(f'receipt {len(self.calls)}', status=self.status)
+
+    def post(self, path='/vote/ballot/', key='key-1', session='session-1'):
+        factory = RequestFactory()
+        factory.cookies[settings.SESSION_COOKIE_NAME] = session
+        return self.view(factory.post(path, {idempotency.FIELD: key}))
+
+    def test_repeat_is_replayed(self):
+        first = self.post()
+        repeat = self.post()
+        self.assertEqual(repeat.content, first.content)
+        self.assertEqual(repeat[idempotency.REPLAY_HEADER], 'true')
+        self.assertFalse(first.has_header(idempotency.REPLAY_HEADER))
+        self.assertEqual(len(self.calls), 1)
+
+    def test_key_is_scoped_to_session_and_path(self):
+        self.post()
+        self.assertEqual(self.post(path='/vote/').content, b'receipt 2')
+        self.assertEqual(self.post(session='session-2').content, b'receipt 3')
+        self.assertEqual(self.post(key='key-2').content, b'receipt 4')
+        self.assertEqual(self.post().content, b'receipt 1')
+        self.assertEqual(self.calls, ['/vote/ballot/', '/vote/', '/vote/ballot/', '/vote/ballot/'])
+
+    def test_expired_key_runs_again(self):
+        self.post()
+        self.now += 299
+        self.assertEqual(self.post().content, b'receipt 1')
+        self.now += 1
+        self.assertEqual(self.post().content, b'receipt 2')
+        self.assertEqual(self.post().content, b'receipt 2')
+
+    def test_server_errors_are_not_replayed(self):
+        self.status = 503
+        self.post()
+        self.status = 200
+        response = self.post()
+        self.assertEqual((response.content, response.status_code), (b'receipt 2', 200))
+        self.assertFalse(response.has_header(idempotency.REPLAY_HEADER))
+
+    def test_duplicate_in_flight_waits_for_the_first(self):
+        entered, release, waiting = threading.Event(), threading.Event(), threading.Event()
+
+        def slow(request):
+            entered.set()
+            release.wait(5)
+            return self.receipt(request)
+
+        class Watched(threading.Event):
+            def wait(self, timeout=None):
+                waiting.set()
+                return super().wait(timeout)
+
+        self.view = idempotency.idempotent(slow)
+        responses = {}
+        first = threading.Thread(target=lambda: responses.setdefault('first', self.post()))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        # Note when the duplicate starts waiting on the running submission
+        (entry,) = idempotency.responses.entries.values()
+        entry.done = Watched()
+        second = threading.Thread(target=lambda: responses.setdefault('second', self.post()))
+        second.start()
+        self.assertTrue(waiting.wait(5))
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(responses['second'].content, responses['first'].content)
+        self.assertEqual(responses['second'][idempotency.REPLAY_HEADER], 'true')
+
+    async def test_async_view_is_replayed(self):
+        async def receipt(request):
+            return self.receipt(request)
+
+        self.view = idempotency.idempotent(receipt)
+        first = await self.post()
+        repeat = await self.post()
+        self.assertEqual((repeat.content, repeat[idempotency.REPLAY_HEADER]), (first.content, 'true'))
+        self.assertEqual(len(self.calls), 1)
+
+
+@override_settings(VOTING_KIOSK_STATIONS={'north': 'north-key'})
+class KioskSignatureTests(SimpleTestCase):
+    """Batches with a missing, wrong or malformed signature are refused before anything is read"""
+
+    def post(self, body, signature, station='north'):
+        return self.client.post(
+            reverse('kiosk_sync'), body, content_type='application/json',
+            headers={kiosk.STATION_HEADER: station, kiosk.SIGNATURE_HEADER: signature},
+        )
+
+    def test_bad_signatures_are_refused(self):
+        body = json.dumps({'batch': '1-1', 'election': 1, 'votes': []})
+        for station, signature in (
+            ('north', ''), ('north', 'f' * 64), ('north', kiosk.sign(body.encode(), 'south-key')),
+            ('south', kiosk.sign(body.encode(), 'north-key')), ('north', 'é' * 64), ('north', '\x00'),
+        ):
+            with self.subTest(station=station, signature=signature):
+                self.assertEqual(self.post(body, signature, station).status_code, 403)
+
+    def test_signed_body_must_be_an_object(self):
+        for body in ('[]', '"batch"', 'not json'):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body, kiosk.sign(body.encode(), 'north-key')).status_code, 400)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class KioskBatchTests(TestCase):
+    """Synced votes are checked against the voting hours they were cast in"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        cls.election = Election.objects.create(
+            election_title='Kiosk Hours', start_time=cls.end - timedelta(hours=8), end_time=cls.end,
+        )
+        cls.roll = seed_election(cls.election, voters=4, voted=0)
+        cls.candidate = cls.election.candidates.order_by('id').first()
+
+    def batch(self, batch_id, *cast_at):
+        votes = [
+            {'phone': voter.phone_number, 'candidate': self.candidate.id, 'position': self.candidate.position,
+             'voted_at': moment.isoformat()}
+            for voter, moment in zip(self.roll, cast_at)
+        ]
+        return kiosk.apply_batch('north', batch_id, self.election, votes)
+
+    def test_votes_cast_while_open_are_kept_after_voting_is_switched_off(self):
+        # Polls closed and the admin turned voting off before the station synced
+        Election.objects.filter(id=self.election.id).update(is_active=False)
+        self.election.refresh_from_db()
+        outcome = self.batch(
+            '1-4', self.end - timedelta(hours=8), self.end - timedelta(minutes=1),
+            self.end - timedelta(hours=8, seconds=1), self.end + timedelta(seconds=1),
+        )
+        self.assertEqual(outcome['accepted'], 2)
+        self.assertEqual(
+            outcome['rejected'],
+            [{'index': 2, 'error': 'Voting was closed when this vote was cast'},
+             {'index': 3, 'error': 'Voting was closed when this vote was cast'}],
+        )
+        self.assertEqual(
+            set(Vote.objects.filter(election=self.election).values_list('voter_id', flat=True)),
+            {self.roll[0].id, self.roll[1].id},
+        )
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class BulkVoterTests(TestCase):
+    """Bulk actions only touch the current election's voters and keep its bookkeeping in step"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Bulk Election')
+        cls.voters = seed_election(cls.election, voters=6, voted=4)
+        cls.other = Election.objects.create(election_title='Other Election')
+        cls.outsiders = seed_election(cls.other, voters=3, voted=2, first_phone=500)
+
+    def setUp(self):
+        session = self.client.session
+        session.update({'is_admin': True, 'election_id': self.election.id})
+        session.save()
+
+    def post(self, payload):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse('bulk_voters'), body, content_type='application/json')
+
+    def minute_rollups(self, election):
+        return VoteRollup.objects.filter(election=election, granularity=VoteRollup.MINUTE).aggregate(
+            votes=Sum('votes'), voters=Sum('new_voters'),
+        )
+
+    def test_ids_of_other_elections_are_ignored(self):
+        ids = [self.voters[0].id, self.outsiders[0].id, self.outsiders[2].id]
+        answer = self.post({'action': 'delete', 'ids': ids}).json()
+        self.assertEqual((answer['matched'], answer['affected'], answer['ids']), (1, 1, [self.voters[0].id]))
+        self.assertEqual(Voter.objects.filter(election=self.other).count(), 3)
+        self.assertEqual(Vote.objects.filter(election=self.other).count(), 6)
+        self.assertEqual(TurnoutCounter.get_count(self.other), 2)
+
+    def test_reset_keeps_the_voter_and_takes_back_their_votes(self):
+        ids = [voter.id for voter in self.voters[:2]]
+        answer = self.post({'action': 'reset', 'ids': ids}).json()
+        self.assertEqual((answer['affected'], answer['total_voters'], answer['voted_count']), (2, 6, 2))
+        self.assertEqual(Voter.objects.filter(id__in=ids, has_voted=False, voted_at=None).count(), 2)
+        self.assertFalse(Vote.objects.filter(voter_id__in=ids).exists())
+        self.assertEqual(TurnoutCounter.get_count(self.election), 2)
+        self.assertEqual(self.minute_rollups(self.election), {'votes': 6, 'voters': 2})
+
+    def test_delete_by_filter_removes_voters_and_their_votes(self):
+        answer = self.post({'action': 'delete', 'filter': {'has_voted': True, 'phone_prefix': '+23270000'}}).json()
+        self.assertEqual(answer['affected'], 4)
+        self.assertEqual(Voter.objects.filter(election=self.election).count(), 2)
+        self.assertFalse(Vote.objects.filter(election=self.election).exists())
+        self.assertEqual(TurnoutCounter.get_count(self.election), 0)
+        self.assertEqual(self.minute_rollups(self.election), {'votes': 0, 'voters': 0})
+        self.assertEqual(Vote.objects.filter(election=self.other).count(), 6)
+
+    def test_verify(self):
+        answer = self.post({'action': 'verify', 'filter': {'is_verified': False}}).json()
+        self.assertEqual(answer['affected'], 6)
+        self.assertEqual(Voter.objects.filter(election=self.election, is_verified=False).count(), 0)
+        self.assertEqual(Voter.objects.filter(election=self.other, is_verified=False).count(), 3)
+
+    def test_bad_requests_change_nothing(self):
+        for payload in (
+            'not json', '[]', '"delete"', {'action': 'drop', 'ids': [1]}, {'action': 'delete'},
+            {'action': 'delete', 'filter': {}}, {'action': 'delete', 'ids': ['1']},
+            {'action': 'delete', 'filter': {'has_voted': 'yes'}}, {'action': 'delete', 'filter': {'nickname': 'x'}},
+            {'action': 'delete', 'filter': {'registered_before': 'yesterday'}},
+            {'action': 'delete', 'filter': {'phone_prefix': ''}}, {'action': 'delete', 'filter': {'phone_prefix': '0'}},
+            {'action': 'delete', 'filter': {'phone_prefix': ' - '}},
+        ):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        self.assertEqual(Voter.objects.count(), 9)
+        self.assertEqual(Vote.objects.count(), 18)
+
+    def test_admins_only(self):
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.post({'action': 'delete', 'ids': [self.voters[0].id]}).status_code, 403)
+        self.assertEqual(Voter.objects.count(), 9)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class RollSyncTests(TestCase):
+    """A roll file is diffed against the election's roll and applied in batches"""
+
+    ROLL = [
+        'phone,name',
+        '+23270000000,Voted and kept',
+        '232 7000 0002',
+        '+23270000002',
+        '+23279999999',
+        '+23279999998,New',
+        'abc',
+        '',
+        '12',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Roll Election')
+        # +23270000000 and +23270000001 have voted
+        cls.voters = seed_election(cls.election, voters=5, voted=2)
+        cls.other = Election.objects.create(election_title='Other Roll Election')
+        seed_election(cls.other, voters=2, voted=0, first_phone=3)
+
+    def test_diff(self):
+        diff = roll_sync.diff_roll(self.election, self.ROLL)
+        self.assertEqual(sorted(diff.to_add), ['+23279999998', '+23279999999'])
+        self.assertEqual(sorted(phone for _, phone in diff.to_remove), ['+23270000003', '+23270000004'])
+        self.assertEqual(diff.protected, [(self.voters[1].id, '+23270000001')])
+        self.assertEqual(diff.unchanged, 2)
+        self.assertEqual(diff.duplicates, 1)
+        # The header is skipped but counts as line 1
+        self.assertEqual(diff.invalid, ['line 7: abc', 'line 9: 12'])
+        self.assertEqual(diff.fingerprint, roll_sync.diff_roll(self.election, list(reversed(self.ROLL[1:]))).fingerprint)
+
+    def test_apply_keeps_voters_who_voted(self):
+        added, removed = roll_sync.apply_diff(roll_sync.diff_roll(self.election, self.ROLL), batch_size=1)
+        self.assertEqual((added, removed), (2, 2))
+        self.assertEqual(
+            sorted(Voter.objects.filter(election=self.election).values_list('phone_number', flat=True)),
+            ['+23270000000', '+23270000001', '+23270000002', '+23279999998', '+23279999999'],
+        )
+        self.assertEqual(Vote.objects.filter(election=self.election).count(), 6)
+        self.assertEqual(Voter.objects.filter(election=self.other).count(), 2)
+
+    def test_apply_removing_voters_who_voted(self):
+        added, removed = roll_sync.apply_diff(roll_sync.diff_roll(self.election, self.ROLL), remove_voted=True)
+        self.assertEqual((added, removed), (2, 3))
+        self.assertFalse(Voter.objects.filter(id=self.voters[1].id).exists())
+        self.assertEqual(Vote.objects.filter(election=self.election).count(), 3)
+        self.assertEqual(TurnoutCounter.get_count(self.election), 1)
+
+    def test_apply_counts_only_voters_it_inserted(self):
+        diff = roll_sync.diff_roll(self.election, self.ROLL)
+        # Registered by hand after the preview
+        Voter.objects.create(election=self.election, phone_number='+23279999999')
+        self.assertEqual(roll_sync.apply_diff(diff), (1, 2))
+        self.assertEqual(Voter.objects.filter(election=self.election, phone_number='+23279999999').count(), 1)
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_EVENTS_DIR=None)
+class SyncRollViewTests(TestCase):
+    """Applying needs the preview's fingerprint to still describe the roll"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Roll View Election')
+        seed_election(cls.election, voters=3, voted=1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.roll_dir = directory.name
+        self.enterContext(override_settings(VOTING_ROLL_SYNC_DIR=self.roll_dir))
+        session = self.client.session
+        session.update({'is_admin': True, 'election_id': self.election.id})
+        session.save()
+
+    def upload(self, text):
+        roll = io.BytesIO(text.encode())
+        roll.name = 'roll.csv'
+        return self.client.post(reverse('sync_roll'), {'roll': roll})
+
+    def test_apply_after_the_roll_changed_shows_the_new_preview(self):
+        fingerprint = self.upload('+23270000000\n+23279999999\n').context['diff'].fingerprint
+        Voter.objects.create(election=self.election, phone_number='+23279999999')
+        response = self.client.post(reverse('sync_roll'), {'action': 'apply', 'fingerprint': fingerprint})
+        self.assertEqual(response.status_code, 200)
+        fresh = response.context['diff']
+        self.assertNotEqual(fresh.fingerprint, fingerprint)
+        self.assertEqual((fresh.to_add, fresh.unchanged), ([], 2))
+        self.assertIn('The roll changed since the preview was shown', [str(m) for m in response.context['messages']][0])
+        self.assertEqual(Voter.objects.filter(election=self.election).count(), 4)
+        self.assertEqual(os.listdir(self.roll_dir), [f'{self.election.id}-{fresh.fingerprint}.csv'])
+
+        response = self.client.post(reverse('sync_roll'), {'action': 'apply', 'fingerprint': fresh.fingerprint})
+        self.assertRedirects(response, reverse('add_voters'), fetch_redirect_response=False)
+        self.assertEqual(Voter.objects.filter(election=self.election).count(), 2)
+        self.assertEqual(os.listdir(self.roll_dir), [])
+
+    def test_unapplied_previews_expire(self):
+        self.upload('+23270000000\n')
+        stale = os.path.join(self.roll_dir, os.listdir(self.roll_dir)[0])
+        os.utime(stale, (0, 0))
+        fingerprint = self.upload('+23270000001\n').context['diff'].fingerprint
+        self.assertEqual(os.listdir(self.roll_dir), [f'{self.election.id}-{fingerprint}.csv'])
+
+
+class ReplicaTests(SimpleTestCase):
+    """Public pages read a fresh snapshot and say how old their data is"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, 'replica.sqlite3')
+        self.enterContext(override_settings(VOTING_REPLICA_PATH=self.path, VOTING_REPLICA_MAX_AGE=30))
+
+    def make_snapshot(self, age=0):
+        with open(self.path, 'w'):
+            pass
+        moment = time.time() - age
+        os.utime(self.path, (moment, moment))
+
+    @staticmethod
+    @replica.public_read
+    def view(request):
+        # QuerySet.db asks the router without running a query
+        return JsonResponse({
+            'voters': Voter.objects.all().db, 'users': User.objects.all().db,
+            'writes': router.db_for_write(Voter), 'age': replica.data_age(),
+        })
+
+    def get(self, view=None):
+        response = (view or self.view)(RequestFactory().get('/'))
+        return response, json.loads(response.content)
+
+    def test_take_snapshot_writes_a_readable_copy(self):
+        source = os.path.join(self.directory, 'primary.sqlite3')
+        with closing(sqlite3.connect(source)) as db, db:
+            db.execute('CREATE TABLE vote (id INTEGER PRIMARY KEY, candidate TEXT)')
+            db.executemany('INSERT INTO vote (candidate) VALUES (?)', [('Ada',), ('Ben',)])
+        before = time.time()
+        replica.take_snapshot(source)
+        with closing(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)) as db:
+            self.assertEqual(db.execute('SELECT candidate FROM vote ORDER BY id').fetchall(), [('Ada',), ('Ben',)])
+        # No temporary copy is left behind
+        self.assertEqual(sorted(os.listdir(self.directory)), ['primary.sqlite3', 'replica.sqlite3'])
+        self.assertLessEqual(os.path.getmtime(self.path), time.time())
+        self.assertGreaterEqual(os.path.getmtime(self.path), before - 1)
+
+    def test_fresh_snapshot_serves_the_apps_reads(self):
+        self.make_snapshot(age=5)
+        response, routed = self.get()
+        self.assertEqual((routed['voters'], routed['users'], routed['writes']), ('replica', 'default', 'default'))
+        self.assertEqual(response['X-Data-Age'], '5')
+        self.assertEqual(int(routed['age']), 5)
+        # Outside a public_read view everything reads the primary
+        self.assertEqual(Voter.objects.all().db, 'default')
+
+    def test_async_views_are_routed_too(self):
+        self.make_snapshot()
+
+        @replica.public_read
+        async def view(request):
+            return JsonResponse({'voters': Voter.objects.all().db})
+
+        response = async_to_sync(view)(RequestFactory().get('/'))
+        self.assertEqual((json.loads(response.content)['voters'], response['X-Data-Age']), ('replica', '0'))
+
+    def test_stale_or_missing_snapshot_reads_live(self):
+        for age in (None, 31):
+            with self.subTest(age=age):
+                if age is not None:
+                    self.make_snapshot(age=age)
+                response, routed = self.get()
+                self.assertEqual((routed['voters'], routed['age']), ('default', None))
+                self.assertEqual(response['X-Data-Age'], 'live')
+        with override_settings(VOTING_REPLICA_PATH=None):
+            self.assertEqual(self.get()[0]['X-Data-Age'], 'live')
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_REPLICA_PATH=None, VOTING_EVENTS_DIR=None)
+class PublisherTests(TestCase):
+    """Static results pages are rendered per election and only when the tallies change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Published Election', is_active=True)
+        cls.voters = seed_election(cls.election, voters=4, voted=2)
+        cls.closed = Election.objects.create(election_title='Closed Election', is_active=False)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+
+    def test_publish_writes_every_active_elections_pages(self):
+        written = publisher.publish(self.root)
+        pages = ['index.html', 'public-results/index.html', 'api/results/index.json']
+        active = Election.objects.filter(is_active=True).values_list('id', flat=True)
+        self.assertIn(self.election.id, active)
+        expected = pages + [f'elections/{election_id}/{page}' for election_id in active for page in pages]
+        self.assertEqual(sorted(str(path.relative_to(self.root)) for path in written), sorted(expected))
+        self.assertEqual(
+            sorted(str(path.relative_to(self.root)) for path in self.root.rglob('*') if path.is_file()), sorted(expected),
+        )
+        self.assertFalse((self.root / 'elections' / str(self.closed.id)).exists())
+        own = self.root / 'elections' / str(self.election.id)
+        self.assertIn('Published Election', (own / 'public-results' / 'index.html').read_text())
+
+        feed = json.loads((own / 'api' / 'results' / 'index.json').read_text())
+        published_at = feed.pop('published_at')
+        self.assertEqual(feed, json.loads(json.dumps(views._results_feed(self.election), cls=DjangoJSONEncoder)))
+        self.assertLessEqual(datetime.fromisoformat(published_at), timezone.now())
+
+    def test_watch_renders_only_when_the_tallies_change(self):
+        candidate = self.election.candidates.order_by('id').first()
+
+        class Clock:
+            """Stands in for the time module: sleeping only moves the clock"""
+            now = 0.0
+            naps = 0
+
+            def monotonic(self):
+                return self.now
+
+            def sleep(self, seconds):
+                self.now += seconds
+                self.naps += 1
+                if self.naps == 2:
+                    _record_vote(test.election, test.voters[-1], candidate, timezone.now())
+                if self.naps == 8:
+                    raise StopIteration
+
+        test, clock, published = self, Clock(), []
+        with mock.patch.object(publisher, 'time', clock), mock.patch.object(publisher, 'publish', return_value=[]):
+            with self.assertRaises(StopIteration):
+                publisher.watch(2, refresh=10, on_publish=lambda written, elapsed: published.append(clock.now))
+        # At once, after the vote, then only when the refresh interval is up
+        self.assertEqual(published, [0, 4, 14])
+
+
+@override_settings(VOTING_TALLY_STORE_PATH=None, VOTING_REPLICA_PATH=None, VOTING_EVENTS_DIR=None)
+class SubmitBallotTests(TestCase):
+    """A whole ballot is checked in full, then written in one go"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Ballot Election')
+        cls.voter = seed_election(cls.election, voters=1, voted=0)[0]
+        cls.candidates = {
+            (candidate.name.split()[0], candidate.position): candidate for candidate in cls.election.candidates.all()
+        }
+
+    def setUp(self):
+        session = self.client.session
+        session.update({'voter_phone': self.voter.phone_number, 'election_id': self.election.id})
+        session.save()
+
+    def submit(self, ballot):
+        return self.client.post(reverse('submit_ballot'), ballot)
+
+    def test_every_problem_is_reported_and_nothing_written(self):
+        response = self.submit({
+            'candidate:Chair': self.candidates['Ada', 'Chair'].id,
+            'candidate:Lady': self.candidates['Ada', 'Secretary'].id,
+            'candidate:Treasurer': self.candidates['Ben', 'Chair'].id,
+        })
+        self.assertTemplateUsed(response, 'vote.html')
+        self.assertEqual(
+            [str(message) for message in response.context['messages']],
+            ['Lady: Candidate not found', '"Treasurer" is not on this ballot.'],
+        )
+        self.assertFalse(Vote.objects.filter(election=self.election).exists())
+        self.assertEqual(TurnoutCounter.get_count(self.election), 0)
+
+    def test_blank_positions_are_abstentions(self):
+        response = self.submit({
+            'candidate:Chair': self.candidates['Ben', 'Chair'].id, 'candidate:Lady': '', 'candidate:Secretary': '',
+        })
+        self.assertEqual([choice['position'] for choice in response.context['choices']], ['Chair'])
+        self.assertEqual(response.context['skipped'], [])
+        self.assertEqual(list(Vote.objects.filter(voter=self.voter).values_list('position', flat=True)), ['Chair'])
+        self.assertEqual(TurnoutCounter.get_count(self.election), 1)
+        # A ballot of abstentions only is refused
+        response = self.submit({'candidate:Lady': ''})
+        self.assertEqual(
+            [str(message) for message in response.context['messages']], ['Choose a candidate in at least one position'],
+        )
+
+    def test_ballot_is_inserted_in_one_statement(self):
+        ballot = {f'candidate:{position}': self.candidates['Cy', position].id for position in ('Chair', 'Lady', 'Secretary')}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.submit(ballot)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith(f'INSERT INTO "{Vote._meta.db_table}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(response.context['choices']), 3)
+        self.assertEqual(Vote.objects.filter(voter=self.voter).count(), 3)
+
+    def test_position_voted_meanwhile_is_skipped_and_the_rest_recorded(self):
+        # Another request records a Chair vote after this one looked, so its
+        # first insert fails on the one-vote-per-position constraint
+        _record_vote(self.election, self.voter, self.candidates['Ada', 'Chair'], timezone.now())
+        real_filter, looked = Vote.objects.filter, []
+
+        def filter_once(*args, **kwargs):
+            if not looked:
+                looked.append(True)
+                return Vote.objects.none()
+            return real_filter(*args, **kwargs)
+
+        ballot = {'candidate:Chair': self.candidates['Ben', 'Chair'].id, 'candidate:Lady': self.candidates['Ben', 'Lady'].id}
+        with mock.patch.object(views, '_insert_ballot', wraps=views._insert_ballot) as insert:
+            with mock.patch.object(Vote.objects, 'filter', side_effect=filter_once):
+                response = self.submit(ballot)
+        self.assertEqual(insert.call_count, 2)
+        self.assertEqual(response.context['skipped'], ['Chair'])
+        self.assertEqual([choice['position'] for choice in response.context['choices']], ['Lady'])
+        self.assertEqual(
+            sorted(Vote.objects.filter(voter=self.voter).values_list('position', 'candidate__name')),
+            [('Chair', 'Ada Chair'), ('Lady', 'Ben Lady')],
+        )
+        self.assertEqual(TurnoutCounter.get_count(self.election), 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked against SQLite')
+@override_settings(VOTING_TALLY_STORE_PATH=None)
+class QueryPlanTests(TestCase):
+    """Hot queries must be served by indexes and never sort a whole table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.election = Election.objects.create(election_title='Plan Election')
+        cls.voters = seed_election(cls.election, voters=20, voted=10)
+        cls.voter = cls.voters[0]
+
+    def assertIndexed(self, queryset, allow_sort=False):
+        plan = queryset.explain()
+        self.assertNotRegex(plan, r'\bSCAN\b', f'full scan in plan:\n{plan}')
+        if not allow_sort:
+            self.assertNotIn('TEMP B-TREE', plan, f'sort in plan:\n{plan}')
+
+    def test_admin_phone_search(self):
+        self.assertIndexed(Voter.objects.filter(**phone_prefix_filter('phone_number', '+2328')), allow_sort=True)
+
+    def test_voter_lookup(self):
+        self.assertIndexed(Voter.objects.filter(election=self.election, phone_number=self.voter.phone_number))
+
+    def test_voter_list_default_ordering(self):
+        self.assertIndexed(Voter.objects.filter(election=self.election))
+
+    def test_per_position_vote_check(self):
+        self.assertIndexed(Vote.objects.filter(election=self.election, voter=self.voter, position='Chair'))
+
+    def test_results_aggregation(self):
+        # Sorting the aggregated candidate rows is expected; the votes must
+        # still be reached through an index
+        self.assertIndexed(
+            Candidate.objects.filter(election=self.election)
+            .annotate(votes_count=Count('vote')).order_by('position', '-votes_count', 'name'),
+            allow_sort=True,
+        )
+
+    def test_vote_log_export(self):
+        self.assertIndexed(Vote.objects.filter(election=self.election).select_related('voter', 'candidate').order_by('-voted_at'))
+        self.assertIndexed(Vote.objects.filter(election=self.election))
+        self.assertIndexed(Vote.objects.filter(election=self.election).order_by('voted_at').values_list('voted_at')[:1])
+
+    def test_incremental_export(self):
+        self.assertIndexed(
+            Vote.objects.filter(election=self.election, id__gt=5).order_by('id')
+            .values_list('id', 'voted_at', 'voter__phone_number', 'candidate_id', 'candidate__name', 'position')
+        )
+
+
+class ImportTimeTests(SimpleTestCase):
+    """Starting a worker must not pay for dependencies only a few views use"""
+
+    # Checked by what gets imported rather than by how long it takes, which
+    # depends too much on the machine and its load to assert on
+    LAZY_PACKAGES = ('reportlab',)
+
+    def import_times(self):
+        code = f'import django; django.setup(); import {settings.ROOT_URLCONF}'
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Voting.settings')}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and not line.endswith('imported package'):
+                _, cumulative, name = line[len('import time:'):].split('|')
+                times[name.strip()] = int(cumulative)
+        return times
+
+    def test_export_dependencies_are_imported_lazily(self):
+        times = self.import_times()
+        self.assertIn('VotingApp.views', times)
+        eager = sorted(name for name in times if name.split('.')[0] in self.LAZY_PACKAGES)
+        self.assertEqual(eager, [], 'imported at startup')
@@ -1,32 +1,370 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login
 from django.contrib.auth.models import User
-from .models import Voter, Candidate, Vote, AdminUser, ElectionSettings
+from django.conf import settings as django_settings
+from .models import (
+    Voter, Candidate, Vote, AdminUser, Election, TurnoutCounter, VoteRollup, AuditHead, AuditEntry, AuditCheckpoint,
+    RankedPosition, RankedBallot, Job,
+)
+from . import admission, anomaly, events, idempotency, merkle, otp, ranked, replica, roll_sync, tally_store
+from .exports import incremental
 from django.core.exceptions import ValidationError
+from django.db import transaction, IntegrityError
 from django.db.models import Count
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import pytz
 from datetime import datetime
-import csv
-from io import BytesIO
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+import hmac
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
 
-def landing_page(request):
-    """Landing page for the chairperson election with real-time results"""
+
+def _current_election(request):
+    """The election a request is about.
+
+    ``?election=<id>`` selects an election and remembers it in the session;
+    otherwise the session's choice is used, falling back to the newest
+    active election.
+    """
+    requested = request.GET.get('election')
+    election_id = requested or request.session.get('election_id')
+    election = None
+    if election_id and str(election_id).isdigit():
+        election = Election.objects.filter(id=election_id).first()
+    if election is None:
+        election = Election.get_default()
+    if requested and request.session.get('election_id') != election.id:
+        request.session['election_id'] = election.id
+    return election
+
+
+def _voting_closed_message(settings, now, on_ballot=False):
+    """Return why voting is closed right now, or None while it is open"""
+    if not settings.is_active:
+        return 'Voting is currently disabled by the administrator.' if on_ballot else 'Voting is currently disabled.'
+    if settings.start_time and now < settings.start_time:
+        return f'Voting has not started yet. Please come back after {settings.start_time.strftime("%B %d, %Y at %I:%M %p")}.'
+    if settings.end_time and now > settings.end_time:
+        message = f'Voting has ended on {settings.end_time.strftime("%B %d, %Y at %I:%M %p")}.'
+        return f'{message} Thank you for your interest.' if on_ballot else message
+    return None
+
+
+def _summarize_results(candidates, total_votes, total_voters, voters_voted):
+    """Build the overall and per-position rows shared by the results views.
+
+    ``candidates`` must already be annotated with ``votes_count`` and ordered
+    by ``-votes_count, name``.
+    """
+    turnout_pct = round((voters_voted / total_voters) * 100, 2) if total_voters else 0
+
+    overall = []
+    for c in candidates:
+        percent = round((c.votes_count / total_votes) * 100, 2) if total_votes else 0
+        overall.append({'name': c.name, 'position': c.position, 'votes': c.votes_count, 'percentage': percent})
+
+    # Group by position
+    by_section = {}
+    for c in candidates:
+        by_section.setdefault(c.position, []).append(c)
+
+    grouped_sections = []
+    for position, items in by_section.items():
+        section_total = sum(i.votes_count for i in items)
+        items_sorted = sorted(items, key=lambda x: (-x.votes_count, x.name))
+        section_rows = [
+            {
+                'name': i.name,
+                'votes': i.votes_count,
+                'percentage': round((i.votes_count / section_total) * 100, 2) if section_total else 0,
+            }
+            for i in items_sorted
+        ]
+        grouped_sections.append({
+            'position': position,
+            'total': section_total,
+            'rows': section_rows,
+        })
+
+    return {
+        'turnout_pct': turnout_pct,
+        'overall': overall,
+        'grouped_sections': grouped_sections,
+    }
+
+
+def _duration_hours(first_vote_time):
+    """Approximate duration from the first vote to now"""
+    if first_vote_time is None:
+        return 0
+    return int((timezone.now() - first_vote_time).total_seconds() // 3600)
+
+
+def _group_ballot(candidates, contests=(), voted=()):
+    """Group candidates by position for the ballot page.
+
+    Returns one section per position; ``ranked`` holds the position's
+    :class:`RankedPosition` when voters rank its candidates and ``voted``
+    is set for positions in ``voted``, which the voter has already voted in.
+    """
+    ranked = {contest.position: contest for contest in contests}
+    voted = set(voted)
+    grouped = {}
+    for c in candidates:
+        grouped.setdefault(c.position, []).append(c)
+    return [
+        {'position': position, 'candidates': items, 'ranked': ranked.get(position), 'voted': position in voted}
+        for position, items in grouped.items()
+    ]
+
+
+def _check_ranking(raw_ids, candidates):
+    """Candidates in the order ``raw_ids`` ranks them; blank choices are skipped.
+
+    ``candidates`` maps the position's candidate ids (as strings) to
+    candidates. Raises ValidationError for an empty, repeated or unknown choice.
+    """
+    chosen = [raw for raw in raw_ids if raw]
+    if not chosen:
+        raise ValidationError('Rank at least one candidate')
+    if len(set(chosen)) != len(chosen):
+        raise ValidationError('Each candidate can only be ranked once')
+    if not all(raw in candidates for raw in chosen):
+        raise ValidationError('Candidate not found')
+    return [candidates[raw] for raw in chosen]
+
+
+def _ranked_choice(election, position, raw_ids):
+    """Resolve a ranked ballot form to ``(contest, candidates)``, most preferred first.
+
+    Raises ValidationError when the position is not ranked or the choices
+    are empty, repeated or unknown.
+    """
+    contest = RankedPosition.objects.filter(election=election, position=position).first()
+    if contest is None:
+        raise ValidationError('This position is not ranked')
+    candidates = {str(c.id): c for c in Candidate.objects.filter(election=election, position=position)}
+    return contest, _check_ranking(raw_ids, candidates)
+
+
+def _ballot_choices(election, data):
+    """Read a whole-ballot form into ``[(candidate, ranking), ...]``.
+
+    The form sends ``candidate:<position>`` with a candidate id for plurality
+    positions and ``rank:<position>`` with ids in order of preference for
+    ranked ones; ``ranking`` is ``(contest, candidate_ids)`` for those and
+    None otherwise. Positions left blank are abstentions. Every choice is
+    checked before anything is recorded: raises ValidationError listing all
+    problems, or when the ballot is empty.
+    """
+    by_position = {}
+    for c in Candidate.objects.filter(election=election):
+        by_position.setdefault(c.position, {})[str(c.id)] = c
+    contests = {contest.position: contest for contest in RankedPosition.objects.filter(election=election)}
+
+    choices = []
+    errors = []
+    for key in data:
+        kind, _, position = key.partition(':')
+        if kind not in ('candidate', 'rank'):
+            continue
+        candidates = by_position.get(position)
+        if candidates is None:
+            errors.append(f'"{position}" is not on this ballot.')
+        elif kind == 'rank':
+            if position not in contests:
+                errors.append(f'"{position}" is not a ranked position.')
+                continue
+            if not any(data.getlist(key)):
+                continue
+            try:
+                ranking = _check_ranking(data.getlist(key), candidates)
+            except ValidationError as e:
+                errors.append(f'{position}: {e.message}')
+            else:
+                choices.append((ranking[0], (contests[position], [c.id for c in ranking])))
+        elif position in contests:
+            errors.append(f'"{position}" needs candidates ranked in order of preference.')
+        elif data[key]:
+            if data[key] not in candidates:
+                errors.append(f'{position}: Candidate not found')
+            else:
+                choices.append((candidates[data[key]], None))
+    if errors:
+        raise ValidationError(errors)
+    if not choices:
+        raise ValidationError('Choose a candidate in at least one position')
+    return choices
+
+
+def _ordering_key(ordering):
+    """Sort key equivalent to ``order_by(*ordering)`` on candidate objects"""
+    def key(c):
+        return tuple(-getattr(c, f[1:]) if f.startswith('-') else getattr(c, f) for f in ordering)
+    return key
+
+
+def _apply_tallies(candidates, snapshot, ordering):
+    for c in candidates:
+        c.votes_count = snapshot.counts.get(c.id, 0)
+    candidates.sort(key=_ordering_key(ordering))
+    return candidates
+
+
+def _candidate_tallies(election, *ordering):
+    """Return ``(candidates, total_votes, voters_voted)`` for an election's results.
+
+    Counts come from the shared tally store when it is enabled, so reading
+    results never aggregates the Vote table; otherwise they are counted in SQL.
+    Each candidate gets a ``votes_count`` attribute and the list is sorted by
+    ``ordering`` (e.g. ``'position', '-votes_count', 'name'``).
+    """
+    snapshot = tally_store.get_snapshot()
+    if snapshot is None:
+        candidates = list(
+            Candidate.objects.filter(election=election).annotate(votes_count=Count('vote')).order_by(*ordering)
+        )
+        return candidates, sum(c.votes_count for c in candidates), TurnoutCounter.get_count(election)
+    candidates = _apply_tallies(list(Candidate.objects.filter(election=election)), snapshot, ordering)
+    return candidates, sum(c.votes_count for c in candidates), snapshot.turnout_for(election.id)
+
+
+def _ranked_results(election):
+    """Round-by-round counts of an election's ranked positions.
+
+    One entry per position with a row per candidate (their tally in each
+    round, None once out of the count) for the results page and reports.
+    """
+    results = []
+    for contest in RankedPosition.objects.filter(election=election).order_by('position'):
+        count, candidates = contest.count()
+        eliminated = {index: r.number for r in count.rounds for index in r.eliminated}
+        elected = {index: r.number for r in count.rounds for index in r.elected}
+        rows = []
+        for index, candidate in enumerate(candidates):
+            if candidate is None:
+                continue
+            if index in elected:
+                status = f'Elected in round {elected[index]}'
+            elif index in eliminated:
+                status = f'Eliminated in round {eliminated[index]}'
+            else:
+                status = ''
+            # Elected candidates first, then the rest by how long they lasted
+            order = (
+                count.elected.index(index) if index in elected else len(candidates),
+                -eliminated.get(index, len(count.rounds) + 1),
+            )
+            rows.append((order, {
+                'name': candidate.name,
+                'elected': index in elected,
+                'votes': [ranked.votes(r.tallies[index]) for r in count.rounds],
+                'status': status,
+            }))
+        rows = [row for _, row in sorted(rows, key=lambda item: item[0])]
+        results.append({
+            'position': contest.position,
+            'method': contest.get_method_display(),
+            'seats': count.seats,
+            'ballots': count.ballots,
+            'quota': ranked.votes(count.quota) if count.method == RankedPosition.STV else None,
+            'rounds': [r.number for r in count.rounds],
+            'exhausted': [ranked.votes(r.exhausted) for r in count.rounds],
+            'rows': rows,
+            'elected': [candidates[index].name for index in count.elected],
+        })
+    return results
+
+
+def _record_ballot(election, voter, choices, now, client_ip=''):
+    """Record a voter's choices in several positions in one transaction.
+
+    ``choices`` holds ``(candidate, ranking)`` pairs as returned by
+    :func:`_ballot_choices`. Votes, audit entries and ranked ballots are
+    bulk inserted and the turnout, rollup and tally bookkeeping is done once
+    for the whole ballot, and the ballot is fed to the anomaly detector
+    along with ``client_ip``. Returns ``(recorded, skipped)``: the choices
+    recorded and the positions skipped because the voter already voted there.
+    """
+    try:
+        return _insert_ballot(election, voter, choices, now, client_ip)
+    except IntegrityError:
+        # A concurrent request recorded this voter's vote in one of the
+        # positions first and nothing of this ballot was written. Going again
+        # re-reads the positions already voted, skips them and records the
+        # rest; should yet another request win the race, the error is raised.
+        return _insert_ballot(election, voter, choices, now, client_ip)
+
+
+def _insert_ballot(election, voter, choices, now, client_ip):
+    with transaction.atomic():
+        # Enforce one vote per section/position
+        voted = set(
+            Vote.objects.filter(
+                election=election, voter=voter, position__in=[candidate.position for candidate, _ in choices],
+            ).values_list('position', flat=True)
+        )
+        skipped = [candidate.position for candidate, _ in choices if candidate.position in voted]
+        choices = [(candidate, ranking) for candidate, ranking in choices if candidate.position not in voted]
+        if not choices:
+            return [], skipped
+        votes = Vote.objects.bulk_create([
+            Vote(election=election, voter=voter, candidate=candidate, position=candidate.position)
+            for candidate, _ in choices
+        ])
+        AuditHead.append_many(votes)
+        # Noted under the audit lock, so a rebuild that already counted these votes is told apart
+        generation = tally_store.generation()
+        ranked_votes = [(vote, *ranking) for vote, (_, ranking) in zip(votes, choices) if ranking is not None]
+        if ranked_votes:
+            RankedBallot.record(ranked_votes)
+        # Mark that the voter has participated at least once; only the
+        # request that actually flips the flag bumps the turnout counter
+        first_vote = bool(Voter.objects.filter(pk=voter.pk, has_voted=False).update(has_voted=True, voted_at=now))
+        if first_vote:
+            TurnoutCounter.increment(election)
+        VoteRollup.record_many(election, votes[0].voted_at, [vote.position for vote in votes], new_voter=first_vote)
+        for vote in votes:
+            events.vote_cast(vote, voter.phone_number)
+
+        def publish():
+            for index, (candidate, _) in enumerate(choices):
+                tally_store.record_vote(
+                    candidate.id, election.id, new_voter=first_vote and index == 0, generation=generation,
+                )
+            anomaly.detector.record_ballot(
+                election.id, voter.phone_number, client_ip,
+                [(candidate.id, candidate.name, candidate.position) for candidate, _ in choices],
+            )
+        transaction.on_commit(publish)
+    return choices, skipped
+
+
+def _record_vote(election, voter, candidate, now, ranking=None, client_ip=''):
+    """Record one vote along with the turnout and rollup bookkeeping.
+
+    For a ranked position pass ``ranking=(contest, candidate_ids)``, with
+    ``candidate`` the first preference. Returns False when the voter has
+    already voted in the candidate's position.
+    """
+    recorded, _ = _record_ballot(election, voter, [(candidate, ranking)], now, client_ip)
+    return bool(recorded)
+
+
+def _landing_context(election):
+    """Template context of the landing page, without the request-specific parts"""
     # Get all candidates with their vote counts
-    candidates_qs = Candidate.objects.annotate(votes_count=Count('vote')).order_by('position', '-votes_count', 'name')
-    
-    # Calculate total votes cast
-    total_votes = Vote.objects.count()
-    total_voters = Voter.objects.count()
+    candidates_qs, total_votes, _ = _candidate_tallies(election, 'position', '-votes_count', 'name')
+    total_voters = Voter.objects.filter(election=election).count()
     
     # Build candidate list with percentages and group by position
     candidates_by_position = {}
@@ -68,7 +406,7 @@ def landing_page(request):
             }
     
     # Get election settings
-    settings = ElectionSettings.get_settings()
+    settings = election
     
     # Determine election status
     now = timezone.now()
@@ -86,165 +424,279 @@ def landing_page(request):
         'end_time': settings.end_time,
         'start_time': settings.start_time,
         'timezone_name': settings.timezone,
-        'candidate_count': candidates_qs.count(),
+        'candidate_count': len(candidates_qs),
         'candidates_by_position': candidates_by_position,
         'total_votes': total_votes,
         'total_voters': total_voters,
         'winners': winners,
     }
+    return context
+
+
+@replica.public_read
+def landing_page(request):
+    """Landing page for the chairperson election with real-time results"""
+    context = _landing_context(_current_election(request))
+    context['data_age'] = replica.data_age()
     return render(request, 'landing.html', context)
 
 def login_page(request):
     """Login page for phone number entry"""
     # Check election settings
-    settings = ElectionSettings.get_settings()
-    now = timezone.now()
-    
-    # Check if voting is active
-    if not settings.is_active:
-        messages.error(request, 'Voting is currently disabled.')
-        return redirect('landing')
-    
-    # Check if voting has started
-    if settings.start_time and now < settings.start_time:
-        messages.error(request, f'Voting has not started yet. Please come back after {settings.start_time.strftime("%B %d, %Y at %I:%M %p")}.')
-        return redirect('landing')
-    
-    # Check if voting has ended
-    if settings.end_time and now > settings.end_time:
-        messages.error(request, f'Voting has ended on {settings.end_time.strftime("%B %d, %Y at %I:%M %p")}.')
+    election = _current_election(request)
+    closed = _voting_closed_message(election, timezone.now())
+    if closed:
+        messages.error(request, closed)
         return redirect('landing')
     
     if request.method == 'POST':
         phone = request.POST.get('phone_number', '').strip()
         normalized = Voter.normalize_phone_number(phone)
-        voter = Voter.objects.filter(phone_number=normalized).first()
+        voter = Voter.objects.filter(election=election, phone_number=normalized).first()
+        anomaly.detector.record_login(election.id, normalized, anomaly.client_ip(request), on_roll=voter is not None)
         if voter:
-            request.session['voter_phone'] = voter.phone_number
-            return redirect('vote')
+            request.session['election_id'] = election.id
+            if not otp.enabled():
+                request.session['voter_phone'] = voter.phone_number
+                return redirect('vote')
+            request.session['otp_phone'] = voter.phone_number
+            if not otp.issue(election, voter.phone_number):
+                messages.info(request, 'A code was sent a moment ago. Please use that one or try again shortly.')
+            return redirect('login_verify')
         messages.error(request, 'Phone number not found. Please contact admin.')
     return render(request, 'login.html')
 
+
+def _masked_phone(phone):
+    return phone[:4] + '•' * max(0, len(phone) - 6) + phone[-2:]
+
+
+def _complete_login(request, phone):
+    """Finish an OTP login: the session now belongs to this voter"""
+    request.session.cycle_key()
+    request.session.pop('otp_phone', None)
+    request.session['voter_phone'] = phone
+
+
+@require_http_methods(["GET", "POST"])
+def login_verify(request):
+    """Second login step: the code sent to the voter by SMS"""
+    phone = request.session.get('otp_phone')
+    if not phone:
+        return redirect('login')
+    election = _current_election(request)
+    closed = _voting_closed_message(election, timezone.now())
+    if closed:
+        messages.error(request, closed)
+        return redirect('landing')
+
+    if request.method == 'POST':
+        if request.POST.get('action') == 'resend':
+            if otp.issue(election, phone):
+                messages.success(request, 'A new code is on its way.')
+            else:
+                messages.info(request, 'Please wait a little before asking for another code.')
+        elif otp.verify(election, phone, request.POST.get('code', '')):
+            Voter.objects.filter(election=election, phone_number=phone, is_verified=False).update(is_verified=True)
+            _complete_login(request, phone)
+            return redirect('vote')
+        else:
+            messages.error(request, 'That code is wrong or has expired.')
+    return render(request, 'login.html', {'otp_phone': _masked_phone(phone)})
+
 def results_page(request):
     """Results page showing election results - Admin only"""
     if not request.session.get('is_admin'):
         return render(request, 'admin_login.html')
 
-    # Overall totals
-    total_votes = Vote.objects.count()
-    total_voters = Voter.objects.count()
-    unique_voters_voted = Vote.objects.values('voter_id').distinct().count()
-    turnout_pct = round((unique_voters_voted / total_voters) * 100, 2) if total_voters else 0
+    election = _current_election(request)
 
-    # Candidates annotated with vote counts
-    candidates_qs = Candidate.objects.annotate(votes_count=Count('vote')).order_by('-votes_count', 'name')
+    # Candidates with vote counts, plus overall totals
+    candidates, total_votes, voters_voted = _candidate_tallies(election, '-votes_count', 'name')
+    total_voters = Voter.objects.filter(election=election).count()
+    summary = _summarize_results(candidates, total_votes, total_voters, voters_voted)
 
     # Winner (overall top by votes)
-    top_candidate = candidates_qs.first()
-    winner_name = top_candidate.name if top_candidate else '—'
+    winner_name = candidates[0].name if candidates else '—'
 
-    # Build overall list with percentage (out of overall total)
-    overall = []
-    for c in candidates_qs:
-        percent = round((c.votes_count / total_votes) * 100, 2) if total_votes else 0
-        overall.append({'name': c.name, 'votes': c.votes_count, 'percentage': percent})
-
-    # Group by position
-    by_section = {}
-    for c in candidates_qs:
-        by_section.setdefault(c.position, []).append(c)
+    first_vote_time = Vote.objects.filter(election=election).order_by('voted_at').values_list('voted_at', flat=True).first()
 
-    grouped_sections = []
-    for position, items in by_section.items():
-        section_total = sum(i.votes_count for i in items)
-        items_sorted = sorted(items, key=lambda x: (-x.votes_count, x.name))
-        section_rows = [
-            {
-                'name': i.name,
-                'votes': i.votes_count,
-                'percentage': round((i.votes_count / section_total) * 100, 2) if section_total else 0,
-            }
-            for i in items_sorted
-        ]
-        grouped_sections.append({
-            'position': position,
-            'total': section_total,
-            'rows': section_rows,
-        })
-
-    # Approximate duration from first vote to now
-    try:
-        first_vote_time = Vote.objects.earliest('voted_at').voted_at
-        duration_hours = int((timezone.now() - first_vote_time).total_seconds() // 3600)
-    except Vote.DoesNotExist:
-        duration_hours = 0
+    # Time-bucketed charts are served from the rollup table, so their cost
+    # depends on the number of buckets rather than the number of votes
+    timeline = {
+        'minute': VoteRollup.timeline(election, VoteRollup.MINUTE),
+        'hour': VoteRollup.timeline(election, VoteRollup.HOUR),
+    }
 
     context = {
-        'election_title': 'Chairperson Election 2024',
+        'election_title': election.election_title,
         'winner': winner_name,
         'total_votes': total_votes,
-        'candidate_count': candidates_qs.count(),
-        'turnout_pct': turnout_pct,
-        'duration_hours': duration_hours,
-        'overall': overall,
-        'grouped_sections': grouped_sections,
+        'candidate_count': len(candidates),
+        'duration_hours': _duration_hours(first_vote_time),
+        'timeline': timeline,
+        'ranked_results': _ranked_results(election),
+        **summary,
     }
     return render(request, 'results.html', context)
 
 
+def _public_results_context(election):
+    candidates, total_votes, voters_voted = _candidate_tallies(election, '-votes_count', 'name')
+    total_voters = Voter.objects.filter(election=election).count()
+    first_vote_time = Vote.objects.filter(election=election).order_by('voted_at').values_list('voted_at', flat=True).first()
+    return {
+        'election_title': election.election_title,
+        'total_votes': total_votes,
+        'candidate_count': len(candidates),
+        'duration_hours': _duration_hours(first_vote_time),
+        **_summarize_results(candidates, total_votes, total_voters, voters_voted),
+    }
+
+
+@replica.public_read
 def public_results(request):
     """Public read-only results page (no admin session required)"""
-    total_votes = Vote.objects.count()
-    total_voters = Voter.objects.count()
-    unique_voters_voted = Vote.objects.values('voter_id').distinct().count()
-    turnout_pct = round((unique_voters_voted / total_voters) * 100, 2) if total_voters else 0
-    candidates_qs = Candidate.objects.annotate(votes_count=Count('vote')).order_by('-votes_count', 'name')
+    context = _public_results_context(_current_election(request))
+    context['data_age'] = replica.data_age()
+    return render(request, 'public_results.html', context)
 
-    overall = []
-    for c in candidates_qs:
-        percent = round((c.votes_count / total_votes) * 100, 2) if total_votes else 0
-        overall.append({'name': c.name, 'position': c.position, 'votes': c.votes_count, 'percentage': percent})
 
-    # Group by position
-    by_section = {}
-    for c in candidates_qs:
-        by_section.setdefault(c.position, []).append(c)
+def _results_feed(election):
+    candidates, total_votes, voters_voted = _candidate_tallies(election, '-votes_count', 'name')
+    total_voters = Voter.objects.filter(election=election).count()
+    summary = _summarize_results(candidates, total_votes, total_voters, voters_voted)
+    return {
+        'election': {'id': election.id, 'title': election.election_title},
+        'total_votes': total_votes,
+        'total_voters': total_voters,
+        'voters_voted': voters_voted,
+        'turnout_pct': summary['turnout_pct'],
+        'positions': summary['grouped_sections'],
+    }
 
-    grouped_sections = []
-    for position, items in by_section.items():
-        section_total = sum(i.votes_count for i in items)
-        items_sorted = sorted(items, key=lambda x: (-x.votes_count, x.name))
-        section_rows = [
-            {
-                'name': i.name,
-                'votes': i.votes_count,
-                'percentage': round((i.votes_count / section_total) * 100, 2) if section_total else 0,
-            }
-            for i in items_sorted
-        ]
-        grouped_sections.append({
-            'position': position,
-            'total': section_total,
-            'rows': section_rows,
-        })
 
-    # Approximate duration from first vote to now
-    try:
-        first_vote_time = Vote.objects.earliest('voted_at').voted_at
-        duration_hours = int((timezone.now() - first_vote_time).total_seconds() // 3600)
-    except Vote.DoesNotExist:
-        duration_hours = 0
+@replica.public_read
+def results_api(request):
+    """Public JSON results feed"""
+    feed = _results_feed(_current_election(request))
+    feed['data_age'] = replica.data_age()
+    return JsonResponse(feed)
 
-    context = {
-        'election_title': 'Chairperson Election 2024',
-        'total_votes': total_votes,
-        'candidate_count': candidates_qs.count(),
-        'turnout_pct': turnout_pct,
-        'duration_hours': duration_hours,
-        'overall': overall,
-        'grouped_sections': grouped_sections,
-    }
-    return render(request, 'public_results.html', context)
+def audit_root(request, election_id):
+    """Public head of an election's vote log and its published checkpoints"""
+    head = AuditHead.objects.filter(election_id=election_id).first()
+    if head is None:
+        return JsonResponse({'error': 'Election not found'}, status=404)
+    checkpoints = AuditCheckpoint.objects.filter(election_id=election_id)[:20]
+    return JsonResponse({
+        'election': election_id,
+        'size': head.size,
+        'root_hash': head.root_hash,
+        'chain_hash': head.chain_hash,
+        'checkpoints': [
+            {'size': c.size, 'root_hash': c.root_hash, 'chain_hash': c.chain_hash, 'published_at': c.published_at.isoformat()}
+            for c in checkpoints
+        ],
+    })
+
+
+def audit_consistency(request, election_id):
+    """Proof that the log at ``?first=`` entries (a published checkpoint, say) is a prefix of the log at ``?second=``.
+
+    ``second`` defaults to the current size. Only hashes are returned, so
+    anyone holding an earlier root can check that no vote was removed or
+    rewritten since.
+    """
+    head = AuditHead.objects.filter(election_id=election_id).first()
+    if head is None:
+        return JsonResponse({'error': 'Election not found'}, status=404)
+    first, second = request.GET.get('first', ''), request.GET.get('second', str(head.size))
+    if not first.isdigit() or not second.isdigit() or not 0 < int(first) <= int(second) <= head.size:
+        return JsonResponse({'error': f'first and second must satisfy 0 < first <= second <= {head.size}'}, status=400)
+
+    proof, first_root, second_root = head.consistency(int(first), int(second))
+    return JsonResponse({
+        'election': election_id,
+        'first': int(first),
+        'second': int(second),
+        'first_root': first_root.hex(),
+        'second_root': second_root.hex(),
+        'proof': [digest.hex() for digest in proof],
+        'verified': merkle.verify_consistency(int(first), int(second), proof, first_root, second_root),
+    })
+
+
+def audit_proof(request, vote_id):
+    """Merkle inclusion proof for one vote - Admin only.
+
+    ``?tree_size=N`` proves the vote against an earlier published root.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({'error': 'Admin login required'}, status=403)
+    entry = AuditEntry.objects.filter(vote_id=vote_id).first()
+    if entry is None:
+        return JsonResponse({'error': 'Vote not found in the audit log'}, status=404)
+    head = AuditHead.objects.get(election_id=entry.election_id)
+    size = request.GET.get('tree_size', str(head.size))
+    if not size.isdigit() or not entry.seq < int(size) <= head.size:
+        return JsonResponse({'error': f'tree_size must be between {entry.seq + 1} and {head.size}'}, status=400)
+
+    path, root = head.proof(entry, int(size))
+    return JsonResponse({
+        'election': entry.election_id,
+        'seq': entry.seq,
+        'tree_size': int(size),
+        'leaf': {
+            'vote': entry.vote_ref,
+            'voter': entry.voter_ref,
+            'candidate': entry.candidate_ref,
+            'position': entry.position,
+            'voted_at': entry.voted_at.isoformat(),
+            'hash': entry.leaf_hash,
+        },
+        'path': [digest.hex() for digest in path],
+        'root_hash': root.hex(),
+        'verified': merkle.verify_inclusion(bytes.fromhex(entry.leaf_hash), entry.seq, int(size), path, root),
+    })
+
+
+@require_http_methods(["GET"])
+def queue_status(request):
+    """Waiting room poll: is it this ticket's turn yet? Touches neither the database nor the session"""
+    payload, pass_token = admission.check_ticket(request.GET.get('ticket', ''))
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'no-store'
+    if pass_token:
+        response.set_cookie(
+            admission.PASS_COOKIE, pass_token, max_age=getattr(django_settings, 'VOTING_ADMISSION_PASS_TTL', 60),
+            httponly=True, samesite='Lax', secure=request.is_secure(),
+        )
+    return response
+
+
+def anomalies(request):
+    """Recent anomaly alerts and the busiest senders of this worker process - Admin only"""
+    if not request.session.get('is_admin'):
+        messages.error(request, 'Please login as admin to access this page')
+        return redirect('admin_login')
+    alerts = [
+        {**alert._asdict(), 'at': datetime.fromtimestamp(alert.at, tz=pytz.utc)}
+        for alert in anomaly.detector.recent_alerts()
+    ]
+    return render(request, 'anomalies.html', {
+        'alerts': alerts,
+        'busiest': anomaly.detector.busiest(),
+        'enabled': anomaly.enabled(),
+        'pid': os.getpid(),
+    })
+
+
+def admission_stats(request):
+    """In-flight requests and waiting room depth of this worker process - Admin only"""
+    if not request.session.get('is_admin'):
+        return JsonResponse({'error': 'Admin login required'}, status=403)
+    return JsonResponse({'pid': os.getpid(), 'lanes': admission.stats()})
 
 def admin_login(request):
     """Admin login page - supports email or username"""
@@ -281,6 +733,44 @@ def admin_logout(request):
     request.session.pop('is_admin', None)
     return redirect('admin_login')
 
+
+IMPORT_REPORT_EVERY = 100
+
+
+def _import_voters(election, phone_list, report=None):
+    """Register each phone number on ``election``'s roll; return ``(added, errors)``.
+
+    ``report(done, total)`` is called every ``IMPORT_REPORT_EVERY`` numbers.
+    """
+    success_count = 0
+    errors = []
+    
+    for done, phone in enumerate(phone_list):
+        if report and done % IMPORT_REPORT_EVERY == 0:
+            report(done, len(phone_list))
+        try:
+            # Normalize the phone number
+            normalized_phone = Voter.normalize_phone_number(phone)
+            
+            # Check if voter already exists
+            if Voter.objects.filter(election=election, phone_number=normalized_phone).exists():
+                errors.append(f"{phone} - Already registered")
+                continue
+            
+            # Create new voter
+            voter = Voter(election=election, phone_number=normalized_phone)
+            voter.full_clean()  # Validate
+            voter.save()
+            events.voters_added(election.id, [(voter.id, voter.phone_number)])
+            success_count += 1
+            
+        except ValidationError as e:
+            errors.append(f"{phone} - Invalid format")
+        except Exception as e:
+            errors.append(f"{phone} - Error: {str(e)}")
+    return success_count, errors
+
+
 def add_voters(request):
     """Add voters page - Admin only"""
     # Check if user is admin
@@ -288,6 +778,8 @@ def add_voters(request):
         messages.error(request, 'Please login as admin to access this page')
         return redirect('admin_login')
     
+    election = _current_election(request)
+
     if request.method == 'POST':
         phone_numbers = request.POST.get('phone_numbers', '')
         
@@ -298,34 +790,16 @@ def add_voters(request):
                 phone = phone.strip()
                 if phone:
                     phone_list.append(phone)
-        
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        for phone in phone_list:
-            try:
-                # Normalize the phone number
-                normalized_phone = Voter.normalize_phone_number(phone)
-                
-                # Check if voter already exists
-                if Voter.objects.filter(phone_number=normalized_phone).exists():
-                    errors.append(f"{phone} - Already registered")
-                    error_count += 1
-                    continue
-                
-                # Create new voter
-                voter = Voter(phone_number=normalized_phone)
-                voter.full_clean()  # Validate
-                voter.save()
-                success_count += 1
-                
-            except ValidationError as e:
-                errors.append(f"{phone} - Invalid format")
-                error_count += 1
-            except Exception as e:
-                errors.append(f"{phone} - Error: {str(e)}")
-                error_count += 1
+
+        threshold = getattr(django_settings, 'VOTING_JOBS_IMPORT_THRESHOLD', None)
+        if threshold is not None and len(phone_list) > threshold:
+            # Large rolls are imported by the job runner so the request returns at once
+            job = Job.enqueue('import_voters', election=election, phone_numbers=phone_list)
+            messages.info(request, f'Importing {len(phone_list)} phone numbers in the background (job #{job.id})')
+            return redirect('add_voters')
+
+        success_count, errors = _import_voters(election, phone_list)
+        error_count = len(errors)
         
         # Show success message
         if success_count > 0:
@@ -339,25 +813,121 @@ def add_voters(request):
                 messages.warning(request, f'...and {len(errors) - 10} more errors')
     
     # Get all voters
-    voters = Voter.objects.all()
+    voters = Voter.objects.filter(election=election)
     
     context = {
+        'election': election,
         'voters': voters,
         'total_voters': voters.count(),
-        'voted_count': voters.filter(has_voted=True).count(),
+        'voted_count': TurnoutCounter.get_count(election),
+        'import_jobs': Job.objects.filter(election=election, kind='import_voters')[:3],
     }
     
     return render(request, 'add_voters.html', context)
 
+BULK_VOTER_ACTIONS = ('delete', 'verify', 'reset')
+BULK_BATCH_SIZE = 500
+
+
+def _bulk_voter_queryset(election, spec):
+    """Voters of ``election`` matching a bulk-action filter expression.
+
+    Supported keys: ``has_voted``, ``is_verified`` (booleans),
+    ``phone_prefix`` and ``registered_before`` / ``registered_after``
+    (ISO 8601). Raises ValueError for anything else.
+    """
+    voters = Voter.objects.filter(election=election)
+    for key, value in spec.items():
+        if key in ('has_voted', 'is_verified'):
+            if not isinstance(value, bool):
+                raise ValueError(f'{key} must be true or false')
+            voters = voters.filter(**{key: value})
+        elif key == 'phone_prefix':
+            prefix = Voter.normalize_phone_number(str(value))
+            # Normalizing turns "", "0" or "-" into "+", which every number starts with
+            if not prefix.lstrip('+'):
+                raise ValueError('phone_prefix must contain at least one digit')
+            voters = voters.filter(phone_number__startswith=prefix)
+        elif key in ('registered_before', 'registered_after'):
+            moment = datetime.fromisoformat(str(value))
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment, pytz.timezone(election.timezone))
+            lookup = 'registered_at__lt' if key == 'registered_before' else 'registered_at__gte'
+            voters = voters.filter(**{lookup: moment})
+        else:
+            raise ValueError(f'Unknown filter "{key}"')
+    return voters
+
+
+@require_http_methods(["POST"])
+def bulk_voters(request):
+    """Delete, verify or reset many voters at once - Admin only.
+
+    Takes a JSON body ``{"action": ..., "ids": [...]}`` or
+    ``{"action": ..., "filter": {...}}`` and applies the action in batches,
+    one set-based statement per batch, to voters of the current election.
+    """
+    if not request.session.get('is_admin'):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    action = payload.get('action')
+    if action not in BULK_VOTER_ACTIONS:
+        return JsonResponse({'error': f'action must be one of {", ".join(BULK_VOTER_ACTIONS)}'}, status=400)
+
+    election = _current_election(request)
+    if 'ids' in payload:
+        ids = payload['ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return JsonResponse({'error': 'ids must be a list of voter ids'}, status=400)
+        matched = []
+        for start in range(0, len(ids), BULK_BATCH_SIZE):
+            batch = ids[start:start + BULK_BATCH_SIZE]
+            matched.extend(Voter.objects.filter(election=election, id__in=batch).values_list('id', flat=True))
+    elif isinstance(payload.get('filter'), dict) and payload['filter']:
+        try:
+            matched = list(_bulk_voter_queryset(election, payload['filter']).order_by('id').values_list('id', flat=True))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        return JsonResponse({'error': 'Provide a list of ids or a non-empty filter'}, status=400)
+
+    affected = []
+    for start in range(0, len(matched), BULK_BATCH_SIZE):
+        batch = matched[start:start + BULK_BATCH_SIZE]
+        if action == 'verify':
+            Voter.objects.filter(id__in=batch).update(is_verified=True)
+            affected.extend(batch)
+        else:
+            affected.extend(Voter.remove(election, batch, keep_voters=(action == 'reset')))
+    if action != 'verify' and affected:
+        tally_store.invalidate()
+
+    return JsonResponse({
+        'success': True,
+        'action': action,
+        'matched': len(matched),
+        'affected': len(affected),
+        'ids': affected,
+        'total_voters': Voter.objects.filter(election=election).count(),
+        'voted_count': TurnoutCounter.get_count(election),
+    })
+
+
 def delete_voter(request, voter_id):
     """Delete a voter - Admin only"""
     if not request.session.get('is_admin'):
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
     try:
-        voter = Voter.objects.get(id=voter_id)
+        voter = Voter.objects.select_related('election').get(id=voter_id)
         phone = voter.phone_number
-        voter.delete()
+        Voter.remove(voter.election, [voter.id])
+        tally_store.invalidate()
         messages.success(request, f'Voter {phone} deleted successfully')
         return JsonResponse({'success': True})
     except Voter.DoesNotExist:
@@ -366,6 +936,90 @@ def delete_voter(request, voter_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _roll_dir():
+    default = Path(django_settings.BASE_DIR) / 'var' / 'roll_sync'
+    return Path(getattr(django_settings, 'VOTING_ROLL_SYNC_DIR', default))
+
+
+def _prune_roll_dir(roll_dir):
+    """Delete saved rolls whose preview was never applied"""
+    cutoff = time.time() - getattr(django_settings, 'VOTING_ROLL_SYNC_MAX_AGE', 86400)
+    for path in roll_dir.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            # Applied or pruned by another request meanwhile
+            pass
+
+
+def _roll_path(election, fingerprint):
+    return _roll_dir() / f'{election.id}-{fingerprint}.csv'
+
+
+def _preview_roll(election, path):
+    """Diff a saved roll file and keep it under its preview's fingerprint"""
+    with open(path, encoding='utf-8-sig', newline='') as lines:
+        diff = roll_sync.diff_roll(election, lines)
+    os.replace(path, _roll_path(election, diff.fingerprint))
+    return diff
+
+
+@require_http_methods(["GET", "POST"])
+def sync_roll(request):
+    """Replace the voter roll with an uploaded one - Admin only.
+
+    An upload only shows a preview of the changes. Applying re-diffs the
+    saved file and refuses to run if the result no longer matches the
+    preview the admin saw.
+    """
+    if not request.session.get('is_admin'):
+        messages.error(request, 'Please login as admin to access this page')
+        return redirect('admin_login')
+
+    election = _current_election(request)
+    context = {'election': election}
+    if request.method == 'POST':
+        roll_dir = _roll_dir()
+        roll_dir.mkdir(parents=True, exist_ok=True)
+        _prune_roll_dir(roll_dir)
+        fingerprint = request.POST.get('fingerprint', '')
+        if request.POST.get('action') == 'apply':
+            path = _roll_path(election, fingerprint)
+            if not re.fullmatch(r'[0-9a-f]{16}', fingerprint) or not path.exists():
+                messages.error(request, 'That roll preview has expired, please upload the file again')
+                return redirect('sync_roll')
+            diff = _preview_roll(election, path)
+            if diff.fingerprint != fingerprint:
+                messages.warning(request, 'The roll changed since the preview was shown. Review the new changes below.')
+                context.update(diff=diff)
+            else:
+                added, removed = roll_sync.apply_diff(diff, remove_voted=request.POST.get('remove_voted') == 'on')
+                _roll_path(election, fingerprint).unlink(missing_ok=True)
+                messages.success(request, f'Roll synced: {added} voter(s) added, {removed} removed')
+                if diff.protected and request.POST.get('remove_voted') != 'on':
+                    messages.warning(request, f'{len(diff.protected)} voter(s) missing from the roll were kept because they already voted')
+                return redirect('add_voters')
+        else:
+            uploaded = request.FILES.get('roll')
+            if uploaded is None:
+                messages.error(request, 'Choose a roll file to upload')
+                return redirect('sync_roll')
+            with tempfile.NamedTemporaryFile(dir=roll_dir, suffix='.upload', delete=False) as saved:
+                for chunk in uploaded.chunks():
+                    saved.write(chunk)
+            try:
+                context.update(diff=_preview_roll(election, saved.name))
+            except roll_sync.UNREADABLE:
+                os.unlink(saved.name)
+                messages.error(request, 'The roll must be a UTF-8 text or CSV file')
+                return redirect('sync_roll')
+
+    if 'diff' in context:
+        context.update(summary=context['diff'].summary(), samples=context['diff'].samples())
+    return render(request, 'sync_roll.html', context)
+
+
 @require_http_methods(["GET", "POST"])
 def add_candidates(request):
     """Add candidates page - Admin only"""
@@ -373,6 +1027,8 @@ def add_candidates(request):
         messages.error(request, 'Please login as admin to access this page')
         return redirect('admin_login')
 
+    election = _current_election(request)
+
     if request.method == 'POST':
         name = request.POST.get('name', '').strip()
         nickname = request.POST.get('nickname', '').strip()
@@ -383,14 +1039,16 @@ def add_candidates(request):
         if not name:
             messages.error(request, 'Full Name is required')
         else:
-            candidate = Candidate(name=name, nickname=nickname, position=position, description=description)
+            candidate = Candidate(election=election, name=name, nickname=nickname, position=position, description=description)
             if photo:
                 candidate.photo = photo
             candidate.save()
+            events.candidate_saved(candidate, created=True)
             messages.success(request, f'Candidate {name} added successfully')
 
-    candidates = Candidate.objects.all()
+    candidates = Candidate.objects.filter(election=election)
     context = {
+        'election': election,
         'candidates': candidates,
         'total_candidates': candidates.count(),
     }
@@ -411,6 +1069,7 @@ def edit_candidate(request, candidate_id: int):
         return redirect('add_candidates')
 
     if request.method == 'POST':
+        old_position = candidate.position
         candidate.name = request.POST.get('name', candidate.name).strip()
         candidate.nickname = request.POST.get('nickname', candidate.nickname).strip()
         candidate.position = request.POST.get('position', candidate.position).strip() or candidate.position
@@ -418,7 +1077,18 @@ def edit_candidate(request, candidate_id: int):
         photo = request.FILES.get('photo')
         if photo:
             candidate.photo = photo
-        candidate.save()
+        try:
+            with transaction.atomic():
+                candidate.save()
+                if candidate.position != old_position:
+                    # Votes keep a copy of the position for the one-vote-per-position check,
+                    # and the rollups count them under it
+                    Vote.objects.filter(candidate=candidate).update(position=candidate.position)
+                    VoteRollup.rebuild(candidate.election_id)
+                events.candidate_saved(candidate)
+        except IntegrityError:
+            messages.error(request, f'Cannot move {candidate.name} to "{candidate.position}": some voters have already voted in that position')
+            return redirect('edit_candidate', candidate_id=candidate.id)
         messages.success(request, 'Candidate updated')
         return redirect('add_candidates')
 
@@ -468,61 +1138,155 @@ def admin_change_password(request):
     return render(request, 'admin_change_password.html', context)
 
 
-@require_http_methods(["GET", "POST"])
-def vote(request):
-    """Voter selects a candidate to vote for"""
+def _ballot_voter(request, now):
+    """Return ``(voter, None)`` for a logged-in voter who may vote now, else ``(None, redirect)``"""
     voter_phone = request.session.get('voter_phone')
     if not voter_phone:
         messages.error(request, 'Please login to vote')
-        return redirect('login')
+        return None, redirect('login')
 
-    voter = Voter.objects.filter(phone_number=voter_phone).first()
+    # The ballot is always for the election the voter logged in to
+    voter = (
+        Voter.objects.select_related('election')
+        .filter(election_id=request.session.get('election_id'), phone_number=voter_phone)
+        .first()
+    )
     if not voter:
         messages.error(request, 'Voter not found')
-        return redirect('login')
+        return None, redirect('login')
 
     # Check election settings - if voting is allowed
-    settings = ElectionSettings.get_settings()
+    closed = _voting_closed_message(voter.election, now, on_ballot=True)
+    if closed:
+        messages.error(request, closed)
+        return None, redirect('landing')
+    return voter, None
+
+
+def _render_ballot(request, voter):
+    election = voter.election
+    # Group candidates by position for clearer UI
+    candidates = Candidate.objects.filter(election=election).order_by('position', 'name')
+    grouped = _group_ballot(
+        candidates,
+        RankedPosition.objects.filter(election=election),
+        Vote.objects.filter(election=election, voter=voter).values_list('position', flat=True),
+    )
+    return render(request, 'vote.html', {
+        'grouped': grouped,
+        'voter_phone': voter.phone_number,
+        'complete': all(section['voted'] for section in grouped),
+        'idempotency_key': idempotency.new_key(),
+    })
+
+
+def _render_receipt(request, voter, recorded, skipped):
+    """The single confirmation shown after a ballot is submitted"""
+    ranked_ids = [candidate_id for _, ranking in recorded if ranking for candidate_id in ranking[1]]
+    names = dict(Candidate.objects.filter(id__in=ranked_ids).values_list('id', 'name')) if ranked_ids else {}
+    choices = [
+        {
+            'position': candidate.position,
+            'ranked': ranking is not None,
+            'names': [candidate.name] if ranking is None else [names[candidate_id] for candidate_id in ranking[1]],
+        }
+        for candidate, ranking in recorded
+    ]
+    kiosk_mode = getattr(django_settings, 'VOTING_KIOSK_MODE', False)
+    if kiosk_mode:
+        # A shared polling-station terminal: the next voter logs in afresh
+        request.session.pop('voter_phone', None)
+    return render(request, 'ballot_receipt.html', {
+        'election_title': voter.election.election_title,
+        'voter_phone': voter.phone_number,
+        'choices': choices,
+        'skipped': skipped,
+        'kiosk_mode': kiosk_mode,
+    })
+
+
+@require_http_methods(["GET", "POST"])
+@idempotency.idempotent
+def vote(request):
+    """Voter selects a candidate to vote for"""
     now = timezone.now()
-    
-    # Check if voting is active
-    if not settings.is_active:
-        messages.error(request, 'Voting is currently disabled by the administrator.')
-        return redirect('landing')
-    
-    # Check if voting has started
-    if settings.start_time and now < settings.start_time:
-        messages.error(request, f'Voting has not started yet. Please come back after {settings.start_time.strftime("%B %d, %Y at %I:%M %p")}.')
-        return redirect('landing')
-    
-    # Check if voting has ended
-    if settings.end_time and now > settings.end_time:
-        messages.error(request, f'Voting has ended on {settings.end_time.strftime("%B %d, %Y at %I:%M %p")}. Thank you for your interest.')
-        return redirect('landing')
+    voter, response = _ballot_voter(request, now)
+    if response:
+        return response
+    election = voter.election
 
-    if request.method == 'POST':
-        candidate_id = request.POST.get('candidate_id')
+    if request.method == 'POST' and request.POST.getlist('rank'):
+        position = request.POST.get('position', '')
         try:
-            candidate = Candidate.objects.get(id=candidate_id)
-            # Enforce one vote per section/position
-            if Vote.objects.filter(voter=voter, candidate__position=candidate.position).exists():
-                messages.warning(request, f'You have already voted in the "{candidate.position}" section.')
+            contest, ranking = _ranked_choice(election, position, request.POST.getlist('rank'))
+        except ValidationError as e:
+            messages.error(request, e.message)
+        else:
+            ranked_as = (contest, [c.id for c in ranking])
+            if _record_vote(election, voter, ranking[0], now, ranking=ranked_as, client_ip=anomaly.client_ip(request)):
+                messages.success(request, f'Thank you! Your ranking in "{position}" has been recorded.')
             else:
-                Vote.objects.create(voter=voter, candidate=candidate)
-                # Mark that the voter has participated at least once
-                if not voter.has_voted:
-                    voter.has_voted = True
-                    voter.save(update_fields=['has_voted'])
+                messages.warning(request, f'You have already voted in the "{position}" section.')
+    elif request.method == 'POST':
+        candidate_id = request.POST.get('candidate_id')
+        try:
+            candidate = Candidate.objects.get(id=candidate_id, election=election)
+            if RankedPosition.objects.filter(election=election, position=candidate.position).exists():
+                messages.error(request, f'"{candidate.position}" needs candidates ranked in order of preference.')
+            elif _record_vote(election, voter, candidate, now, client_ip=anomaly.client_ip(request)):
                 messages.success(request, f'Thank you! Your vote for {candidate.name} in "{candidate.position}" has been recorded.')
+            else:
+                messages.warning(request, f'You have already voted in the "{candidate.position}" section.')
         except Candidate.DoesNotExist:
             messages.error(request, 'Candidate not found')
 
-    # Group candidates by position for clearer UI
-    candidates = Candidate.objects.all().order_by('position', 'name')
-    grouped = {}
-    for c in candidates:
-        grouped.setdefault(c.position, []).append(c)
-    return render(request, 'vote.html', { 'grouped': grouped, 'voter_phone': voter_phone })
+    return _render_ballot(request, voter)
+
+
+@require_http_methods(["POST"])
+@idempotency.idempotent
+def submit_ballot(request):
+    """Record the voter's choices in every position at once"""
+    now = timezone.now()
+    voter, response = _ballot_voter(request, now)
+    if response:
+        return response
+    try:
+        choices = _ballot_choices(voter.election, request.POST)
+    except ValidationError as e:
+        for message in e.messages:
+            messages.error(request, message)
+        return _render_ballot(request, voter)
+    recorded, skipped = _record_ballot(voter.election, voter, choices, now, anomaly.client_ip(request))
+    return _render_receipt(request, voter, recorded, skipped)
+
+
+def _set_counting_method(request, election):
+    """Switch a position between plurality and a ranked method"""
+    position = request.POST.get('position', '')
+    method = request.POST.get('method')
+    seats = request.POST.get('seats', '1')
+    if not Candidate.objects.filter(election=election, position=position).exists():
+        messages.error(request, 'Position not found')
+        return
+    if method == 'plurality':
+        if RankedBallot.objects.filter(election=election, position=position).exists():
+            messages.error(request, f'Ranked ballots have been cast in "{position}"; it cannot go back to plurality.')
+            return
+        RankedPosition.objects.filter(election=election, position=position).delete()
+        messages.success(request, f'"{position}" is counted by plurality.')
+        return
+    if method not in dict(RankedPosition.METHOD_CHOICES) or not seats.isdigit() or int(seats) < 1:
+        messages.error(request, 'Choose a counting method and at least one seat')
+        return
+    seats = 1 if method == RankedPosition.IRV else int(seats)
+    contest, created = RankedPosition.objects.get_or_create(
+        election=election, position=position, defaults={'method': method, 'seats': seats},
+    )
+    if not created:
+        contest.method, contest.seats = method, seats
+        contest.save(update_fields=['method', 'seats'])
+    messages.success(request, f'"{position}" is counted by {contest.get_method_display().lower()}.')
 
 
 @require_http_methods(["GET", "POST"])
@@ -532,8 +1296,27 @@ def election_settings(request):
         messages.error(request, 'Please login as admin to access this page')
         return redirect('admin_login')
     
-    settings = ElectionSettings.get_settings()
-    
+    settings = _current_election(request)
+    
+    if request.method == 'POST' and request.POST.get('action') == 'create':
+        # Start a new election with its own roll, candidates and results
+        title = request.POST.get('new_election_title', '').strip()
+        if not title:
+            messages.error(request, 'Election title is required')
+            return redirect('election_settings')
+        election = Election.objects.create(
+            election_title=title,
+            election_description=request.POST.get('new_election_description', '').strip(),
+            timezone=settings.timezone,
+        )
+        request.session['election_id'] = election.id
+        messages.success(request, f'Election "{title}" created. You are now managing it.')
+        return redirect('election_settings')
+
+    if request.method == 'POST' and request.POST.get('action') == 'counting':
+        _set_counting_method(request, settings)
+        return redirect('election_settings')
+
     if request.method == 'POST':
         # Update settings
         settings.election_title = request.POST.get('election_title', settings.election_title)
@@ -583,8 +1366,22 @@ def election_settings(request):
     start_time_formatted = settings.start_time.strftime('%Y-%m-%dT%H:%M') if settings.start_time else ''
     end_time_formatted = settings.end_time.strftime('%Y-%m-%dT%H:%M') if settings.end_time else ''
     
+    contests = {contest.position: contest for contest in RankedPosition.objects.filter(election=settings)}
+    positions = Candidate.objects.filter(election=settings).order_by('position').values_list('position', flat=True).distinct()
+    counting = [
+        {
+            'position': position,
+            'method': contests[position].method if position in contests else '',
+            'seats': contests[position].seats if position in contests else 1,
+        }
+        for position in positions
+    ]
+
     context = {
         'settings': settings,
+        'elections': Election.objects.all(),
+        'counting': counting,
+        'counting_methods': RankedPosition.METHOD_CHOICES,
         'common_timezones': common_timezones,
         'start_time_formatted': start_time_formatted,
         'end_time_formatted': end_time_formatted,
@@ -592,282 +1389,204 @@ def election_settings(request):
     return render(request, 'election_settings.html', context)
 
 
+REPORT_CONTENT_TYPES = {'csv': 'text/csv', 'pdf': 'application/pdf'}
+
+
+def _report_filename(fmt):
+    return f'election_results_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+
+
+def _write_report(election, fmt, out):
+    """Write the CSV or PDF results report of ``election`` to the file-like ``out``"""
+    # Calculate statistics
+    candidates_qs, total_votes, unique_voters_voted = _candidate_tallies(election, 'position', '-votes_count', 'name')
+    total_voters = Voter.objects.filter(election=election).count()
+    ranked_results = _ranked_results(election)
+
+    if fmt == 'csv':
+        from .exports import results_csv
+        results_csv.write(
+            out, election, candidates_qs, total_votes, total_voters, unique_voters_voted, ranked_results=ranked_results,
+        )
+    else:
+        from .exports import results_pdf
+        out.write(results_pdf.render(
+            election, candidates_qs, total_votes, total_voters, unique_voters_voted, ranked_results=ranked_results,
+        ))
+
+
 def download_results(request):
     """Download election results as CSV"""
-    # Get election settings
-    settings = ElectionSettings.get_settings()
-    
-    # Calculate statistics
-    total_votes = Vote.objects.count()
-    total_voters = Voter.objects.count()
-    unique_voters_voted = Vote.objects.values('voter_id').distinct().count()
-    turnout_pct = round((unique_voters_voted / total_voters) * 100, 2) if total_voters else 0
-    
-    # Get candidates with vote counts
-    candidates_qs = Candidate.objects.annotate(votes_count=Count('vote')).order_by('position', '-votes_count', 'name')
-    
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="election_results_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Write header information
-    writer.writerow(['ELECTION RESULTS REPORT'])
-    writer.writerow([])
-    writer.writerow(['Election Title:', settings.election_title])
-    writer.writerow(['Generated On:', timezone.now().strftime('%B %d, %Y at %I:%M %p')])
-    writer.writerow(['Timezone:', settings.timezone])
-    writer.writerow([])
-    
-    # Write summary statistics
-    writer.writerow(['SUMMARY STATISTICS'])
-    writer.writerow(['Total Votes Cast:', total_votes])
-    writer.writerow(['Total Registered Voters:', total_voters])
-    writer.writerow(['Voters Who Voted:', unique_voters_voted])
-    writer.writerow(['Turnout Percentage:', f'{turnout_pct}%'])
-    writer.writerow([])
-    
-    # Write overall results
-    writer.writerow(['OVERALL RESULTS'])
-    writer.writerow(['Rank', 'Candidate Name', 'Position', 'Votes', 'Percentage'])
-    
-    rank = 1
-    for c in candidates_qs:
-        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
-        writer.writerow([rank, c.name, c.position, c.votes_count, f'{percentage}%'])
-        rank += 1
-    
-    writer.writerow([])
-    
-    # Write results by position
-    writer.writerow(['RESULTS BY POSITION'])
-    writer.writerow([])
-    
-    # Group by position
-    by_position = {}
-    for c in candidates_qs:
-        if c.position not in by_position:
-            by_position[c.position] = []
-        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
-        by_position[c.position].append({
-            'name': c.name,
-            'votes': c.votes_count,
-            'percentage': percentage
-        })
-    
-    for position, candidates in by_position.items():
-        writer.writerow([f'Position: {position}'])
-        writer.writerow(['Rank', 'Candidate Name', 'Votes', 'Percentage', 'Status'])
-        
-        for idx, c in enumerate(candidates, 1):
-            status = 'WINNER' if idx == 1 and c['votes'] > 0 else ''
-            # Check for tie
-            if idx == 1 and len(candidates) >= 2 and candidates[0]['votes'] == candidates[1]['votes']:
-                status = 'TIE'
-            writer.writerow([idx, c['name'], c['votes'], f"{c['percentage']}%", status])
-        
-        writer.writerow([])
-    
-    # Write vote details
-    writer.writerow(['DETAILED VOTE LOG'])
-    writer.writerow(['Voter Phone', 'Candidate', 'Position', 'Voted At'])
-    
-    votes = Vote.objects.select_related('voter', 'candidate').order_by('-voted_at')
-    for vote in votes:
-        writer.writerow([
-            vote.voter.phone_number,
-            vote.candidate.name,
-            vote.candidate.position,
-            vote.voted_at.strftime('%B %d, %Y at %I:%M %p')
-        ])
-    
+    response = HttpResponse(content_type=REPORT_CONTENT_TYPES['csv'])
+    response['Content-Disposition'] = f'attachment; filename="{_report_filename("csv")}"'
+    _write_report(_current_election(request), 'csv', response)
+    return response
+
+
+def export_votes(request):
+    """Stream the votes cast after ``?cursor=`` (or ``?since=``) plus changed tallies.
+
+    Admins use their session; mirrors can send the ``VOTING_EXPORT_TOKEN``
+    as a bearer token. ``?format=`` is ``jsonl`` (default) or ``csv``.
+    """
+    token = getattr(django_settings, 'VOTING_EXPORT_TOKEN', None)
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if not request.session.get('is_admin') and not (
+        token and scheme.lower() == 'bearer' and hmac.compare_digest(supplied.encode(), token.encode())
+    ):
+        return JsonResponse({'error': 'Admin login or export token required'}, status=403)
+
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in incremental.FORMATS:
+        return JsonResponse({'error': f'format must be one of {", ".join(incremental.FORMATS)}'}, status=400)
+    election = _current_election(request)
+    cursor = request.GET.get('cursor', '')
+    if cursor and not cursor.isdigit():
+        return JsonResponse({'error': 'cursor must be a vote id'}, status=400)
+    if not cursor and request.GET.get('since'):
+        try:
+            since = datetime.fromisoformat(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'error': 'since must be an ISO 8601 timestamp'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, pytz.timezone(election.timezone))
+        cursor = incremental.cursor_for_time(election, since)
+
+    delta = incremental.VoteDelta(election, int(cursor or 0))
+    response = StreamingHttpResponse(incremental.render(delta, fmt), content_type=incremental.CONTENT_TYPES[fmt])
+    response['X-Next-Cursor'] = str(delta.upper)
+    response['X-Has-More'] = 'true' if delta.has_more else 'false'
     return response
 
 
 def download_results_pdf(request):
     """Download election results as PDF with complete analysis"""
-    # Get election settings
-    settings = ElectionSettings.get_settings()
-    
-    # Calculate statistics
-    total_votes = Vote.objects.count()
-    total_voters = Voter.objects.count()
-    unique_voters_voted = Vote.objects.values('voter_id').distinct().count()
-    turnout_pct = round((unique_voters_voted / total_voters) * 100, 2) if total_voters else 0
-    
-    # Get candidates with vote counts
-    candidates_qs = Candidate.objects.annotate(votes_count=Count('vote')).order_by('position', '-votes_count', 'name')
-    
-    # Create the HttpResponse object with PDF header
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="election_results_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-    
-    # Create the PDF object using BytesIO buffer
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Container for PDF elements
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1e40af'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#2563eb'),
-        spaceAfter=12,
-        spaceBefore=20,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Title
-    elements.append(Paragraph("ELECTION RESULTS REPORT", title_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Election Information
-    info_data = [
-        ['Election Title:', settings.election_title],
-        ['Generated On:', timezone.now().strftime('%B %d, %Y at %I:%M %p')],
-        ['Timezone:', settings.timezone],
-    ]
-    
-    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Summary Statistics
-    elements.append(Paragraph("SUMMARY STATISTICS", heading_style))
-    
-    stats_data = [
-        ['Metric', 'Value'],
-        ['Total Votes Cast', str(total_votes)],
-        ['Total Registered Voters', str(total_voters)],
-        ['Voters Who Voted', str(unique_voters_voted)],
-        ['Turnout Percentage', f'{turnout_pct}%'],
-    ]
-    
-    stats_table = Table(stats_data, colWidths=[3*inch, 2*inch])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-    ]))
-    elements.append(stats_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Overall Results
-    elements.append(Paragraph("OVERALL RESULTS", heading_style))
-    
-    overall_data = [['Rank', 'Candidate Name', 'Position', 'Votes', 'Percentage']]
-    rank = 1
-    for c in candidates_qs:
-        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
-        overall_data.append([str(rank), c.name, c.position, str(c.votes_count), f'{percentage}%'])
-        rank += 1
-    
-    overall_table = Table(overall_data, colWidths=[0.6*inch, 2*inch, 1.5*inch, 0.8*inch, 1*inch])
-    overall_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-        # Highlight first row (winner)
-        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#dcfce7')),
-        ('TEXTCOLOR', (0, 1), (-1, 1), colors.HexColor('#166534')),
-        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-    ]))
-    elements.append(overall_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Results by Position
-    elements.append(Paragraph("RESULTS BY POSITION", heading_style))
-    
-    # Group by position
-    by_position = {}
-    for c in candidates_qs:
-        if c.position not in by_position:
-            by_position[c.position] = []
-        percentage = round((c.votes_count / total_votes) * 100, 1) if total_votes else 0
-        by_position[c.position].append({
-            'name': c.name,
-            'votes': c.votes_count,
-            'percentage': percentage
-        })
-    
-    for position, candidates in by_position.items():
-        # Position title
-        elements.append(Paragraph(f"<b>{position}</b>", styles['Heading3']))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        position_data = [['Rank', 'Candidate Name', 'Votes', 'Percentage', 'Status']]
-        
-        for idx, c in enumerate(candidates, 1):
-            status = 'WINNER' if idx == 1 and c['votes'] > 0 else ''
-            # Check for tie
-            if idx == 1 and len(candidates) >= 2 and candidates[0]['votes'] == candidates[1]['votes']:
-                status = 'TIE'
-            position_data.append([str(idx), c['name'], str(c['votes']), f"{c['percentage']}%", status])
-        
-        position_table = Table(position_data, colWidths=[0.6*inch, 2.5*inch, 0.8*inch, 1*inch, 1*inch])
-        position_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-            # Highlight winner
-            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#dcfce7')),
-            ('TEXTCOLOR', (0, 1), (-1, 1), colors.HexColor('#166534')),
-            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-        ]))
-        elements.append(position_table)
-        elements.append(Spacer(1, 0.2*inch))
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get the value of the BytesIO buffer and write it to response
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    
+    response = HttpResponse(content_type=REPORT_CONTENT_TYPES['pdf'])
+    response['Content-Disposition'] = f'attachment; filename="{_report_filename("pdf")}"'
+    _write_report(_current_election(request), 'pdf', response)
     return response
+
+
+# Jobs an admin may start from the dashboard; voter imports are queued by add_voters
+ADMIN_JOB_KINDS = ('results_csv', 'results_pdf')
+
+
+def _job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'message': job.message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'download_url': reverse('job_download', args=[job.id]) if job.result_file else None,
+    }
+
+
+@require_http_methods(["POST"])
+def start_job(request):
+    """Queue a results report for the job runner - Admin only"""
+    if not request.session.get('is_admin'):
+        return JsonResponse({'error': 'Admin login required'}, status=403)
+    kind = request.POST.get('kind')
+    if kind not in ADMIN_JOB_KINDS:
+        return JsonResponse({'error': f'kind must be one of {", ".join(ADMIN_JOB_KINDS)}'}, status=400)
+    job = Job.enqueue(kind, election=_current_election(request))
+    return JsonResponse(_job_status(job), status=202)
+
+
+def job_status(request, job_id):
+    """Progress of a background job, polled by the admin pages - Admin only"""
+    if not request.session.get('is_admin'):
+        return JsonResponse({'error': 'Admin login required'}, status=403)
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(_job_status(job))
+
+
+def job_download(request, job_id):
+    """The file a finished job wrote - Admin only"""
+    from . import jobs
+
+    if not request.session.get('is_admin'):
+        messages.error(request, 'Please login as admin to access this page')
+        return redirect('admin_login')
+    job = Job.objects.filter(id=job_id, status=Job.SUCCEEDED).exclude(result_file='').first()
+    path = jobs.jobs_dir() / job.result_file if job else None
+    if path is None or not path.is_file():
+        raise Http404('No file for this job')
+    filename = (job.result or {}).get('filename', job.result_file)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def kiosk_sync(request):
+    """Apply a batch of votes recorded offline by a polling-station kiosk.
+
+    The body is ``{"batch": ..., "election": id, "votes": [...]}`` (see
+    :mod:`VotingApp.kiosk`), signed with the station's key.
+    """
+    from . import kiosk
+
+    station = request.headers.get(kiosk.STATION_HEADER, '')
+    if not kiosk.verify(station, request.body, request.headers.get(kiosk.SIGNATURE_HEADER, '')):
+        return JsonResponse({'error': 'Unknown station or bad signature'}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    batch_id, votes = payload.get('batch'), payload.get('votes')
+    if not isinstance(batch_id, str) or not batch_id or not isinstance(votes, list):
+        return JsonResponse({'error': 'Provide a batch id and a list of votes'}, status=400)
+    if not all(isinstance(vote, dict) for vote in votes):
+        return JsonResponse({'error': 'Each vote must be an object'}, status=400)
+    limit = getattr(django_settings, 'VOTING_KIOSK_MAX_BATCH', 1000)
+    if len(votes) > limit:
+        return JsonResponse({'error': f'At most {limit} votes per batch'}, status=400)
+    election = Election.objects.filter(id=payload.get('election')).first() if str(payload.get('election')).isdigit() else None
+    if election is None:
+        return JsonResponse({'error': 'Election not found'}, status=404)
+    return JsonResponse(kiosk.apply_batch(station, batch_id, election, votes))
+
+
+def _events_consumer(request):
+    """Whether the request carries a token from ``VOTING_EVENTS_TOKENS`` or an admin session"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return any(
+            hmac.compare_digest(token.encode(), known.encode())
+            for known in getattr(django_settings, 'VOTING_EVENTS_TOKENS', ())
+        )
+    return bool(request.session.get('is_admin'))
+
+
+def events_feed(request):
+    """Events of the change log after ``?after=<offset>``, for consumers tailing it.
+
+    Delivery is at most once (see :mod:`VotingApp.events`): consumers that
+    must not miss a change reconcile against the export or results feeds.
+    """
+    if not _events_consumer(request):
+        return JsonResponse({'error': 'Admin login or an event token required'}, status=403)
+    log = events.get_log()
+    if log is None:
+        return JsonResponse({'error': 'The event log is disabled'}, status=404)
+    after, limit = request.GET.get('after', '0'), request.GET.get('limit', '')
+    if not after.isdigit() or (limit and not limit.isdigit()):
+        return JsonResponse({'error': 'after and limit must be whole numbers'}, status=400)
+    page = getattr(django_settings, 'VOTING_EVENTS_PAGE_SIZE', 1000)
+    lines = log.read(int(after), min(int(limit or page), page))
+    next_offset = events.offset_of(lines[-1]) if lines else int(after)
+    # The lines are JSON already; splice them in rather than decode and re-encode them
+    body = b'{"events":[%s],"next":%d,"first":%d}' % (b','.join(lines), next_offset, log.first_offset())
+    return HttpResponse(body, content_type='application/json')
@@ -0,0 +1,53 @@
+"""
+Warm-up for a freshly started web worker.
+
+With ``VOTING_WARM_UP = True`` the app config starts :func:`warm_up` in a
+background thread, so a worker added under load answers its first requests
+from warm caches without delaying its own startup: the URLconf and views are
+imported, the voter-facing templates are compiled into the cached loader,
+the OTP cache and tally store are opened and, if ``VOTING_WARM_UP_EXPORTS``
+is set, the report modules are imported too.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = ('landing.html', 'login.html', 'vote.html', 'public_results.html')
+
+
+def warm_up():
+    """Fill this process's caches; return the seconds it took"""
+    from django.core.cache import caches
+    from django.db import connections
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    from . import tally_store
+
+    started = time.perf_counter()
+    get_resolver().url_patterns
+    for name in TEMPLATES:
+        get_template(name)
+    caches[getattr(settings, 'VOTING_OTP_CACHE', 'default')].get('voting:warm-up')
+    try:
+        tally_store.get_snapshot()
+    finally:
+        connections.close_all()
+    if getattr(settings, 'VOTING_WARM_UP_EXPORTS', False):
+        from .exports import results_csv, results_pdf  # noqa: F401
+    return time.perf_counter() - started
+
+
+def _run():
+    try:
+        logger.info('Worker warm-up finished in %.2fs', warm_up())
+    except Exception:
+        logger.exception('Worker warm-up failed')
+
+
+def start():
+    threading.Thread(target=_run, name='voting-warm-up', daemon=True).start()